@@ -28,6 +28,13 @@ class CartSerializer(serializers.ModelSerializer):
             'service_charges'
         ]
 
+class CartBatchItemSerializer(serializers.Serializer):
+    service_id = serializers.IntegerField()
+    scheduled_date_time = serializers.DateTimeField(required=False)
+
+class CartBatchSerializer(serializers.Serializer):
+    items = CartBatchItemSerializer(many=True, allow_empty=False, max_length=100)
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -47,6 +54,17 @@ class OrderStatusUpdateSerializer(serializers.ModelSerializer):
         model = Order
         fields = ['status']
 
+    # Same rules as the batch endpoint; keeping the current status is allowed
+    def validate_status(self, value):
+        current = self.instance.status if self.instance is not None else None
+        if current is not None and value != current and value not in Order.ALLOWED_TRANSITIONS[current]:
+            raise serializers.ValidationError(f'An order cannot go from {current} to {value}.')
+        return value
+
+class OrderStatusBatchSerializer(serializers.Serializer):
+    order_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=500)
+    status = serializers.ChoiceField(choices=Order.STATUS_CHOICES)
+
 class FavoritesSerializer(serializers.ModelSerializer):
     class Meta:
         model = Favorites
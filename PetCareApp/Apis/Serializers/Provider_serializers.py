@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from ..models.Provider_models import ServiceProvider, Service
+from ..models.Provider_models import AvailabilityTemplate, ServiceProvider, Service, Review
 
 class ServiceProviderSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,10 +17,43 @@ class ServiceSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Service
-        fields = ['service_id', 'service_name', 'description', 'price', 'provider', 'is_deal_of_the_day', 'is_todays_special', 'reviews']
+        fields = ['service_id', 'service_name', 'description', 'price', 'provider', 'is_deal_of_the_day', 'is_todays_special', 'review_count', 'average_rating']
+        read_only_fields = ['review_count', 'average_rating']
 
     def get_provider_name(self, obj):
         return obj.provider.name if obj.provider else None
 
 
-        
\ No newline at end of file
+# One row of a bulk catalog import. The provider comes from the request, so
+# validating a row needs no query.
+class ServiceImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Service
+        fields = ['service_name', 'description', 'price', 'is_deal_of_the_day', 'is_todays_special']
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Review
+        fields = ['review_id', 'service', 'owner', 'review', 'rating', 'created_at']
+        read_only_fields = ['service', 'owner', 'created_at']
+
+    def validate_rating(self, value):
+        if value is not None and not 1 <= value <= 5:
+            raise serializers.ValidationError('Rating must be between 1 and 5.')
+        return value
+
+
+class AvailabilityTemplateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AvailabilityTemplate
+        fields = ['weekday', 'start_time', 'end_time', 'slot_minutes', 'capacity']
+
+    def validate(self, data):
+        if data['start_time'] >= data['end_time']:
+            raise serializers.ValidationError('end_time must be after start_time.')
+        if data.get('slot_minutes', 60) < 1:
+            raise serializers.ValidationError('slot_minutes must be at least 1.')
+        if data.get('capacity', 1) < 1:
+            raise serializers.ValidationError('capacity must be at least 1.')
+        return data
@@ -0,0 +1,138 @@
+"""
+Read-only fast path for list endpoints.
+
+A ModelSerializer builds and walks its field objects again for every row it
+serializes. plan_for() does that work once per serializer class: it records
+which column feeds each output field and whether the value needs converting.
+Rows fetched with `queryset.values(*plan.columns)` then become exactly the
+dicts `Serializer(..., many=True).data` would contain.
+
+Only fields read straight from a model column (including primary key
+related fields) are supported. Anything else, such as dotted sources or
+method fields, raises ImproperlyConfigured when the plan is built.
+"""
+import decimal
+from functools import lru_cache
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+# Fields whose to_representation() returns a database value unchanged
+AS_IS_FIELDS = (
+    serializers.BooleanField,
+    serializers.CharField,
+    serializers.FloatField,
+    serializers.IntegerField,
+    serializers.ReadOnlyField,
+)
+
+# Fields whose to_representation() is applied to each non-null value
+CONVERTED_FIELDS = (
+    serializers.DateField,
+    serializers.DateTimeField,
+    serializers.DecimalField,
+    serializers.DurationField,
+    serializers.TimeField,
+    serializers.UUIDField,
+)
+
+
+# Converters are made per rows() call, so settings that DRF looks up for
+# every value (current timezone, decimal context) are looked up only once.
+
+def _datetime_converter(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601:
+        return lambda: field.to_representation
+
+    def make():
+        field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+
+        def convert(value):
+            if field_timezone is None or not timezone.is_aware(value):
+                return field.to_representation(value)
+            text = value.astimezone(field_timezone).isoformat()
+            return text[:-6] + 'Z' if text.endswith('+00:00') else text
+        return convert
+    return make
+
+
+def _decimal_converter(field):
+    coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+    if not coerce_to_string or field.localize or field.normalize_output or field.decimal_places is None:
+        return lambda: field.to_representation
+    exponent = decimal.Decimal('.1') ** field.decimal_places
+
+    def make():
+        context = decimal.getcontext().copy()
+        if field.max_digits is not None:
+            context.prec = field.max_digits
+
+        def convert(value):
+            if not isinstance(value, decimal.Decimal):
+                value = decimal.Decimal(str(value).strip())
+            return f'{value.quantize(exponent, rounding=field.rounding, context=context):f}'
+        return convert
+    return make
+
+
+def _converter(field):
+    """None when the column value can be used as is, else a converter factory."""
+    if isinstance(field, serializers.PrimaryKeyRelatedField):
+        # values() already gives the related primary key
+        return None if field.pk_field is None else lambda: field.pk_field.to_representation
+    if isinstance(field, serializers.ChoiceField):
+        same = all(str(key) == value for key, value in field.choice_strings_to_values.items())
+        return None if same else lambda: field.to_representation
+    if isinstance(field, AS_IS_FIELDS):
+        return None
+    if isinstance(field, serializers.DateTimeField):
+        return _datetime_converter(field)
+    if isinstance(field, serializers.DecimalField):
+        return _decimal_converter(field)
+    if isinstance(field, CONVERTED_FIELDS):
+        return lambda: field.to_representation
+    raise ImproperlyConfigured(f'{type(field).__name__} {field.field_name!r} has no values() plan')
+
+
+class ValuesPlan:
+    """Output fields of a ModelSerializer, compiled for values() rows."""
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self.keys, self.columns, self._converters = [], [], []
+        for name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            if field.source == '*' or '.' in field.source:
+                raise ImproperlyConfigured(f'{serializer_class.__name__}.{name} is not read from a column')
+            make = _converter(field)
+            self.keys.append(name)
+            self.columns.append(field.source)
+            if make is not None:
+                self._converters.append((field.source, make))
+        self._renamed = self.keys != self.columns
+
+    def rows(self, rows):
+        """
+        `rows` from `queryset.values(*self.columns)`, as a list of the dicts
+        the serializer would output. The values() dicts are reused.
+        """
+        converters = [(column, make()) for column, make in self._converters]
+        result = []
+        for values in rows:
+            for column, convert in converters:
+                value = values[column]
+                if value is not None:
+                    values[column] = convert(value)
+            if self._renamed:
+                values = {key: values[column] for key, column in zip(self.keys, self.columns)}
+            result.append(values)
+        return result
+
+
+@lru_cache(maxsize=None)
+def plan_for(serializer_class):
+    return ValuesPlan(serializer_class)
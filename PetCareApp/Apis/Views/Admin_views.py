@@ -0,0 +1,41 @@
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.decorators import api_view, permission_classes, renderer_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+from ..authentication import token_cache
+from ..caching import catalog_cache
+from ..metrics import registry, render_prometheus
+
+
+class PlainTextRenderer(BaseRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return data.encode(self.charset) if isinstance(data, str) else data
+
+
+# Hit/miss counters of this worker's in-process caches
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def cache_stats(request):
+    return Response({
+        'catalog': catalog_cache.stats(),
+        'auth_tokens': token_cache.stats(),
+    })
+
+# Request metrics of all workers in Prometheus text format.
+# Scrape with `authorization: {type: Token, credentials: <staff token>}`.
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+@renderer_classes([PlainTextRenderer])
+def metrics(request):
+    return Response(
+        render_prometheus(registry.collect()),
+        content_type='text/plain; version=0.0.4; charset=utf-8',
+    )
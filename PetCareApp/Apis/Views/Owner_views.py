@@ -1,4 +1,3 @@
-import json
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import JSONParser
 from rest_framework.decorators import api_view, permission_classes
@@ -10,11 +9,26 @@ from django.contrib.auth.hashers import make_password, check_password
 from rest_framework.permissions import AllowAny
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import authenticate
+from django.db.models import Count, Exists, F, Max, OuterRef, Sum
 from django.utils import timezone
 import logging
-from Apis.models.Provider_models import Service, ServiceProvider
+from decimal import Decimal
+from Apis.models.Provider_models import AvailabilityTemplate, Review, Service, ServiceProvider
 from ..models.Owner_models import Favorites, Order, Owner, Cart
-from ..Serializers.Owner_serializers import CartSerializer, FavoritesSerializer, OrderSerializer, OwnerSerializer
+from ..Serializers.Owner_serializers import (
+    CartBatchSerializer, CartSerializer, FavoritesSerializer, OrderSerializer, OwnerSerializer,
+)
+from ..Serializers.Provider_serializers import ReviewSerializer
+from ..Serializers.plans import plan_for
+from ..pagination import RankedPagination, paginate, paginated_response
+from ..search import in_rank_order, search_order_ids
+from ..caching import catalog_cache
+from ..exports import CONTENT_TYPES, export_response, filter_orders
+from ..conditional import conditional_response, make_etag
+from ..availability import book_slots, check_slots, release_slots
+from ..replicas import replica_reads
+from ..sharding import assign_ids, order_db, owner_shard, shard_transaction
+from ..summaries import move_orders, record_orders
 
 logger = logging.getLogger(__name__)
 
@@ -22,14 +36,17 @@ logger = logging.getLogger(__name__)
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def owner_profile(request):
     try:
         owner = request.user.owner
     except Owner.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    serializer = OwnerSerializer(owner)
-    return Response(serializer.data)
+    return conditional_response(
+        request, make_etag('owner', owner.owner_id, owner.updated_at.timestamp()), owner.updated_at,
+        lambda: Response(OwnerSerializer(owner).data),
+    )
 
 @csrf_exempt
 @api_view(['PUT'])
@@ -104,6 +121,15 @@ def login_view(request):
     else:
         return JsonResponse({"error": "Invalid credentials"}, status=status.HTTP_400_BAD_REQUEST)
 
+# Log out owners and providers by deleting their token
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_view(request):
+    if request.auth is not None:
+        request.auth.delete()
+    return Response({"detail": "Logged out successfully"}, status=status.HTTP_200_OK)
+
 
 ##########################################################################
 
@@ -113,30 +139,29 @@ def login_view(request):
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def add_service_to_cart(request):
     try:
         data = JSONParser().parse(request)
     except Exception as e:
-        logger.error(f'Error parsing data: {str(e)}')
+        logger.warning('Error parsing data: %s', e)
         return Response({'error': f'Error parsing data: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
     # Ensure data is a dictionary
     if not isinstance(data, dict):
-        logger.error('Invalid data format')
+        logger.warning('Invalid data format')
         return Response({'error': 'Invalid data format'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Check if 'service_id' is in the data
     if 'service_id' not in data:
-        logger.error('service_id is required')
+        logger.warning('service_id is required')
         return Response({'error': 'service_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     service_id = data['service_id']
     
     try:
-        # Fetch the service details
-        service = Service.objects.get(service_id=service_id)
-        
-        # Fetch the provider details
+        # Fetch the service details, with its provider
+        service = Service.objects.select_related('provider').get(service_id=service_id)
         provider = service.provider
         
         # Construct the cart data
@@ -155,23 +180,74 @@ def add_service_to_cart(request):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            logger.error(f'Serializer errors: {serializer.errors}')
+            logger.warning('Serializer errors: %s', serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     except Service.DoesNotExist:
-        logger.error('Service not found')
+        logger.warning('Service %s not found', service_id)
         return Response({'error': 'Service not found'}, status=status.HTTP_404_NOT_FOUND)
     except ServiceProvider.DoesNotExist:
-        logger.error('Provider not found')
+        logger.warning('Provider of service %s not found', service_id)
         return Response({'error': 'Provider not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        logger.error(f'Unexpected error: {str(e)}')
+        logger.exception('Unexpected error for service %s', service_id)
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)    
 
+# Add several services to the cart at once: one query loads the services
+# with their providers and one INSERT adds the cart rows. Either all of
+# them are added or, when some service does not exist, none.
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@owner_shard
+def add_services_to_cart(request):
+    try:
+        owner = request.user.owner
+    except Owner.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    serializer = CartBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    items = serializer.validated_data['items']
+
+    services = Service.objects.filter(
+        service_id__in={item['service_id'] for item in items}
+    ).annotate(provider_name=F('provider__name'))
+    services = {service.service_id: service for service in services}
+
+    missing = list(dict.fromkeys(item['service_id'] for item in items if item['service_id'] not in services))
+    if missing:
+        return Response(
+            {'error': 'Service not found', 'service_ids': missing},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    now = timezone.now()
+    cart_items = []
+    for item in items:
+        service = services[item['service_id']]
+        cart_items.append(Cart(
+            owner=owner,
+            service_id=service.service_id,
+            service_name=service.service_name,
+            scheduled_date_time=item.get('scheduled_date_time', now),
+            service_provider_name=service.provider_name,
+            service_charges=service.price,
+        ))
+    assign_ids(cart_items)
+    Cart.objects.bulk_create(cart_items)
+
+    return Response(
+        {'items': CartSerializer(cart_items, many=True).data, 'summary': summarize_cart(owner)},
+        status=status.HTTP_201_CREATED
+    )
+
 # Delete Service from Cart
 @csrf_exempt
 @api_view(['DELETE'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def delete_service_from_cart(request, cart_id):
     try:
         cart_item = Cart.objects.get(cart_id=cart_id, owner=request.user.owner)
@@ -185,6 +261,7 @@ def delete_service_from_cart(request, cart_id):
 @csrf_exempt
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def update_scheduled_time(request, cart_id):
     try:
         cart_item = Cart.objects.get(cart_id=cart_id, owner=request.user.owner)
@@ -193,20 +270,81 @@ def update_scheduled_time(request, cart_id):
     
     data = JSONParser().parse(request)
     serializer = CartSerializer(cart_item, data=data, partial=True)
-    if serializer.is_valid():
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    # The new time must be in a slot of the provider with a free place,
+    # checked under the same lock checkouts take
+    with shard_transaction(order_db()):
+        scheduled = serializer.validated_data.get('scheduled_date_time')
+        if scheduled is not None:
+            provider_id = Service.objects.filter(service_id=cart_item.service_id).values_list('provider_id', flat=True).first()
+            _, conflicts = check_slots([(cart_item.cart_id, provider_id, scheduled)])
+            if conflicts:
+                return Response(
+                    {"detail": "The provider has no free slot at this time"},
+                    status=status.HTTP_409_CONFLICT
+                )
         serializer.save()
-        return Response(serializer.data)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    return Response(serializer.data)
 
 
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def list_cart_items(request):
     owner = request.user.owner
     cart_items = Cart.objects.filter(owner=owner)
-    serializer = CartSerializer(cart_items, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+
+    # Any add, edit or removal changes the count or the latest updated_at.
+    # No Last-Modified: a removal does not move it forward.
+    state = cart_items.aggregate(count=Count('cart_id'), last=Max('updated_at'))
+    etag = make_etag(
+        'cart', owner.owner_id, state['count'],
+        state['last'].timestamp() if state['last'] else 0, request.GET.urlencode(),
+    )
+
+    def build():
+        paginator, rows = paginate(request, cart_items, 'cart_id')
+        serializer = CartSerializer(rows, many=True)
+        return paginated_response(paginator, serializer.data, status=status.HTTP_200_OK)
+
+    return conditional_response(request, etag, None, build)
+
+
+def summarize_cart(owner):
+    """Item count and charges of `owner`'s cart, in total and per provider, summed by the database."""
+    cart_items = Cart.objects.filter(owner=owner)
+    totals = cart_items.aggregate(item_count=Count('cart_id'), total_charges=Sum('service_charges'))
+    providers = (
+        cart_items.values('service_provider_name')
+        .annotate(item_count=Count('cart_id'), total_charges=Sum('service_charges'))
+        .order_by('service_provider_name')
+    )
+    def money(value):
+        # SQLite sums come back as 62.5 rather than 62.50
+        return str((value or Decimal('0')).quantize(Decimal('0.01')))
+
+    return {
+        'item_count': totals['item_count'],
+        'total_charges': money(totals['total_charges']),
+        'by_provider': [{**provider, 'total_charges': money(provider['total_charges'])} for provider in providers],
+    }
+
+
+# Number of items and total charges of the cart, also per provider
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@owner_shard
+def cart_summary(request):
+    try:
+        owner = request.user.owner
+    except Owner.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    return Response(summarize_cart(owner), status=status.HTTP_200_OK)
 
 
 #################################################################
@@ -218,42 +356,85 @@ def list_cart_items(request):
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def place_order(request):
     try:
         owner = request.user.owner
     except Owner.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    data = JSONParser().parse(request)
-    cart_items = Cart.objects.filter(owner=owner)
-
-    if not cart_items.exists():
-        return Response({"detail": "No items in cart"}, status=status.HTTP_400_BAD_REQUEST)
-
-    for item in cart_items:
-        order_data = {
-            "owner": owner.owner_id,
-            "service_id": item.service_id,
-            "service_name": item.service_name,
-            "scheduled_date_time": item.scheduled_date_time,
-            "service_provider_name": item.service_provider_name,
-            "service_charges": item.service_charges,
-            "status": "Placed"
-        }
-        serializer = OrderSerializer(data=order_data)
-        if serializer.is_valid():
-            serializer.save()
-            item.delete()
-        else:
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-
-    return Response({"detail": "Order placed successfully"}, status=status.HTTP_201_CREATED)
+    # The whole checkout runs in one transaction with a fixed number of
+    # queries: read the cart, re-price it, book slots of providers with
+    # working hours, insert the orders, count them in the provider
+    # summaries, clear the cart. The cart and the orders are on the owner's
+    # shard.
+    with shard_transaction(order_db()):
+        cart_items = list(Cart.objects.select_for_update().filter(owner=owner))
+
+        if not cart_items:
+            return Response({"detail": "No items in cart"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Current price and provider of every service in the cart
+        services = Service.objects.filter(
+            service_id__in={item.service_id for item in cart_items}
+        ).annotate(
+            provider_name=F('provider__name'),
+            has_availability=Exists(AvailabilityTemplate.objects.filter(provider_id=OuterRef('provider_id'))),
+        )
+        services = {service.service_id: service for service in services}
+
+        unavailable = [item.cart_id for item in cart_items if item.service_id not in services]
+        if unavailable:
+            return Response(
+                {"detail": "Some services in the cart are no longer available", "cart_ids": unavailable},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        slots, conflicts = check_slots([
+            (item.cart_id, services[item.service_id].provider_id, item.scheduled_date_time)
+            for item in cart_items if services[item.service_id].has_availability
+        ])
+        if conflicts:
+            return Response(
+                {"detail": "Some cart items are outside working hours or in a full slot", "cart_ids": conflicts},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        orders = []
+        for item in cart_items:
+            service = services[item.service_id]
+            orders.append(Order(
+                owner=owner,
+                owner_name=owner.owner_name,
+                service_id=service.service_id,
+                provider_id=service.provider_id,
+                service_name=service.service_name,
+                scheduled_date_time=item.scheduled_date_time,
+                service_provider_name=service.provider_name,
+                service_charges=service.price,
+                status='Placed'
+            ))
+
+        assign_ids(orders)
+        Order.objects.bulk_create(orders)
+        book_slots({
+            order.order_id: slots[item.cart_id]
+            for item, order in zip(cart_items, orders) if item.cart_id in slots
+        })
+        record_orders(orders)
+        Cart.objects.filter(cart_id__in=[item.cart_id for item in cart_items]).delete()
+
+    return Response(
+        {"detail": "Order placed successfully", "order_ids": [order.order_id for order in orders]},
+        status=status.HTTP_201_CREATED
+    )
 
 
 # View order status
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def view_order_status(request, order_id):
     try:
         owner = request.user.owner
@@ -261,39 +442,63 @@ def view_order_status(request, order_id):
     except (Owner.DoesNotExist, Order.DoesNotExist):
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    serializer = OrderSerializer(order)
-    return Response(serializer.data)
+    return conditional_response(
+        request, make_etag('order', order.order_id, order.updated_at.timestamp()), order.updated_at,
+        lambda: Response(OrderSerializer(order).data),
+    )
 
 
 # Cancel an order
 @csrf_exempt
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def cancel_order(request, order_id):
-    try:
-        owner = request.user.owner
-        order = Order.objects.get(order_id=order_id, owner=owner)
-    except (Owner.DoesNotExist, Order.DoesNotExist):
-        return Response(status=status.HTTP_404_NOT_FOUND)
-
-    if order.status == 'Placed':
-        order.status = 'Cancelled'
-        order.save()
-        return Response({"detail": "Order cancelled successfully"}, status=status.HTTP_200_OK)
-    else:
-        return Response({"detail": "Order cannot be cancelled"}, status=status.HTTP_400_BAD_REQUEST)
+    with shard_transaction(order_db()):
+        try:
+            owner = request.user.owner
+            order = Order.objects.select_for_update().get(order_id=order_id, owner=owner)
+        except (Owner.DoesNotExist, Order.DoesNotExist):
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        if order.status == 'Placed':
+            move_orders([order], 'Cancelled')
+            release_slots([order.order_id])
+            order.status = 'Cancelled'
+            order.save()
+            return Response({"detail": "Order cancelled successfully"}, status=status.HTTP_200_OK)
+        else:
+            return Response({"detail": "Order cannot be cancelled"}, status=status.HTTP_400_BAD_REQUEST)
 
 
 # Search orders by service name
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@owner_shard
 def search_orders(request):
     service_name = request.query_params.get('service_name', '').strip().lower()
     owner = request.user.owner
-    orders = Order.objects.filter(owner=owner, service_name__icontains=service_name)
+
+    # Results are ranked by relevance, so they page by number (?page=&page_size=)
+    pagination = None
+    offset, limit = 0, None
+    if 'page' in request.query_params or 'page_size' in request.query_params:
+        pagination = RankedPagination(request)
+        offset, limit = pagination.offset, pagination.limit
+
+    ids = search_order_ids(service_name, owner.owner_id, offset, limit, using=order_db())
+    if ids is None:
+        # Empty search, or no full-text index on this database
+        orders = Order.objects.filter(owner=owner, service_name__icontains=service_name).order_by('order_id')
+        orders = list(orders[offset:offset + limit] if limit else orders)
+    else:
+        orders = in_rank_order(Order.objects.all(), 'order_id', ids)
+
     if not orders:
         return Response({"detail": "No orders found matching the service name."}, status=status.HTTP_404_NOT_FOUND)
+    if pagination:
+        return pagination.get_paginated_response(orders, lambda rows: OrderSerializer(rows, many=True).data)
     serializer = OrderSerializer(orders, many=True)
     return Response(serializer.data)
 
@@ -302,15 +507,42 @@ def search_orders(request):
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
+@owner_shard
 def view_all_orders(request):
     try:
         owner = request.user.owner
     except Owner.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    orders = Order.objects.filter(owner=owner)
-    serializer = OrderSerializer(orders, many=True)
-    return Response(serializer.data)
+    # Same output as OrderSerializer, built from values() rows
+    plan = plan_for(OrderSerializer)
+    orders = Order.objects.filter(owner=owner).values(*plan.columns)
+    paginator, orders = paginate(request, orders, 'order_id')
+    return paginated_response(paginator, plan.rows(orders))
+
+# Stream the owner's whole order history as CSV or NDJSON,
+# optionally limited with ?from=&to= (dates) and ?status=
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@owner_shard
+def export_owner_orders(request, export_format):
+    if export_format not in CONTENT_TYPES:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    try:
+        owner = request.user.owner
+    except Owner.DoesNotExist:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+
+    orders, errors = filter_orders(Order.objects.filter(owner=owner), request.query_params, dict(Order.STATUS_CHOICES))
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    fields = ['order_id', 'service_id', 'service_name', 'scheduled_date_time',
+              'service_provider_name', 'service_charges', 'status']
+    # The rows are read while streaming, after @owner_shard has let go of the shard
+    return export_response(orders.using(order_db()).order_by('order_id'), fields, export_format, 'orders')
 
 ###############################################################
 
@@ -325,17 +557,47 @@ def add_review(request, service_id):
         return Response(status=status.HTTP_404_NOT_FOUND)
     
     data = JSONParser().parse(request)
-    review = data.get('review')
 
-    if not review:
+    if not data.get('review'):
         return Response({"error": "Review is required"}, status=status.HTTP_400_BAD_REQUEST)
 
-    reviews = service.get_reviews()
-    reviews.append(review)
-    service.reviews = json.dumps(reviews)
-    service.save()
+    serializer = ReviewSerializer(data=data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        owner = request.user.owner
+    except Owner.DoesNotExist:
+        owner = None
+
+    review = service.add_review(
+        serializer.validated_data['review'],
+        rating=serializer.validated_data.get('rating'),
+        owner=owner,
+    )
+    # Catalog responses carry the review aggregates
+    catalog_cache.invalidate()
+
+    return Response({
+        "message": "Review added successfully",
+        "review": ReviewSerializer(review).data,
+        "review_count": service.review_count,
+        "average_rating": service.average_rating,
+    }, status=status.HTTP_200_OK)
+
+
+# List reviews of a service, newest first, always paginated
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def list_service_reviews(request, service_id):
+    if not Service.objects.filter(service_id=service_id).exists():
+        return Response(status=status.HTTP_404_NOT_FOUND)
 
-    return Response({"message": "Review added successfully", "reviews": reviews}, status=status.HTTP_200_OK)
+    reviews = Review.objects.filter(service_id=service_id)
+    paginator, reviews = paginate(request, reviews, '-review_id', always=True)
+    serializer = ReviewSerializer(reviews, many=True)
+    return paginated_response(paginator, serializer.data)
 
 ##################################
 
@@ -348,17 +610,17 @@ def add_service_to_favorites(request):
     try:
         data = JSONParser().parse(request)
     except Exception as e:
-        logger.error(f'Error parsing data: {str(e)}')
+        logger.warning('Error parsing data: %s', e)
         return Response({'error': f'Error parsing data: {str(e)}'}, status=status.HTTP_400_BAD_REQUEST)
     
     # Ensure data is a dictionary
     if not isinstance(data, dict):
-        logger.error('Invalid data format')
+        logger.warning('Invalid data format')
         return Response({'error': 'Invalid data format'}, status=status.HTTP_400_BAD_REQUEST)
 
     # Check if 'service_id' is in the data
     if 'service_id' not in data:
-        logger.error('service_id is required')
+        logger.warning('service_id is required')
         return Response({'error': 'service_id is required'}, status=status.HTTP_400_BAD_REQUEST)
 
     service_id = data['service_id']
@@ -383,17 +645,17 @@ def add_service_to_favorites(request):
             serializer.save()
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         else:
-            logger.error(f'Serializer errors: {serializer.errors}')
+            logger.warning('Serializer errors: %s', serializer.errors)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     except Service.DoesNotExist:
-        logger.error('Service not found')
+        logger.warning('Service %s not found', service_id)
         return Response({'error': 'Service not found'}, status=status.HTTP_404_NOT_FOUND)
     except ServiceProvider.DoesNotExist:
-        logger.error('Provider not found')
+        logger.warning('Provider of service %s not found', service_id)
         return Response({'error': 'Provider not found'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
-        logger.error(f'Unexpected error: {str(e)}')
+        logger.exception('Unexpected error for service %s', service_id)
         return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
 
@@ -407,11 +669,12 @@ def list_favorite_items(request):
         
         # Fetch favorites for the logged-in user
         favorites_items = Favorites.objects.filter(owner=owner)
+        paginator, favorites_items = paginate(request, favorites_items, 'favorites_id')
         
         # Serialize the data
         serializer = FavoritesSerializer(favorites_items, many=True)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return paginated_response(paginator, serializer.data, status=status.HTTP_200_OK)
     
     except Exception as e:
         # Handle unexpected errors
@@ -1,32 +1,55 @@
+import datetime
+import logging
+
+from django.db import transaction
+from django.db.models import F, Q
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
 from django.views.decorators.csrf import csrf_exempt
 from rest_framework.parsers import JSONParser
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import serializers, status
 from django.http.response import JsonResponse
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth import authenticate
 
-from Apis.Serializers.Owner_serializers import OrderSerializer, OrderStatusUpdateSerializer
+from Apis.Serializers.Owner_serializers import OrderSerializer, OrderStatusBatchSerializer, OrderStatusUpdateSerializer
 from Apis.models.Owner_models import Order
-from ..models.Provider_models import ServiceProvider, Service
-from ..Serializers.Provider_serializers import ServiceProviderSerializer, ServiceSerializer
+from ..models.Provider_models import AvailabilityTemplate, ServiceProvider, Service
+from ..Serializers.Provider_serializers import AvailabilityTemplateSerializer, ServiceProviderSerializer, ServiceSerializer
+from ..Serializers.plans import plan_for
+from ..pagination import RankedPagination, paginate, paginated_response
+from ..search import in_rank_order, search_service_ids
+from ..service_import import format_for_content_type, read_rows, upsert_services
+from ..availability import free_slots, release_slots
+from ..exports import CONTENT_TYPES, date_range, export_response, filter_orders
+from ..conditional import conditional_response, make_etag
+from ..replicas import replica_reads
+from ..sharding import shard_aliases, shard_of, shard_transaction, sharded
+from ..summaries import dashboard, move_orders
+from ..tasks import rebuild_provider_summaries
+from ..caching import cached_feed_response, catalog_cache, feeds_for, invalidate_feeds
 from rest_framework.authtoken.models import Token
 
+logger = logging.getLogger(__name__)
+
 # Fetch the profile of the logged-in service provider
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@replica_reads
 def provider_profile(request):
     try:
         provider = request.user.serviceprovider
     except ServiceProvider.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    serializer = ServiceProviderSerializer(provider)
-    return Response(serializer.data)
+    return conditional_response(
+        request, make_etag('provider', provider.provider_id, provider.updated_at.timestamp()), provider.updated_at,
+        lambda: Response(ServiceProviderSerializer(provider).data),
+    )
 
 # Update the profile of the logged-in service provider
 @csrf_exempt
@@ -34,7 +57,7 @@ def provider_profile(request):
 @permission_classes([IsAuthenticated])
 def update_provider_profile(request):
     try:
-        provider = request.user
+        provider = request.user.serviceprovider
     except ServiceProvider.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
@@ -42,6 +65,8 @@ def update_provider_profile(request):
     serializer = ServiceProviderSerializer(provider, data=data)
     if serializer.is_valid():
         serializer.save()
+        # Catalog responses carry the provider name
+        catalog_cache.invalidate()
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -106,31 +131,84 @@ def create_service(request):
     serializer = ServiceSerializer(data=data)
     if serializer.is_valid():
         serializer.save()
+        catalog_cache.invalidate()
+        invalidate_feeds(feeds_for(serializer.instance))
         return JsonResponse(serializer.data, status=status.HTTP_201_CREATED)
     return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Create or update many services at once from a JSON array, NDJSON or CSV
+# body, matched on service_name. Rows that fail validation are reported
+# back and skipped.
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def import_services(request):
+    try:
+        provider = request.user.serviceprovider
+    except ServiceProvider.DoesNotExist:
+        return Response({'error': 'User is not a service provider'}, status=status.HTTP_403_FORBIDDEN)
+
+    input_format = format_for_content_type(request.content_type)
+    if input_format is None:
+        return Response(
+            {'error': 'Send application/json, application/x-ndjson or text/csv'},
+            status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        )
+    if request.stream is None:
+        return Response({'error': 'Request body is empty'}, status=status.HTTP_400_BAD_REQUEST)
+
+    summary = upsert_services(provider, read_rows(request.stream, input_format))
+    logger.info(
+        'Imported services for provider %s: %s created, %s updated, %s errors',
+        provider.provider_id, summary['created'], summary['updated'], summary['error_count'],
+    )
+    return Response(summary, status=status.HTTP_200_OK)
+
 # Fetch all services
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache.cached_view
 def list_services(request):
-    services = Service.objects.all()
-    response_data = []
+    # Pull the provider name in the same query instead of one lookup per row
+    # values() rows already are the catalog representation
+    services = Service.objects.annotate(provider_name=F('provider__name')).values(*CATALOG_FIELDS)
+    paginator, services = paginate(request, services, 'service_id')
+    return paginated_response(paginator, list(services))
+
+
+# Catalog representation shared by list_services and search_services
+CATALOG_FIELDS = [
+    'service_id', 'service_name', 'description', 'price', 'provider_name',
+    'is_deal_of_the_day', 'is_todays_special', 'review_count', 'average_rating',
+]
 
-    for service in services:
-        provider = service.provider
-        response_data.append({
-            'service_id': service.service_id,
-            'service_name': service.service_name,
-            'description': service.description,
-            'price': service.price,
-            'provider_name': provider.name if provider else None,
-            'is_deal_of_the_day': service.is_deal_of_the_day,
-            'is_todays_special': service.is_todays_special,
-            'reviews': service.reviews,
-        })
 
-    return Response(response_data)
+# Expects services annotated with provider_name
+def catalog_rows(services):
+    return [{field: getattr(service, field) for field in CATALOG_FIELDS} for service in services]
+
+# Full-text search over service names and descriptions, best match first
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_services(request):
+    query = request.query_params.get('q', '').strip()
+    if not query:
+        return Response({'error': 'q is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+    pagination = RankedPagination(request)
+    services = Service.objects.annotate(provider_name=F('provider__name'))
+
+    ids = search_service_ids(query, pagination.offset, pagination.limit)
+    if ids is None:
+        # No full-text index on this database
+        matches = services.filter(Q(service_name__icontains=query) | Q(description__icontains=query))
+        services = list(matches.order_by('service_id')[pagination.offset:pagination.offset + pagination.limit])
+    else:
+        services = in_rank_order(services, 'service_id', ids)
+
+    return pagination.get_paginated_response(services, catalog_rows)
 
 #Fetch service of single provider
 @csrf_exempt
@@ -139,12 +217,13 @@ def list_services(request):
 def list_services_for_provider(request):
     # Get the logged-in user's provider profile
     try:
-        provider = ServiceProvider.objects.get(id=request.user.id)
+        provider = request.user.serviceprovider
     except ServiceProvider.DoesNotExist:
         return Response({'error': 'User is not a service provider'}, status=status.HTTP_403_FORBIDDEN)
 
     # Filter services based on the logged-in provider
     services = Service.objects.filter(provider=provider)
+    paginator, services = paginate(request, services, 'service_id')
     response_data = []
 
     for service in services:
@@ -156,10 +235,11 @@ def list_services_for_provider(request):
             'provider_name': provider.name if provider else None,
             'is_deal_of_the_day': 'Yes' if service.is_deal_of_the_day else 'No',
             'is_todays_special': 'Yes' if service.is_todays_special else 'No',
-            'reviews': service.reviews,
+            'review_count': service.review_count,
+            'average_rating': service.average_rating,
         })
 
-    return Response(response_data)
+    return paginated_response(paginator, response_data)
 
 
 
@@ -167,14 +247,17 @@ def list_services_for_provider(request):
 @csrf_exempt
 @api_view(['GET'])
 @permission_classes([AllowAny])
+@catalog_cache.cached_view
 def get_service(request, service_id):
     try:
         service = Service.objects.get(service_id=service_id)
     except Service.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
-    serializer = ServiceSerializer(service)
-    return Response(serializer.data)
+    return conditional_response(
+        request, make_etag('service', service.service_id, service.updated_at.timestamp()), service.updated_at,
+        lambda: Response(ServiceSerializer(service).data),
+    )
 
 # Update a service
 @csrf_exempt
@@ -192,9 +275,12 @@ def update_service(request, service_id):
     if 'provider' not in data:
         data['provider'] = service.provider.provider_id
 
+    feeds = feeds_for(service)
     serializer = ServiceSerializer(service, data=data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        catalog_cache.invalidate()
+        invalidate_feeds(feeds | feeds_for(service))
         return Response(serializer.data)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -208,7 +294,10 @@ def delete_service(request, service_id):
     except Service.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
 
+    feeds = feeds_for(service)
     service.delete()
+    catalog_cache.invalidate()
+    invalidate_feeds(feeds)
     return Response(status=status.HTTP_204_NO_CONTENT)
 
 
@@ -221,19 +310,20 @@ def delete_service(request, service_id):
 @permission_classes([IsAuthenticated])
 def view_orders(request):
     try:
-        service_provider = ServiceProvider.objects.get(id=request.user.id)
+        service_provider = request.user.serviceprovider
     except ServiceProvider.DoesNotExist:
         return Response({'error': 'Service provider not found'}, status=status.HTTP_404_NOT_FOUND)
     
-    services = Service.objects.filter(provider=service_provider)
-    orders = Order.objects.filter(service_id__in=[service.service_id for service in services])
+    # A provider's orders are on every shard
+    orders = sharded(Order.objects.filter(provider=service_provider))
+    paginator, orders = paginate(request, orders, 'order_id')
     
     # Manually construct the response data
     response_data = []
     for order in orders:
         response_data.append({
             'order_id': order.order_id,
-            'owner_name': order.owner.owner_name,  # Explicitly fetch owner's name
+            'owner_name': order.owner_name,
             'service_id': order.service_id,
             'service_name': order.service_name,
             'scheduled_date_time': order.scheduled_date_time,
@@ -242,27 +332,225 @@ def view_orders(request):
             'status': order.status
         })
 
-    return Response(response_data, status=status.HTTP_200_OK)
+    return paginated_response(paginator, response_data, status=status.HTTP_200_OK)
 
 @csrf_exempt
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def update_order_status(request, order_id):
-    try:
-        order = Order.objects.get(order_id=order_id)
-    except Order.DoesNotExist:
+    data = JSONParser().parse(request)
+    shard = shard_of(Order.objects.filter(order_id=order_id))
+    if shard is None:
         return Response(status=status.HTTP_404_NOT_FOUND)
-    
-    service_provider = ServiceProvider.objects.get(id=request.user.id)
-    if order.service_id not in [service.service_id for service in Service.objects.filter(provider=service_provider)]:
+
+    with shard_transaction(shard):
+        try:
+            order = Order.objects.select_for_update().get(order_id=order_id)
+        except Order.DoesNotExist:
+            return Response(status=status.HTTP_404_NOT_FOUND)
+
+        try:
+            service_provider = request.user.serviceprovider
+        except ServiceProvider.DoesNotExist:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        if order.provider_id != service_provider.provider_id:
+            return Response(status=status.HTTP_403_FORBIDDEN)
+
+        serializer = OrderStatusUpdateSerializer(order, data=data)
+        if serializer.is_valid():
+            move_orders([order], serializer.validated_data['status'])
+            serializer.save()
+            # Cancelled is final (Order.ALLOWED_TRANSITIONS), so the slot is
+            # never needed again
+            if order.status == 'Cancelled':
+                release_slots([order.order_id])
+            return Response(serializer.data, status=status.HTTP_200_OK)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+# Move many orders to one status. Every order is checked (exists, belongs
+# to this provider, transition allowed) from a single query, and the valid
+# ones are changed by one conditional UPDATE, per shard.
+@csrf_exempt
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def update_order_status_batch(request):
+    try:
+        service_provider = request.user.serviceprovider
+    except ServiceProvider.DoesNotExist:
         return Response(status=status.HTTP_403_FORBIDDEN)
-    
-    data = JSONParser().parse(request)
-    serializer = OrderStatusUpdateSerializer(order, data=data)
-    if serializer.is_valid():
-        serializer.save()
-        return Response(serializer.data, status=status.HTTP_200_OK)
-    return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    serializer = OrderStatusBatchSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+    order_ids = list(dict.fromkeys(serializer.validated_data['order_ids']))
+    target = serializer.validated_data['status']
+    sources = Order.statuses_leading_to(target)
+
+    current, movable, updated, recount = {}, [], 0, False
+    for shard in shard_aliases():
+        with shard_transaction(shard):
+            orders = {
+                order.order_id: order
+                for order in Order.objects.select_for_update()
+                .filter(order_id__in=order_ids, provider=service_provider)
+                .only('order_id', 'status', 'provider_id', 'service_id', 'service_name',
+                      'scheduled_date_time', 'service_charges')
+            }
+            shard_current = {order_id: order.status for order_id, order in orders.items()}
+            shard_movable = [order_id for order_id, order_status in shard_current.items() if order_status in sources]
+            shard_updated = 0
+            if shard_movable:
+                # The conditions are repeated so a concurrent change is never overwritten
+                shard_updated = Order.objects.filter(
+                    order_id__in=shard_movable, provider=service_provider, status__in=sources,
+                ).update(status=target, updated_at=timezone.now())
+            if shard_updated == len(shard_movable):
+                move_orders([orders[order_id] for order_id in shard_movable], target)
+                shard_current.update((order_id, target) for order_id in shard_movable)
+            else:
+                # Which orders moved from where is unknown, recount this provider
+                shard_current.update(Order.objects.filter(order_id__in=shard_movable).values_list('order_id', 'status'))
+                recount = True
+            if target == 'Cancelled':
+                release_slots([order_id for order_id in shard_movable if shard_current[order_id] == target])
+        current.update(shard_current)
+        movable += shard_movable
+        updated += shard_updated
+    if recount:
+        # In the background, once every shard has committed
+        rebuild_provider_summaries.delay([service_provider.provider_id])
+
+    results = []
+    for order_id in order_ids:
+        if order_id not in current:
+            # Missing and other providers' orders look the same to the caller
+            results.append({'order_id': order_id, 'result': 'not_found'})
+        elif current[order_id] == target and order_id in movable:
+            results.append({'order_id': order_id, 'result': 'updated', 'status': target})
+        elif current[order_id] == target:
+            results.append({'order_id': order_id, 'result': 'unchanged', 'status': target})
+        else:
+            results.append({'order_id': order_id, 'result': 'invalid_transition', 'status': current[order_id]})
+
+    return Response({'status': target, 'updated': updated, 'results': results}, status=status.HTTP_200_OK)
+
+
+# Stream the provider's whole order history as CSV or NDJSON,
+# optionally limited with ?from=&to= (dates) and ?status=
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_provider_orders(request, export_format):
+    if export_format not in CONTENT_TYPES:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    try:
+        service_provider = request.user.serviceprovider
+    except ServiceProvider.DoesNotExist:
+        return Response({'error': 'Service provider not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    orders = sharded(Order.objects.filter(provider=service_provider))
+    orders, errors = filter_orders(orders, request.query_params, dict(Order.STATUS_CHOICES))
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    fields = ['order_id', 'owner_name', 'service_id', 'service_name', 'scheduled_date_time',
+              'service_provider_name', 'service_charges', 'status']
+    return export_response(orders.order_by('order_id'), fields, export_format, 'orders')
+
+
+# Order counts and revenue in total and by status, service and day, read
+# from the provider's summary rows only. Optional ?from=&to= (dates).
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def provider_dashboard(request):
+    try:
+        service_provider = request.user.serviceprovider
+    except ServiceProvider.DoesNotExist:
+        return Response({'error': 'Service provider not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    days, errors = date_range(request.query_params)
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    return Response(dashboard(service_provider, days['from'], days['to']), status=status.HTTP_200_OK)
+
+
+# The provider's working hours, as weekly templates. PUT replaces them all;
+# an empty list means orders are taken at any time again.
+@csrf_exempt
+@api_view(['GET', 'PUT'])
+@permission_classes([IsAuthenticated])
+def provider_availability(request):
+    try:
+        service_provider = request.user.serviceprovider
+    except ServiceProvider.DoesNotExist:
+        return Response({'error': 'Service provider not found'}, status=status.HTTP_404_NOT_FOUND)
+
+    templates = AvailabilityTemplate.objects.filter(provider=service_provider)
+    if request.method == 'PUT':
+        serializer = AvailabilityTemplateSerializer(data=request.data, many=True)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            templates.delete()
+            AvailabilityTemplate.objects.bulk_create([
+                AvailabilityTemplate(provider=service_provider, **item) for item in serializer.validated_data
+            ])
+
+    serializer = AvailabilityTemplateSerializer(templates.order_by('weekday', 'start_time'), many=True)
+    return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+MAX_AVAILABILITY_PROVIDERS = 50
+MAX_AVAILABILITY_DAYS = 31
+
+# Free slots of up to 50 providers (?providers=1,2,3) over up to 31 days
+# (?from=&to=, a week from today by default). Providers without working
+# hours take orders at any time and are left out.
+@csrf_exempt
+@api_view(['GET'])
+@permission_classes([AllowAny])
+@replica_reads
+def available_slots(request):
+    days, errors = date_range(request.query_params)
+    try:
+        provider_ids = sorted({int(value) for value in request.query_params.get('providers', '').split(',') if value.strip()})
+    except ValueError:
+        errors['providers'] = ['Expected comma separated provider ids.']
+    else:
+        if not provider_ids:
+            errors['providers'] = ['This parameter is required.']
+        elif len(provider_ids) > MAX_AVAILABILITY_PROVIDERS:
+            errors['providers'] = [f'At most {MAX_AVAILABILITY_PROVIDERS} providers.']
+    if errors:
+        return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+    first_day = days['from'] or timezone.localdate()
+    last_day = days['to'] or first_day + datetime.timedelta(days=6)
+    if last_day < first_day:
+        return Response({'to': ['Must not be before from.']}, status=status.HTTP_400_BAD_REQUEST)
+    if (last_day - first_day).days >= MAX_AVAILABILITY_DAYS:
+        return Response({'to': [f'At most {MAX_AVAILABILITY_DAYS} days.']}, status=status.HTTP_400_BAD_REQUEST)
+
+    as_text = serializers.DateTimeField().to_representation
+    slots = free_slots(provider_ids, first_day, last_day)
+    return Response({
+        'from': first_day,
+        'to': last_day,
+        'providers': [
+            {
+                'provider_id': provider_id,
+                'slots': [
+                    {'start': as_text(start), 'end': as_text(end), 'free': free}
+                    for start, end, free in slots[provider_id]
+                ],
+            }
+            for provider_id in provider_ids if provider_id in slots
+        ],
+    }, status=status.HTTP_200_OK)
 
 
 ###########################################################
@@ -283,9 +571,12 @@ def mark_service_special(request, service_id):
         return Response({"error": "You do not have permission to mark this service as special"}, status=status.HTTP_403_FORBIDDEN)
 
     data = request.data
+    feeds = feeds_for(service)
     serializer = ServiceSerializer(service, data=data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        catalog_cache.invalidate()
+        invalidate_feeds(feeds | feeds_for(service))
         return Response(serializer.data, status=status.HTTP_200_OK)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -293,19 +584,14 @@ def mark_service_special(request, service_id):
 @api_view(['PATCH'])
 @permission_classes([IsAuthenticated])
 def mark_service_deal(request, service_id):
-    # Log the logged-in user
-    print("Logged-in user:", request.user)
-
     # Get the logged-in user's provider profile
     try:
         provider = request.user.serviceprovider
-        print("Provider object:", provider)
     except ServiceProvider.DoesNotExist:
         return Response({'error': 'User is not a service provider'}, status=status.HTTP_403_FORBIDDEN)
 
     # Get the service or return 404 if not found
     service = get_object_or_404(Service, service_id=service_id)
-    print("Service object:", service)
     
     # Check if the service belongs to the logged-in provider
     if service.provider != provider:
@@ -313,25 +599,34 @@ def mark_service_deal(request, service_id):
 
     # Update the service with the data provided in the request
     data = request.data
-    print("Request data:", data)  # Log the request data
+    logger.debug('Marking deal on service %s', service_id, extra={'provider_id': provider.provider_id, 'data': data})
+    feeds = feeds_for(service)
     serializer = ServiceSerializer(service, data=data, partial=True)
     if serializer.is_valid():
         serializer.save()
+        catalog_cache.invalidate()
+        invalidate_feeds(feeds | feeds_for(service))
         return Response(serializer.data, status=status.HTTP_200_OK)
     else:
-        print("Serializer errors:", serializer.errors)  # Log serializer errors
+        logger.warning('Invalid deal update for service %s: %s', service_id, serializer.errors)
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_deal_of_the_day_services(request):
-    services = Service.objects.filter(is_deal_of_the_day=True)
-    serializer = ServiceSerializer(services, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return cached_feed_response(request, 'deal_of_the_day', lambda: feed_data(request, is_deal_of_the_day=True))
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_todays_special_services(request):
-    services = Service.objects.filter(is_todays_special=True)
-    serializer = ServiceSerializer(services, many=True)
-    return Response(serializer.data, status=status.HTTP_200_OK)
+    return cached_feed_response(request, 'todays_special', lambda: feed_data(request, is_todays_special=True))
+
+# Response data of a feed page, only built on a cache miss
+def feed_data(request, **flags):
+    plan = plan_for(ServiceSerializer)
+    services = Service.objects.filter(**flags).values(*plan.columns)
+    paginator, services = paginate(request, services, 'service_id')
+    data = plan.rows(services)
+    if paginator is None:
+        return data
+    return paginator.get_paginated_response(data).data
@@ -2,7 +2,8 @@ from django.contrib import admin
 
 # Register your models here.
 from .models.Owner_models import Owner, Order, Cart, Favorites
-from .models.Provider_models import ServiceProvider, Service
+from .models.Provider_models import ServiceProvider, Service, Review, ProviderOrderSummary, AvailabilityTemplate, Booking
+from .models.Task_models import Task
 from .models.Users import User
 
 
@@ -12,4 +13,9 @@ admin.site.register(Order)
 admin.site.register(Favorites)
 admin.site.register(ServiceProvider)
 admin.site.register(Service)
+admin.site.register(Review)
+admin.site.register(ProviderOrderSummary)
+admin.site.register(AvailabilityTemplate)
+admin.site.register(Booking)
+admin.site.register(Task)
 admin.site.register(User)
\ No newline at end of file
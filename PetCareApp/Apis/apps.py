@@ -1,6 +1,22 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ApisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Apis'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .replicas import check_pin_cache
+
+        check_pin_cache()
+        post_migrate.connect(setup_search_index, sender=self)
+
+
+# Full-text search tables and triggers live outside the migrations, see Apis/search.py
+def setup_search_index(sender, using='default', **kwargs):
+    from .search import install_search_index
+
+    install_search_index(using)
+
@@ -0,0 +1,172 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+
+class ProfileTokenAuthentication(TokenAuthentication):
+    """
+    Token authentication that loads the token, the user and the user's
+    Owner / ServiceProvider profile in a single query.
+
+    The profile is cached on the user, so `request.user.owner` and
+    `request.user.serviceprovider` cost no further queries (a missing one
+    raises DoesNotExist straight away), and it is attached to the request as
+    `request.profile`.
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            request.profile = result[0].profile
+        return result
+
+    def authenticate_credentials(self, key):
+        model = self.get_model()
+        try:
+            token = model.objects.select_related(
+                'user', 'user__owner', 'user__serviceprovider'
+            ).get(key=key)
+        except model.DoesNotExist:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        return (token.user, token)
+
+
+class TokenCache:
+    """
+    Bounded per-worker LRU mapping token key -> (user, token), with a TTL.
+
+    Entries are dropped locally by invalidate() / invalidate_user(). With
+    `shared` set, invalidations are also published through the Django cache,
+    and every hit checks for them, so other workers stop serving the entry
+    as well.
+    """
+
+    def __init__(self, timeout=300, max_entries=10000, shared=False, cache_alias='default'):
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self.shared = shared
+        self.cache_alias = cache_alias
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _revoked_key(key):
+        return f'authtoken:revoked:{key}'
+
+    @staticmethod
+    def _user_changed_key(user_id):
+        return f'authtoken:user_changed:{user_id}'
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None and self.shared and self._revoked_elsewhere(key, entry):
+            self._discard(key)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return _clone(entry['user']), _clone(entry['token'])
+
+    def _revoked_elsewhere(self, key, entry):
+        revoked_key = self._revoked_key(key)
+        changed_key = self._user_changed_key(entry['user'].id)
+        found = caches[self.cache_alias].get_many([revoked_key, changed_key])
+        return revoked_key in found or found.get(changed_key, 0) >= entry['cached_at']
+
+    def set(self, key, user, token):
+        with self._lock:
+            self._entries[key] = {
+                'user': _clone(user),
+                'token': _clone(token),
+                'expires': time.monotonic() + self.timeout,
+                'cached_at': time.time(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _discard(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def invalidate(self, key):
+        """Forget a token, e.g. after logout or deletion."""
+        self._discard(key)
+        if self.shared:
+            caches[self.cache_alias].set(self._revoked_key(key), True, self.timeout)
+
+    def invalidate_user(self, user_id):
+        """Forget every token of a user, e.g. after a password or profile change."""
+        with self._lock:
+            for key in [k for k, entry in self._entries.items() if entry['user'].id == user_id]:
+                del self._entries[key]
+        if self.shared:
+            caches[self.cache_alias].set(self._user_changed_key(user_id), time.time(), self.timeout)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+
+def _clone(instance):
+    # Each request gets its own copies, so views mutating request.user (or its
+    # cached profile) never touch the shared cache entry.
+    clone = copy.copy(instance)
+    fields_cache = clone._state.fields_cache
+    for name, related in fields_cache.items():
+        if related is not None:
+            fields_cache[name] = copy.copy(related)
+    return clone
+
+
+_token_cache_settings = getattr(settings, 'TOKEN_CACHE', {})
+
+token_cache = TokenCache(
+    timeout=_token_cache_settings.get('TIMEOUT', 300),
+    max_entries=_token_cache_settings.get('MAX_ENTRIES', 10000),
+    shared=_token_cache_settings.get('SHARED_INVALIDATION', False),
+    cache_alias=_token_cache_settings.get('CACHE_ALIAS', 'default'),
+)
+
+
+class CachedTokenAuthentication(ProfileTokenAuthentication):
+    """
+    ProfileTokenAuthentication backed by the per-worker token_cache, so a
+    repeat request with the same token needs no query at all.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        token_cache.set(key, user, token)
+        return (user, token)
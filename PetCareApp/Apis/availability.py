@@ -0,0 +1,186 @@
+"""
+Provider availability.
+
+A provider's AvailabilityTemplate rows give its working hours per weekday,
+cut into slots of slot_minutes, each taking up to `capacity` orders. An
+order of a provider that has templates books the slot containing its
+scheduled time (a Booking row) when it is placed, and gives it back when it
+is cancelled or deleted. Providers without templates take orders at any
+time, as before.
+
+Bookings are found with a range scan of the (provider, slot_start) index:
+a booking overlapping [start, end) starts before `end` and, since no slot
+is longer than a day, no earlier than a day before `start`. So the free
+slots of many providers over many days take two queries (templates and
+bookings) whatever the number of orders.
+
+check_slots() locks the providers it checks (SELECT ... FOR UPDATE on their
+rows) so two checkouts cannot both take the last place of a slot. Call it,
+and book_slots(), in the transaction that creates the orders.
+"""
+import bisect
+import datetime
+from collections import defaultdict
+
+from django.utils import timezone
+
+from .models.Provider_models import AvailabilityTemplate, Booking, ServiceProvider
+
+# No slot is longer than this (a window ends on the day it starts)
+MAX_SLOT = datetime.timedelta(days=1)
+
+
+def _templates(provider_ids):
+    templates = defaultdict(list)
+    for template in AvailabilityTemplate.objects.filter(provider_id__in=provider_ids).order_by('start_time'):
+        templates[template.provider_id].append(template)
+    return templates
+
+
+def _window(template, day):
+    tz = timezone.get_current_timezone()
+    return (
+        timezone.make_aware(datetime.datetime.combine(day, template.start_time), tz),
+        timezone.make_aware(datetime.datetime.combine(day, template.end_time), tz),
+    )
+
+
+def _day_slots(templates, day):
+    """(start, end, capacity) of every slot of `day`."""
+    for template in templates:
+        if template.weekday != day.weekday():
+            continue
+        start, end = _window(template, day)
+        step = datetime.timedelta(minutes=template.slot_minutes)
+        while start + step <= end:
+            yield start, start + step, template.capacity
+            start += step
+
+
+def slot_containing(templates, when):
+    """The (start, end, capacity) slot `when` falls in, or None outside working hours."""
+    day = timezone.localtime(when).date()
+    for template in templates:
+        if template.weekday != day.weekday():
+            continue
+        start, end = _window(template, day)
+        step = datetime.timedelta(minutes=template.slot_minutes)
+        if start <= when < end:
+            slot_start = start + step * ((when - start) // step)
+            if slot_start + step <= end:
+                return slot_start, slot_start + step, template.capacity
+    return None
+
+
+class _Bookings:
+    """The bookings of some providers over a time range, for overlap counts."""
+
+    def __init__(self, provider_ids, start, end):
+        self.starts, self.intervals = defaultdict(list), defaultdict(list)
+        rows = (
+            Booking.objects.filter(
+                provider_id__in=provider_ids, slot_start__gte=start - MAX_SLOT, slot_start__lt=end,
+            )
+            .order_by('provider_id', 'slot_start')
+            .values_list('provider_id', 'slot_start', 'slot_end')
+        )
+        for provider_id, slot_start, slot_end in rows:
+            self.starts[provider_id].append(slot_start)
+            self.intervals[provider_id].append((slot_start, slot_end))
+
+    def overlapping(self, provider_id, start, end):
+        starts = self.starts[provider_id]
+        first = bisect.bisect_left(starts, start - MAX_SLOT)
+        last = bisect.bisect_left(starts, end)
+        return sum(1 for slot_start, slot_end in self.intervals[provider_id][first:last] if slot_end > start)
+
+
+def free_slots(provider_ids, first_day, last_day, now=None):
+    """
+    {provider_id: [(start, end, free places)]} for the slots from
+    `first_day` to `last_day` (inclusive) that have a free place and have
+    not started yet. Providers without templates are left out.
+    """
+    now = now or timezone.now()
+    templates = _templates(provider_ids)
+    if not templates:
+        return {}
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.datetime.combine(first_day, datetime.time.min), tz)
+    end = timezone.make_aware(datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time.min), tz)
+    bookings = _Bookings(list(templates), start, end)
+
+    result = {}
+    for provider_id, provider_templates in templates.items():
+        slots = []
+        day = first_day
+        while day <= last_day:
+            for slot_start, slot_end, capacity in sorted(_day_slots(provider_templates, day)):
+                if slot_start < now:
+                    continue
+                free = capacity - bookings.overlapping(provider_id, slot_start, slot_end)
+                if free > 0:
+                    slots.append((slot_start, slot_end, free))
+            day += datetime.timedelta(days=1)
+        result[provider_id] = slots
+    return result
+
+
+def check_slots(requests):
+    """
+    Check that every request, a (key, provider_id, scheduled time) triple,
+    can have a place in its provider's slot, counting the requests before
+    it. Locks the providers that have templates.
+
+    Returns `(slots, conflicts)`: the (provider_id, start, end) slot to book
+    for each key that needs one, and the keys that fall outside working
+    hours or into a full slot.
+    """
+    if not requests:
+        return {}, []
+    templates = _templates({provider_id for _, provider_id, _ in requests})
+    if not templates:
+        return {}, []
+    # In id order, so concurrent checkouts cannot deadlock
+    locked = ServiceProvider.objects.select_for_update().filter(provider_id__in=list(templates))
+    list(locked.order_by('provider_id').values_list('provider_id', flat=True))
+
+    slots, conflicts = {}, []
+    for key, provider_id, when in requests:
+        if provider_id not in templates:
+            continue
+        slot = slot_containing(templates[provider_id], when)
+        if slot is None:
+            conflicts.append(key)
+        else:
+            slots[key] = (provider_id, slot)
+    if not slots:
+        return {}, conflicts
+
+    starts = [start for _, (start, _, _) in slots.values()]
+    ends = [end for _, (_, end, _) in slots.values()]
+    bookings = _Bookings(list(templates), min(starts), max(ends))
+    taken = defaultdict(int)
+    booked = {}
+    for key, (provider_id, (start, end, capacity)) in slots.items():
+        if bookings.overlapping(provider_id, start, end) + taken[(provider_id, start)] >= capacity:
+            conflicts.append(key)
+        else:
+            taken[(provider_id, start)] += 1
+            booked[key] = (provider_id, start, end)
+    return booked, conflicts
+
+
+def book_slots(slots):
+    """Book `slots`, {order_id: (provider_id, start, end)} as returned by check_slots()."""
+    if slots:
+        Booking.objects.bulk_create([
+            Booking(order_id=order_id, provider_id=provider_id, slot_start=start, slot_end=end)
+            for order_id, (provider_id, start, end) in slots.items()
+        ])
+
+
+def release_slots(order_ids):
+    """Give back the slots of `order_ids`."""
+    if order_ids:
+        Booking.objects.filter(order_id__in=list(order_ids)).delete()
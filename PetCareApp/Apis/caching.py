@@ -0,0 +1,223 @@
+"""
+Response caching for the public catalog and the deal/special feeds.
+
+Rendered feed pages are stored in the Django cache (CACHES['default'] unless
+FEED_CACHE_ALIAS says otherwise) under versioned keys. Writing to a service
+that is, or was, in a feed bumps that feed's version, so every cached page
+of it is dropped at once and the next request rebuilds it.
+
+The catalog endpoints (list_services, get_service) use an in-process LRU of
+rendered responses instead, keyed by the view and its query parameters. Its
+version lives in the Django cache too. A write invalidates the entries of
+every worker only when that cache is shared between them, as the default
+file cache is; with PETCARE_CACHE=locmem run a single worker process.
+"""
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+from .conditional import etag_matches, is_not_modified, make_etag, not_modified, set_validators
+from .renderers import ORJSONRenderer
+
+FEED_CACHE_ALIAS = getattr(settings, 'FEED_CACHE_ALIAS', 'default')
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 300)
+
+# Feed name -> Service flag that puts a service in it
+FEEDS = {
+    'deal_of_the_day': 'is_deal_of_the_day',
+    'todays_special': 'is_todays_special',
+}
+
+
+def _cache():
+    return caches[FEED_CACHE_ALIAS]
+
+
+def _version_key(feed):
+    return f'feeds:{feed}:version'
+
+
+def feed_version(feed):
+    cache = _cache()
+    version = cache.get(_version_key(feed))
+    if version is None:
+        # Seed with the clock so a version key lost to eviction can never
+        # come back as a number that older cached pages were stored under.
+        cache.add(_version_key(feed), time.time_ns(), None)
+        version = cache.get(_version_key(feed))
+    return version
+
+
+def feeds_for(service):
+    """Names of the feeds `service` currently appears in."""
+    return {feed for feed, flag in FEEDS.items() if getattr(service, flag)}
+
+
+def invalidate_feeds(feeds):
+    """Drop every cached page of `feeds` once the current transaction commits."""
+    feeds = set(feeds)
+    if not feeds:
+        return
+
+    def bump():
+        cache = _cache()
+        for feed in feeds:
+            try:
+                cache.incr(_version_key(feed))
+            except ValueError:
+                # No version yet, so nothing of this feed is cached
+                pass
+
+    transaction.on_commit(bump)
+
+
+def cached_feed_response(request, feed, build):
+    """
+    Serve `feed` for this request from the cache, calling `build()` for the
+    response data on a miss. Replies 304 when If-None-Match holds the
+    current ETag.
+    """
+    cache = _cache()
+    version = feed_version(feed)
+    url_hash = hashlib.md5(request.build_absolute_uri().encode()).hexdigest()
+    key = f'feeds:{feed}:{version}:{url_hash}'
+
+    entry = cache.get(key)
+    if entry is None:
+        content = ORJSONRenderer().render(build())
+        entry = {
+            'etag': make_etag(feed, version, hashlib.md5(content).hexdigest()),
+            'content': content,
+        }
+        cache.set(key, entry, FEED_CACHE_TIMEOUT)
+
+    if etag_matches(request, entry['etag']):
+        return not_modified(entry['etag'])
+
+    response = HttpResponse(entry['content'], content_type='application/json')
+    response['ETag'] = entry['etag']
+    return response
+
+
+class ResponseCache:
+    """
+    Per-process LRU cache of rendered 200 responses with a TTL, invalidated
+    as a whole by bumping a version shared through the Django cache.
+    """
+
+    def __init__(self, name, timeout=60, max_entries=1000):
+        self.name = name
+        self.timeout = timeout
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def _version_key(self):
+        return f'response_cache:{self.name}:version'
+
+    def version(self):
+        cache = _cache()
+        version = cache.get(self._version_key)
+        if version is None:
+            cache.add(self._version_key, time.time_ns(), None)
+            version = cache.get(self._version_key)
+        return version
+
+    def invalidate(self):
+        """Make every entry stale, in all workers, once the transaction commits."""
+        def bump():
+            try:
+                _cache().incr(self._version_key)
+            except ValueError:
+                pass
+
+        transaction.on_commit(bump)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires'] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def _set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def respond(self, request, view_name, build):
+        params = sorted(request.query_params.lists())
+        key = (view_name, self.version(), request.get_host(), request.path, tuple((k, tuple(v)) for k, v in params))
+
+        entry = self._get(key)
+        if entry is None:
+            response = build()
+            if not isinstance(response, Response) or response.status_code != 200:
+                return response
+            content = ORJSONRenderer().render(response.data)
+            # Keep validators the view derived from updated_at, if any
+            last_modified = parse_http_date_safe(response.get('Last-Modified', ''))
+            entry = {
+                'etag': response.get('ETag') or make_etag(self.name, key[1], hashlib.md5(content).hexdigest()),
+                'last_modified': None if last_modified is None else datetime.datetime.fromtimestamp(last_modified, datetime.timezone.utc),
+                'content': content,
+                'expires': time.monotonic() + self.timeout,
+            }
+            self._set(key, entry)
+            cache_status = 'MISS'
+        else:
+            cache_status = 'HIT'
+
+        if is_not_modified(request, entry['etag'], entry['last_modified']):
+            response = not_modified(entry['etag'], entry['last_modified'])
+        else:
+            response = HttpResponse(entry['content'], content_type='application/json')
+            set_validators(response, entry['etag'], entry['last_modified'])
+        response['X-Cache'] = cache_status
+        return response
+
+    def cached_view(self, view):
+        """Decorator for GET views whose output depends only on the URL."""
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return self.respond(request, view.__name__, lambda: view(request, *args, **kwargs))
+
+        return wrapper
+
+
+_catalog_settings = getattr(settings, 'CATALOG_CACHE', {})
+
+# Public catalog: list_services and get_service
+catalog_cache = ResponseCache(
+    'catalog',
+    timeout=_catalog_settings.get('TIMEOUT', 60),
+    max_entries=_catalog_settings.get('MAX_ENTRIES', 1000),
+)
@@ -0,0 +1,58 @@
+from django.http import HttpResponseNotModified
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+
+
+# Helpers for conditional GET: answer with 304 when the client already holds
+# the current representation, without rebuilding the response body.
+
+def make_etag(*parts):
+    """Build a quoted strong ETag from `parts`."""
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def etag_matches(request, etag):
+    """True if the request's If-None-Match header covers `etag`."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header or not etag:
+        return False
+    etags = parse_etags(header)
+    if etags == ['*']:
+        return True
+    etag = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == etag for candidate in etags)
+
+
+def modified_since(request, last_modified):
+    """
+    False if the request's If-Modified-Since is at or after `last_modified`
+    (a datetime). If-None-Match, when sent, takes precedence.
+    """
+    if last_modified is None or 'HTTP_IF_NONE_MATCH' in request.META:
+        return True
+    since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return since is None or int(last_modified.timestamp()) > since
+
+
+def is_not_modified(request, etag, last_modified=None):
+    return etag_matches(request, etag) or not modified_since(request, last_modified)
+
+
+def set_validators(response, etag, last_modified=None):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
+def not_modified(etag, last_modified=None):
+    return set_validators(HttpResponseNotModified(), etag, last_modified)
+
+
+def conditional_response(request, etag, last_modified, build):
+    """
+    304 if the client's copy is current, otherwise `build()` (only called
+    then) with ETag and Last-Modified set.
+    """
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+    return set_validators(build(), etag, last_modified)
@@ -0,0 +1,102 @@
+"""
+settings.DATABASES profiles, picked by PETCARE_DB.
+
+'sqlite' (default) uses the file at PETCARE_SQLITE_PATH (db.sqlite3 next to
+manage.py by default). Every connection runs SQLITE_PRAGMAS:
+
+- WAL journal: readers no longer block the writer or each other.
+- synchronous=NORMAL: safe with WAL, it only fsyncs at checkpoints.
+- A memory-mapped read window.
+- A busy timeout, so a writer waits for the lock instead of failing with
+  "database is locked".
+
+Transactions start with BEGIN IMMEDIATE and take the write lock up front.
+Otherwise two transactions could both read and then deadlock upgrading to
+a write, which no timeout resolves.
+
+'postgres' reads PETCARE_DB_NAME, _USER, _PASSWORD, _HOST and _PORT. It
+keeps connections open for PETCARE_DB_CONN_MAX_AGE seconds and checks them
+before reuse. With PETCARE_DB_POOL=1 it uses a psycopg 3 connection pool
+per worker instead, of PETCARE_DB_POOL_MIN_SIZE to _MAX_SIZE connections.
+
+PETCARE_DB_REPLICAS adds read replicas as aliases replica1, replica2 and so
+on (see Apis/replicas.py). For postgres it is a comma separated list of
+hosts, with the primary's credentials. For sqlite it lists the paths of
+replicated copies of the file. In test runs the replicas mirror the test
+database.
+
+PETCARE_DB_SHARDS adds order shards as aliases shard1, shard2 and so on (see
+Apis/sharding.py), given the same way: hosts for postgres, file paths for
+sqlite. Unlike replicas they are separate databases in test runs too.
+"""
+import os
+
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    # Milliseconds
+    'busy_timeout': 20000,
+}
+
+
+def sqlite_database(path, pragmas=SQLITE_PRAGMAS):
+    return {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': path,
+        'OPTIONS': {
+            'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in pragmas.items()),
+            'transaction_mode': 'IMMEDIATE',
+        },
+    }
+
+
+def postgres_database(env):
+    database = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': env.get('PETCARE_DB_NAME', 'petcare'),
+        'USER': env.get('PETCARE_DB_USER', 'petcare'),
+        'PASSWORD': env.get('PETCARE_DB_PASSWORD', ''),
+        'HOST': env.get('PETCARE_DB_HOST', 'localhost'),
+        'PORT': env.get('PETCARE_DB_PORT', '5432'),
+        'OPTIONS': {},
+    }
+    if env.get('PETCARE_DB_POOL', '') not in ('', '0'):
+        # Django refuses persistent connections together with a pool
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': int(env.get('PETCARE_DB_POOL_MIN_SIZE', 2)),
+            'max_size': int(env.get('PETCARE_DB_POOL_MAX_SIZE', 10)),
+            'timeout': 10,
+        }
+    else:
+        database['CONN_MAX_AGE'] = int(env.get('PETCARE_DB_CONN_MAX_AGE', 60))
+        database['CONN_HEALTH_CHECKS'] = True
+    return database
+
+
+def database_profile(name, base_dir, env=os.environ):
+    """settings.DATABASES for the 'sqlite' or 'postgres' profile."""
+    if name == 'postgres':
+        default = postgres_database(env)
+    elif name == 'sqlite':
+        default = sqlite_database(env.get('PETCARE_SQLITE_PATH') or os.path.join(base_dir, 'db.sqlite3'))
+    else:
+        raise ValueError(f'Unknown database profile {name!r}')
+
+    databases = {'default': default}
+    replicas = [value.strip() for value in env.get('PETCARE_DB_REPLICAS', '').split(',') if value.strip()]
+    for number, location in enumerate(replicas, start=1):
+        if name == 'postgres':
+            replica = {**postgres_database(env), 'HOST': location}
+        else:
+            replica = sqlite_database(location)
+        databases[f'replica{number}'] = {**replica, 'TEST': {'MIRROR': 'default'}}
+
+    shards = [value.strip() for value in env.get('PETCARE_DB_SHARDS', '').split(',') if value.strip()]
+    for number, location in enumerate(shards, start=1):
+        if name == 'postgres':
+            databases[f'shard{number}'] = {**postgres_database(env), 'HOST': location}
+        else:
+            databases[f'shard{number}'] = sqlite_database(location)
+    return databases
@@ -0,0 +1,112 @@
+"""
+Streaming CSV / NDJSON exports.
+
+Rows are read with QuerySet.iterator(chunk_size=...) and encoded a chunk at
+a time into a StreamingHttpResponse, so a worker only ever holds one chunk
+no matter how many rows are exported.
+"""
+import csv
+import datetime
+import io
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+EXPORT_CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _csv_value(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    return value
+
+
+def _csv_chunks(rows, fields):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for count, row in enumerate(rows, start=1):
+        writer.writerow([_csv_value(value) for value in row])
+        if count % EXPORT_CHUNK_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _ndjson_chunks(rows, fields):
+    encoder = DjangoJSONEncoder()
+    lines = []
+    for row in rows:
+        lines.append(encoder.encode(dict(zip(fields, row))))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def export_response(queryset, fields, export_format, filename):
+    """
+    Stream `fields` of every row of `queryset` as CSV or NDJSON.
+    `queryset` must already be ordered.
+    """
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    encode = _csv_chunks if export_format == 'csv' else _ndjson_chunks
+    response = StreamingHttpResponse(encode(rows, fields), content_type=CONTENT_TYPES[export_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+def date_range(params):
+    """
+    Parse the optional `from` / `to` (inclusive, YYYY-MM-DD) query parameters.
+
+    Returns `({'from': date or None, 'to': date or None}, errors)`.
+    """
+    days, errors = {'from': None, 'to': None}, {}
+    for param in days:
+        if not params.get(param):
+            continue
+        try:
+            days[param] = parse_date(params[param])
+        except ValueError:
+            pass
+        if days[param] is None:
+            errors[param] = ['Expected a date as YYYY-MM-DD.']
+    return days, errors
+
+
+def filter_orders(queryset, params, statuses):
+    """
+    Apply the optional `from` / `to` (inclusive dates, on the scheduled time)
+    and `status` (comma separated) query parameters.
+
+    Returns `(queryset, errors)`.
+    """
+    days, errors = date_range(params)
+    for param, lookup in (('from', 'scheduled_date_time__gte'), ('to', 'scheduled_date_time__lt')):
+        day = days[param]
+        if day is None:
+            continue
+        if param == 'to':
+            day += datetime.timedelta(days=1)
+        start = timezone.make_aware(datetime.datetime.combine(day, datetime.time.min))
+        queryset = queryset.filter(**{lookup: start})
+
+    if params.get('status'):
+        wanted = [value.strip() for value in params['status'].split(',') if value.strip()]
+        unknown = [value for value in wanted if value not in statuses]
+        if unknown:
+            errors['status'] = [f'Unknown status: {", ".join(unknown)}']
+        else:
+            queryset = queryset.filter(status__in=wanted)
+
+    return queryset, errors
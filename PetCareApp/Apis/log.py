@@ -0,0 +1,205 @@
+"""
+Non-blocking, structured logging.
+
+Request threads only put records on a bounded in-memory queue
+(AsyncLogHandler); a background QueueListener thread formats them as JSON
+lines and writes them to a size-rotated file and/or stderr. When the queue
+is full, records are dropped and counted rather than blocking the request.
+
+Every record carries the id of the request that produced it
+(RequestIdMiddleware, echoed in the X-Request-ID header), and SamplingFilter
+keeps only a fraction of the low-level records of chatty loggers such as
+django.db.backends.
+
+settings.LOGGING is built by logging_preset() from PETCARE_LOG_PRESET.
+"""
+import atexit
+import contextvars
+import json
+import logging
+import queue
+import random
+import sys
+import time
+import uuid
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+request_id = contextvars.ContextVar('request_id', default=None)
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# LogRecord attributes that are not `extra=` fields
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'request_id'}
+
+
+class RequestIdMiddleware:
+    """Tag the request (and every record logged while handling it) with an id."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        incoming = request.headers.get(REQUEST_ID_HEADER, '')
+        # Trust a client/proxy supplied id only if it looks like one
+        value = incoming if 0 < len(incoming) <= 64 and incoming.isprintable() else uuid.uuid4().hex
+        token = request_id.set(value)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_id.reset(token)
+        response[REQUEST_ID_HEADER] = value
+        return response
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = request_id.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Pass only `rate` of the records below `level` from the given loggers
+    (and their children). Everything else passes untouched.
+    """
+
+    def __init__(self, rate=0.01, loggers=(), level='WARNING'):
+        super().__init__()
+        self.rate = rate
+        self.loggers = tuple(loggers)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        if not any(record.name == name or record.name.startswith(name + '.') for name in self.loggers):
+            return True
+        return random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    converter = time.gmtime
+
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'request_id': getattr(record, 'request_id', None),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class AsyncLogHandler(QueueHandler):
+    """
+    Hands records to a background thread that writes them to `filename`
+    (rotated at `max_bytes`, keeping `backup_count` files) and/or stderr.
+    """
+
+    def __init__(self, filename=None, max_bytes=10 * 1024 * 1024, backup_count=5,
+                 stream=False, queue_size=10000):
+        super().__init__(queue.Queue(maxsize=queue_size))
+        self.addFilter(RequestIdFilter())
+        self.dropped = 0
+
+        targets = []
+        if filename:
+            targets.append(RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, delay=True))
+        if stream:
+            targets.append(logging.StreamHandler(sys.stderr))
+        for target in targets:
+            target.setFormatter(JsonFormatter())
+
+        self.listener = QueueListener(self.queue, *targets, respect_handler_level=True)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        # Resolve the message and traceback here, while args and exc_info are
+        # still valid, and keep extra fields for the formatter.
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def flush(self):
+        # Wait until the writer thread has caught up
+        if self.listener._thread is not None:
+            self.queue.join()
+
+    def close(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+def logging_preset(name, log_dir='.'):
+    """settings.LOGGING for the 'development', 'production' or 'test' preset."""
+    filters = {
+        'sample_sql': {
+            '()': 'Apis.log.SamplingFilter',
+            'rate': 0.01,
+            'loggers': ['django.db.backends'],
+        },
+    }
+    if name == 'production':
+        handlers = {
+            'async': {
+                '()': 'Apis.log.AsyncLogHandler',
+                'filename': f'{log_dir}/petcare.log',
+                'max_bytes': 50 * 1024 * 1024,
+                'backup_count': 10,
+                'stream': True,
+                'filters': ['sample_sql'],
+            },
+        }
+        level, django_level, sql_level = 'INFO', 'INFO', 'WARNING'
+    elif name == 'test':
+        handlers = {
+            'async': {
+                '()': 'Apis.log.AsyncLogHandler',
+                'stream': True,
+                'level': 'ERROR',
+            },
+        }
+        level, django_level, sql_level = 'WARNING', 'WARNING', 'WARNING'
+    else:
+        handlers = {
+            'async': {
+                '()': 'Apis.log.AsyncLogHandler',
+                'filename': f'{log_dir}/debug.log',
+                'filters': ['sample_sql'],
+            },
+        }
+        level, django_level, sql_level = 'DEBUG', 'INFO', 'DEBUG'
+
+    return {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'filters': filters,
+        'handlers': handlers,
+        'loggers': {
+            'django': {'handlers': ['async'], 'level': django_level, 'propagate': False},
+            'django.db.backends': {'handlers': ['async'], 'level': sql_level, 'propagate': False},
+            'Apis': {'handlers': ['async'], 'level': level, 'propagate': False},
+        },
+    }
@@ -0,0 +1,93 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from Apis.models import Order, Owner, Service, ServiceProvider
+from Apis.renderers import ORJSONRenderer
+from Apis.Serializers.Owner_serializers import OrderSerializer
+from Apis.Serializers.plans import plan_for
+from Apis.Serializers.Provider_serializers import ServiceSerializer
+from Apis.Views.Provider_views import CATALOG_FIELDS, catalog_rows
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the list endpoints\' serialization (ModelSerializer + JSONRenderer '
+        'against values() plans + ORJSONRenderer) on generated rows, checking '
+        'that both produce the same bytes. Nothing is left in the database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=2000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['rows'], options['repeat'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def best(self, repeat, function):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = function()
+            timings.append(time.perf_counter() - start)
+        return min(timings), content
+
+    def run(self, rows, repeat):
+        provider = ServiceProvider.objects.create(
+            email='benchmark-provider@example.com', username='benchmark-provider', password='x', name='Benchmark',
+        )
+        owner = Owner.objects.create(
+            email='benchmark-owner@example.com', username='benchmark-owner', password='x',
+            owner_name='Benchmark', pet_name='Rex', pet_age=3, animal_type='Dog',
+        )
+        services = Service.objects.bulk_create([
+            Service(provider=provider, service_name=f'Service {i}', description=f'Description {i}   café',
+                    price=f'{i % 500}.{i % 100:02d}', is_deal_of_the_day=True)
+            for i in range(rows)
+        ], batch_size=500)
+        now = timezone.now()
+        Order.objects.bulk_create([
+            Order(owner=owner, provider=provider, service_id=service.service_id, service_name=service.service_name,
+                  scheduled_date_time=now, service_provider_name=provider.name, service_charges=service.price)
+            for service in services
+        ], batch_size=500)
+
+        orders = Order.objects.filter(owner=owner)
+        feed = Service.objects.filter(provider=provider, is_deal_of_the_day=True)
+        catalog = Service.objects.filter(provider=provider).annotate(provider_name=F('provider__name'))
+        order_plan, service_plan = plan_for(OrderSerializer), plan_for(ServiceSerializer)
+        cases = [
+            ('view_all_orders',
+             lambda: JSONRenderer().render(OrderSerializer(orders.all(), many=True).data),
+             lambda: ORJSONRenderer().render(order_plan.rows(orders.values(*order_plan.columns)))),
+            ('deal feed',
+             lambda: JSONRenderer().render(ServiceSerializer(feed.all(), many=True).data),
+             lambda: ORJSONRenderer().render(service_plan.rows(feed.values(*service_plan.columns)))),
+            ('list_services',
+             lambda: JSONRenderer().render(catalog_rows(catalog.all())),
+             lambda: ORJSONRenderer().render(list(catalog.values(*CATALOG_FIELDS)))),
+        ]
+
+        self.stdout.write(f'{rows} rows, best of {repeat}')
+        for name, slow, fast in cases:
+            slow_time, slow_content = self.best(repeat, slow)
+            fast_time, fast_content = self.best(repeat, fast)
+            if slow_content != fast_content:
+                raise CommandError(f'{name}: the fast path output differs')
+            self.stdout.write(
+                f'{name:16} serializer {slow_time * 1000:8.1f} ms   fast path {fast_time * 1000:8.1f} ms'
+                f'   x{slow_time / fast_time:.1f}'
+            )
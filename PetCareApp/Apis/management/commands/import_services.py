@@ -0,0 +1,43 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from Apis.models import ServiceProvider
+from Apis.service_import import FORMATS, read_rows, upsert_services
+
+EXTENSIONS = {'.json': 'json', '.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv'}
+
+
+class Command(BaseCommand):
+    help = "Create or update a provider's services from a JSON array, NDJSON or CSV file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('provider', help='Provider id or email')
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=sorted(set(FORMATS.values())),
+                            help='Input format (default: from the file extension)')
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        provider_ref = options['provider']
+        lookup = {'provider_id': provider_ref} if provider_ref.isdigit() else {'email': provider_ref}
+        try:
+            provider = ServiceProvider.objects.get(**lookup)
+        except ServiceProvider.DoesNotExist:
+            raise CommandError(f'No service provider {provider_ref!r}')
+
+        path = options['path']
+        input_format = options['format'] or EXTENSIONS.get(os.path.splitext(path)[1].lower())
+        if input_format is None:
+            raise CommandError('Cannot tell the format from the file name, pass --format')
+
+        with open(path, 'rb') as f:
+            summary = upsert_services(provider, read_rows(f, input_format), batch_size=options['batch_size'])
+
+        for error in summary['errors']:
+            self.stderr.write(f"row {error['row']}: {error['errors']}")
+        if summary['error_count'] > len(summary['errors']):
+            self.stderr.write(f"... {summary['error_count'] - len(summary['errors'])} more errors")
+        self.stdout.write(self.style.SUCCESS(
+            f"{summary['created']} created, {summary['updated']} updated, {summary['error_count']} errors"
+        ))
@@ -0,0 +1,68 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+
+from Apis.models import Cart, Order
+from Apis.sharding import shard_aliases, shard_for_owner
+
+
+class Command(BaseCommand):
+    help = (
+        'Move carts and orders to the shard their owner belongs on, after '
+        'ORDER_SHARDS changed. Owners being moved may briefly not see their '
+        'orders, so run it when order traffic is low (or run it again).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--retire', nargs='*', default=[], metavar='ALIAS',
+            help='Databases no longer in ORDER_SHARDS to move rows out of',
+        )
+        parser.add_argument('--batch-size', type=int, default=200, help='Owners moved per transaction')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would move')
+
+    def handle(self, *args, **options):
+        shards = shard_aliases()
+        unknown = [alias for alias in options['retire'] if alias not in settings.DATABASES]
+        if unknown:
+            raise CommandError(f'Unknown databases: {", ".join(unknown)}')
+        sources = shards + [alias for alias in options['retire'] if alias not in shards]
+
+        for model in (Cart, Order):
+            moved = 0
+            for source in sources:
+                owner_ids = model.objects.using(source).values_list('owner_id', flat=True).distinct().order_by()
+                moves = {}
+                for owner_id in owner_ids:
+                    target = shard_for_owner(owner_id, shards)
+                    if target != source:
+                        moves.setdefault(target, []).append(owner_id)
+                for target, owners in moves.items():
+                    for start in range(0, len(owners), options['batch_size']):
+                        batch = owners[start:start + options['batch_size']]
+                        moved += self.move(model, batch, source, target, options['dry_run'])
+            verb = 'would move' if options['dry_run'] else 'moved'
+            self.stdout.write(self.style.SUCCESS(f'{model.__name__}: {verb} {moved} rows'))
+
+    def move(self, model, owner_ids, source, target, dry_run):
+        rows = model.objects.using(source).filter(owner_id__in=owner_ids)
+        if dry_run:
+            return rows.count()
+        # The copy commits before the delete. If the delete fails the rows are
+        # on both shards, and the next run skips the copies already there.
+        with transaction.atomic(using=source), transaction.atomic(using=target):
+            rows = list(rows)
+            model.objects.using(target).bulk_create(rows, batch_size=500, ignore_conflicts=True)
+            self.delete_rows(model, source, [row.pk for row in rows])
+        return len(rows)
+
+    def delete_rows(self, model, alias, pks):
+        # Not .delete(): the rows are only moving, so no post_delete signals
+        # (the provider summaries must keep counting them, their slots stay
+        # booked)
+        quote = connections[alias].ops.quote_name
+        table, pk = quote(model._meta.db_table), quote(model._meta.pk.column)
+        with connections[alias].cursor() as cursor:
+            for start in range(0, len(pks), 500):
+                batch = pks[start:start + 500]
+                cursor.execute(f'DELETE FROM {table} WHERE {pk} IN ({", ".join(["%s"] * len(batch))})', batch)
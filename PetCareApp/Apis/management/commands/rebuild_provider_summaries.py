@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Apis.summaries import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute the provider dashboard summaries from the orders. '
+        'Orders changed while it runs may be counted twice or not at all, '
+        'so run it when order traffic is paused (or run it again).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('providers', nargs='*', type=int, help='Provider ids (default: all providers)')
+
+    def handle(self, *args, **options):
+        rows = rebuild(options['providers'] or None)
+        self.stdout.write(self.style.SUCCESS(f'{rows} summary rows written'))
@@ -0,0 +1,83 @@
+import datetime
+import multiprocessing
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from django.utils.module_loading import autodiscover_modules
+
+from Apis import task_queue
+
+
+class Command(BaseCommand):
+    help = 'Run queued background tasks (see Apis/task_queue.py) until stopped.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4, help='Tasks run at the same time')
+        parser.add_argument(
+            '--pool', choices=['thread', 'process'], default='thread',
+            help='Run tasks in threads, or in forked processes for CPU-bound tasks',
+        )
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds between looks for due tasks when idle')
+        parser.add_argument(
+            '--timeout', type=int, default=300,
+            help='Seconds after which a running task is presumed lost and run again',
+        )
+        parser.add_argument('--keep-days', type=int, default=7, help='Days finished tasks are kept')
+        parser.add_argument('--once', action='store_true', help='Exit when no task is due')
+
+    def handle(self, *args, **options):
+        autodiscover_modules('tasks')
+        self.stopping = False
+        previous_handler = signal.signal(signal.SIGTERM, self.stop)
+
+        concurrency = max(options['concurrency'], 1)
+        if options['pool'] == 'process':
+            # Fork every worker now, before this process opens connections
+            # the children would share
+            connections.close_all()
+            pool = ProcessPoolExecutor(concurrency, mp_context=multiprocessing.get_context('fork'))
+            pool.submit(int).result()
+        else:
+            pool = ThreadPoolExecutor(concurrency, thread_name_prefix='task')
+
+        counts = {'Done': 0, 'Queued': 0, 'Failed': 0}
+        running = set()
+        purged_at = None
+        try:
+            while not self.stopping:
+                now = timezone.now()
+                if purged_at is None or now - purged_at > datetime.timedelta(hours=1):
+                    task_queue.purge(now - datetime.timedelta(days=options['keep_days']))
+                    purged_at = now
+
+                free = concurrency - len(running)
+                tasks = task_queue.claim(free, options['timeout']) if free else []
+                running.update(pool.submit(task_queue.run, task) for task in tasks)
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll'])
+                    continue
+                # Straight back to claiming while tasks keep coming and there is room
+                timeout = 0 if tasks and len(running) < concurrency else options['poll']
+                finished, running = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    counts[future.result()] += 1
+        except KeyboardInterrupt:
+            pass
+        finally:
+            # Let the running tasks finish; the claimed ones not started yet
+            # are taken again after --timeout
+            pool.shutdown(wait=True, cancel_futures=True)
+            signal.signal(signal.SIGTERM, previous_handler)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['Done']} done, {counts['Queued']} to retry, {counts['Failed']} failed"
+        ))
+
+    def stop(self, signum, frame):
+        self.stopping = True
@@ -0,0 +1,199 @@
+"""
+Per-view request metrics in Prometheus text format.
+
+RequestMetricsMiddleware times every request and, through
+connection.execute_wrapper, every query it runs. The numbers are recorded in
+the process wide `registry` as histograms labelled by view name.
+
+Each worker process keeps its own totals. When METRICS['DIR'] is set they are
+also written to <DIR>/<pid>.json (at most every FLUSH_INTERVAL seconds), and
+/metrics sums the files of all workers, so any worker can answer a scrape.
+Clear the directory when the service is (re)started.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+# Histogram name -> (help text, bucket upper bounds)
+HISTOGRAMS = {
+    'petcare_request_duration_seconds': (
+        'Total time spent handling the request',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+    ),
+    'petcare_request_db_seconds': (
+        'Time spent in database queries per request',
+        (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+    ),
+    'petcare_request_queries': (
+        'Database queries per request',
+        (0, 1, 2, 3, 5, 10, 20, 50, 100),
+    ),
+    'petcare_response_size_bytes': (
+        'Response body size',
+        (100, 1000, 10000, 100000, 1000000, 10000000),
+    ),
+}
+
+
+def _settings():
+    return getattr(settings, 'METRICS', {})
+
+
+class MetricsRegistry:
+    """Histograms per (metric, view) for this process."""
+
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+
+    def observe(self, view, values):
+        """`values` maps histogram name -> observed value."""
+        with self._lock:
+            for name, value in values.items():
+                buckets = HISTOGRAMS[name][1]
+                series = self._series.setdefault(
+                    f'{name}|{view}', {'buckets': [0] * len(buckets), 'sum': 0, 'count': 0}
+                )
+                for i, bound in enumerate(buckets):
+                    if value <= bound:
+                        series['buckets'][i] += 1
+                series['sum'] += value
+                series['count'] += 1
+        self.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return json.loads(json.dumps(self._series))
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._flushed_at = 0.0
+
+    def _path(self, directory):
+        return os.path.join(directory, f'{os.getpid()}.json')
+
+    def flush(self, force=False):
+        """Write this process's totals to the metrics directory, if any."""
+        directory = _settings().get('DIR')
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._flushed_at < _settings().get('FLUSH_INTERVAL', 1.0):
+            return
+        self._flushed_at = now
+
+        os.makedirs(directory, exist_ok=True)
+        path = self._path(directory)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        # Readers only ever see a complete file
+        os.replace(tmp_path, path)
+
+    def collect(self):
+        """Totals of every worker (or just this one without a directory)."""
+        directory = _settings().get('DIR')
+        if not directory:
+            return self.snapshot()
+
+        self.flush(force=True)
+        totals = {}
+        for filename in os.listdir(directory):
+            if not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    series = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for key, data in series.items():
+                total = totals.setdefault(key, {'buckets': [0] * len(data['buckets']), 'sum': 0, 'count': 0})
+                total['buckets'] = [a + b for a, b in zip(total['buckets'], data['buckets'])]
+                total['sum'] += data['sum']
+                total['count'] += data['count']
+        return totals
+
+
+registry = MetricsRegistry()
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_prometheus(series):
+    """Render collected series in the Prometheus text exposition format."""
+    lines = []
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        views = sorted(key.split('|', 1)[1] for key in series if key.split('|', 1)[0] == name)
+        for view in views:
+            data = series[f'{name}|{view}']
+            label = f'view="{_escape(view)}"'
+            for bound, count in zip(buckets, data['buckets']):
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {count}')
+            lines.append(f'{name}_bucket{{{label},le="+Inf"}} {data["count"]}')
+            lines.append(f'{name}_sum{{{label}}} {data["sum"]}')
+            lines.append(f'{name}_count{{{label}}} {data["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class QueryRecorder:
+    """execute_wrapper that counts and times the queries run through it."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, DB time, total latency and response size per view,
+    and reports them to the client in a Server-Timing header.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        duration = time.perf_counter() - start
+
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        values = {
+            'petcare_request_duration_seconds': duration,
+            'petcare_request_db_seconds': recorder.duration,
+            'petcare_request_queries': recorder.count,
+        }
+        if not response.streaming:
+            values['petcare_response_size_bytes'] = len(response.content)
+        registry.observe(view, values)
+
+        response['Server-Timing'] = (
+            f'db;dur={recorder.duration * 1000:.2f};desc="{recorder.count} queries", '
+            f'app;dur={(duration - recorder.duration) * 1000:.2f}, '
+            f'total;dur={duration * 1000:.2f}'
+        )
+        return response
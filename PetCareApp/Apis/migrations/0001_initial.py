@@ -0,0 +1,125 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:05
+
+import django.contrib.auth.models
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('email', models.EmailField(max_length=254, unique=True)),
+                ('username', models.CharField(max_length=20, unique=True)),
+                ('password', models.CharField(max_length=128)),
+                ('phone_number', models.CharField(blank=True, max_length=15)),
+                ('address', models.TextField(blank=True)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+            ],
+            options={
+                'permissions': [('can_view_user', 'Can view user')],
+            },
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Owner',
+            fields=[
+                ('user_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, to=settings.AUTH_USER_MODEL)),
+                ('owner_id', models.AutoField(primary_key=True, serialize=False)),
+                ('owner_name', models.CharField(max_length=100)),
+                ('pet_name', models.CharField(max_length=100)),
+                ('pet_age', models.PositiveIntegerField()),
+                ('animal_type', models.CharField(max_length=50)),
+            ],
+            options={
+                'permissions': [('can_view_owner', 'Can view owner')],
+            },
+            bases=('Apis.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ServiceProvider',
+            fields=[
+                ('user_ptr', models.OneToOneField(auto_created=True, on_delete=django.db.models.deletion.CASCADE, parent_link=True, to=settings.AUTH_USER_MODEL)),
+                ('provider_id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=100)),
+            ],
+            options={
+                'permissions': [('can_view_service_provider', 'Can view service provider')],
+            },
+            bases=('Apis.user',),
+            managers=[
+                ('objects', django.contrib.auth.models.UserManager()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Order',
+            fields=[
+                ('order_id', models.AutoField(primary_key=True, serialize=False)),
+                ('service_id', models.IntegerField()),
+                ('service_name', models.CharField(max_length=100)),
+                ('scheduled_date_time', models.DateTimeField()),
+                ('service_provider_name', models.CharField(max_length=100)),
+                ('service_charges', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Placed', 'Placed'), ('Processed', 'Processed'), ('Completed', 'Completed'), ('Cancelled', 'Cancelled')], default='Placed', max_length=20)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Apis.owner')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Favorites',
+            fields=[
+                ('favorites_id', models.AutoField(primary_key=True, serialize=False)),
+                ('service_name', models.CharField(max_length=100)),
+                ('service_provider_name', models.CharField(max_length=100)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='favorites', to='Apis.owner')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Cart',
+            fields=[
+                ('cart_id', models.AutoField(primary_key=True, serialize=False)),
+                ('service_id', models.IntegerField()),
+                ('service_name', models.CharField(max_length=100)),
+                ('scheduled_date_time', models.DateTimeField(default=django.utils.timezone.now)),
+                ('service_provider_name', models.CharField(max_length=100)),
+                ('service_charges', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Apis.owner')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Service',
+            fields=[
+                ('service_id', models.AutoField(primary_key=True, serialize=False)),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('description', models.TextField()),
+                ('service_name', models.CharField(max_length=100)),
+                ('reviews', models.TextField(default='[]')),
+                ('is_todays_special', models.BooleanField(default=False)),
+                ('is_deal_of_the_day', models.BooleanField(default=False)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='Apis.serviceprovider')),
+            ],
+        ),
+    ]
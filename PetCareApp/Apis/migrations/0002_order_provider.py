@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_order_provider(apps, schema_editor):
+    Order = apps.get_model('Apis', 'Order')
+    Service = apps.get_model('Apis', 'Service')
+    providers = Service.objects.filter(service_id=OuterRef('service_id')).values('provider_id')[:1]
+    Order.objects.using(schema_editor.connection.alias).update(provider_id=Subquery(providers))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='provider',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='Apis.serviceprovider'),
+        ),
+        migrations.RunPython(backfill_order_provider, migrations.RunPython.noop),
+    ]
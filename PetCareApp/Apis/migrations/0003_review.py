@@ -0,0 +1,108 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:06
+
+import json
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def _legacy_review(entry):
+    # The blob held whatever clients posted: plain strings or small dicts.
+    if isinstance(entry, dict):
+        rating = entry.get('rating')
+        if not isinstance(rating, int) or not 1 <= rating <= 5:
+            rating = None
+        text = entry.get('review') or entry.get('comment') or json.dumps(entry)
+        return str(text), rating
+    if isinstance(entry, str):
+        return entry, None
+    return json.dumps(entry), None
+
+
+def copy_review_blobs(apps, schema_editor):
+    Service = apps.get_model('Apis', 'Service')
+    Review = apps.get_model('Apis', 'Review')
+    db = schema_editor.connection.alias
+
+    services = Service.objects.using(db).exclude(reviews__in=['', '[]']).only('service_id', 'reviews')
+    for service in services.iterator(chunk_size=500):
+        try:
+            entries = json.loads(service.reviews)
+        except ValueError:
+            continue
+        if not isinstance(entries, list) or not entries:
+            continue
+
+        reviews = []
+        for entry in entries:
+            text, rating = _legacy_review(entry)
+            reviews.append(Review(service_id=service.service_id, review=text, rating=rating))
+        Review.objects.using(db).bulk_create(reviews, batch_size=500)
+
+        ratings = [review.rating for review in reviews if review.rating is not None]
+        Service.objects.using(db).filter(service_id=service.service_id).update(
+            review_count=len(reviews),
+            rating_count=len(ratings),
+            rating_total=sum(ratings),
+            average_rating=round(sum(ratings) / len(ratings), 2) if ratings else None,
+        )
+
+
+def restore_review_blobs(apps, schema_editor):
+    Service = apps.get_model('Apis', 'Service')
+    Review = apps.get_model('Apis', 'Review')
+    db = schema_editor.connection.alias
+
+    for service in Service.objects.using(db).filter(review_count__gt=0).only('service_id').iterator():
+        texts = list(
+            Review.objects.using(db).filter(service_id=service.service_id)
+            .order_by('review_id').values_list('review', flat=True)
+        )
+        Service.objects.using(db).filter(service_id=service.service_id).update(reviews=json.dumps(texts))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0002_order_provider'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='average_rating',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='rating_total',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='service',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Review',
+            fields=[
+                ('review_id', models.AutoField(primary_key=True, serialize=False)),
+                ('review', models.TextField()),
+                ('rating', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='reviews', to='Apis.owner')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='review_set', to='Apis.service')),
+            ],
+        ),
+        migrations.RunPython(copy_review_blobs, restore_review_blobs),
+        migrations.RemoveField(
+            model_name='service',
+            name='reviews',
+        ),
+    ]
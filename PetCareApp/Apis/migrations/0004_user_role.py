@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:12
+
+from django.db import migrations, models
+
+
+def backfill_user_role(apps, schema_editor):
+    User = apps.get_model('Apis', 'User')
+    Owner = apps.get_model('Apis', 'Owner')
+    ServiceProvider = apps.get_model('Apis', 'ServiceProvider')
+    db = schema_editor.connection.alias
+
+    User.objects.using(db).filter(
+        id__in=Owner.objects.using(db).values('user_ptr_id')
+    ).update(role='owner')
+    User.objects.using(db).filter(
+        id__in=ServiceProvider.objects.using(db).values('user_ptr_id')
+    ).update(role='provider')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0003_review'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='role',
+            field=models.CharField(blank=True, choices=[('owner', 'Owner'), ('provider', 'Service provider')], default='', max_length=20),
+        ),
+        migrations.RunPython(backfill_user_role, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:27
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderOrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('service_id', models.IntegerField()),
+                ('service_name', models.CharField(max_length=100)),
+                ('status', models.CharField(max_length=20)),
+                ('order_count', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_summaries', to='Apis.serviceprovider')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('provider', 'day', 'service_id', 'status'), name='provider_summary_key')],
+            },
+        ),
+    ]
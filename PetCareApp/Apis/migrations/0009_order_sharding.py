@@ -0,0 +1,52 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_owner_name(apps, schema_editor):
+    Order = apps.get_model('Apis', 'Order')
+    Owner = apps.get_model('Apis', 'Owner')
+    db = schema_editor.connection.alias
+    names = Owner.objects.using(db).filter(owner_id=OuterRef('owner_id')).values('owner_name')[:1]
+    Order.objects.using(db).update(owner_name=Coalesce(Subquery(names), Value('')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0008_provider_order_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('name', models.CharField(max_length=50, primary_key=True, serialize=False)),
+                ('next_id', models.BigIntegerField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='owner_name',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.RunPython(backfill_owner_name, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cart',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='Apis.owner'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='owner',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='Apis.owner'),
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='provider',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='Apis.serviceprovider'),
+        ),
+    ]
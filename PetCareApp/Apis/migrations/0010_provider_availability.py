@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Apis', '0009_order_sharding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AvailabilityTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+                ('slot_minutes', models.PositiveIntegerField(default=60)),
+                ('capacity', models.PositiveIntegerField(default=1)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='Apis.serviceprovider')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'weekday'], name='availability_provider_day_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Booking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.IntegerField(unique=True)),
+                ('slot_start', models.DateTimeField()),
+                ('slot_end', models.DateTimeField()),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='Apis.serviceprovider')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'slot_start'], name='booking_provider_start_idx')],
+            },
+        ),
+    ]
@@ -3,6 +3,8 @@ from django.db import models
 from django.contrib.auth.models import AbstractUser
 
 from Apis.models.Users import User
+from Apis.models.Provider_models import ServiceProvider
+from Apis.sharding import OwnerShardQuerySet, assign_ids
 
 # Create your models here.
 
@@ -13,6 +15,11 @@ class Owner(User):
     pet_name = models.CharField(max_length=100)
     pet_age = models.PositiveIntegerField()
     animal_type = models.CharField(max_length=50)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def save(self, *args, **kwargs):
+        self.role = User.OWNER
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f'{self.email} - {self.owner_name}'
@@ -23,15 +30,27 @@ class Owner(User):
         ]
 
         
+# Carts and orders may live on another database than their owner
+# (ORDER_SHARDS, see Apis/sharding.py), so their foreign keys have no
+# database constraint.
+
 # Cart Model
 class Cart(models.Model):
     cart_id = models.AutoField(primary_key=True)
-    owner = models.ForeignKey(Owner, on_delete=models.CASCADE)
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, db_constraint=False)
     service_id = models.IntegerField()
     service_name = models.CharField(max_length=100)
     scheduled_date_time = models.DateTimeField(default=timezone.now)
     service_provider_name = models.CharField(max_length=100)
     service_charges = models.DecimalField(max_digits=10, decimal_places=2)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        if self.pk is None and assign_ids([self]):
+            kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f'Cart {self.cart_id} - Service: {self.service_name}'
@@ -45,19 +64,65 @@ class Order(models.Model):
         ('Cancelled', 'Cancelled'),
     ]
 
+    # Status -> statuses a provider may move it to
+    ALLOWED_TRANSITIONS = {
+        'Placed': ['Processed', 'Completed', 'Cancelled'],
+        'Processed': ['Completed', 'Cancelled'],
+        'Completed': [],
+        'Cancelled': [],
+    }
+
     order_id = models.AutoField(primary_key=True)
-    owner = models.ForeignKey(Owner, on_delete=models.CASCADE)
+    owner = models.ForeignKey(Owner, on_delete=models.CASCADE, db_constraint=False)
+    # Copied from the owner (and kept in step by a signal), so provider
+    # order lists need no join, which would not work across shards
+    owner_name = models.CharField(max_length=100, blank=True, default='')
     service_id = models.IntegerField()
+    # Denormalized from Service.provider so provider order lookups are a
+    # single indexed query. Kept when the service or provider goes away.
+    provider = models.ForeignKey(
+        ServiceProvider, on_delete=models.SET_NULL, null=True, blank=True, related_name='orders', db_constraint=False,
+    )
     service_name = models.CharField(max_length=100)
     scheduled_date_time = models.DateTimeField()
     service_provider_name = models.CharField(max_length=100)
     service_charges = models.DecimalField(max_digits=10, decimal_places=2)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Placed')
+    # Set on every save; queryset .update() calls must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = OwnerShardQuerySet.as_manager()
 
     
+    @classmethod
+    def statuses_leading_to(cls, status):
+        return [source for source, targets in cls.ALLOWED_TRANSITIONS.items() if status in targets]
+
+    def save(self, *args, **kwargs):
+        if not self.owner_name and self.owner_id is not None:
+            self.owner_name = self.owner.owner_name
+        if self.pk is None and assign_ids([self]):
+            kwargs['force_insert'] = True
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f'Order {self.order_id} - Service: {self.service_name}'
 
+    class Meta:
+        indexes = [
+            # An owner's orders by status, and the search_orders fallback
+            models.Index(fields=['owner', 'status'], name='order_owner_status_idx'),
+            models.Index(fields=['owner', 'service_name'], name='order_owner_service_idx'),
+        ]
+
+# Next id of sharded rows, shared by all shards. Lives on the default database.
+class IdSequence(models.Model):
+    name = models.CharField(max_length=50, primary_key=True)
+    next_id = models.BigIntegerField()
+
+    def __str__(self):
+        return f'{self.name}: {self.next_id}'
+
 class Favorites(models.Model):
     favorites_id = models.AutoField(primary_key=True)  # Unique identifier for the favorite
     owner = models.ForeignKey(Owner, on_delete=models.CASCADE, related_name='favorites')
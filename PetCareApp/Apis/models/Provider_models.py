@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, FloatField
+from django.db.models.functions import Cast
 from django.contrib.auth.models import AbstractUser
-import json
+from django.utils import timezone
 from Apis.models.Users import User
 
 # Create your models here.
@@ -9,7 +11,11 @@ from Apis.models.Users import User
 class ServiceProvider(User):
     provider_id = models.AutoField(primary_key=True)
     name = models.CharField(max_length=100)
+    updated_at = models.DateTimeField(auto_now=True)
 
+    def save(self, *args, **kwargs):
+        self.role = User.PROVIDER
+        super().save(*args, **kwargs)
     
     def __str__(self):
         return f'{self.email} - {self.name}'
@@ -27,18 +33,126 @@ class Service(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField()
     service_name = models.CharField(max_length=100)
-    reviews = models.TextField(default='[]') 
     is_todays_special = models.BooleanField(default=False)
     is_deal_of_the_day = models.BooleanField(default=False)
+    # Review aggregates, maintained incrementally by add_review() so listings
+    # never have to read the Review table.
+    review_count = models.PositiveIntegerField(default=0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_total = models.PositiveIntegerField(default=0)
+    average_rating = models.DecimalField(max_digits=3, decimal_places=2, null=True, blank=True)
+    # Set on every save; queryset .update() calls must set it themselves
+    updated_at = models.DateTimeField(auto_now=True)
 
-    def get_reviews(self):
-        return json.loads(self.reviews)  
-
-    def add_review(self, review):
-        reviews = json.loads(self.reviews)
-        reviews.append(review)
-        self.reviews = json.dumps(reviews)
-        self.save()
+    def add_review(self, review, rating=None, owner=None):
+        with transaction.atomic():
+            created = Review.objects.create(service=self, owner=owner, review=review, rating=rating)
+            updates = {'review_count': F('review_count') + 1, 'updated_at': timezone.now()}
+            if rating is not None:
+                updates['rating_count'] = F('rating_count') + 1
+                updates['rating_total'] = F('rating_total') + rating
+                updates['average_rating'] = ExpressionWrapper(
+                    Cast(F('rating_total') + rating, FloatField()) / (F('rating_count') + 1),
+                    output_field=DecimalField(max_digits=3, decimal_places=2),
+                )
+            # Single UPDATE computed by the database, safe under concurrent reviews
+            Service.objects.filter(service_id=self.service_id).update(**updates)
+        self.refresh_from_db(fields=['review_count', 'rating_count', 'rating_total', 'average_rating', 'updated_at'])
+        return created
 
     def __str__(self):
         return self.service_name
+
+    class Meta:
+        indexes = [
+            # The deal and special feeds only ever read the few flagged rows
+            models.Index(fields=['service_id'], condition=models.Q(is_deal_of_the_day=True), name='service_deal_idx'),
+            models.Index(fields=['service_id'], condition=models.Q(is_todays_special=True), name='service_special_idx'),
+            # Upsert key of the bulk import
+            models.Index(fields=['provider', 'service_name'], name='service_provider_name_idx'),
+        ]
+
+
+# Review Model
+class Review(models.Model):
+    review_id = models.AutoField(primary_key=True)
+    service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='review_set')
+    owner = models.ForeignKey('Owner', on_delete=models.SET_NULL, null=True, blank=True, related_name='reviews')
+    review = models.TextField()
+    rating = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f'Review {self.review_id} - Service: {self.service_id}'
+
+
+# Provider dashboard aggregates, one row per (provider, day, service, status).
+# Maintained incrementally by Apis/summaries.py; rebuilt from the orders by
+# `manage.py rebuild_provider_summaries`.
+class ProviderOrderSummary(models.Model):
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='order_summaries')
+    # Local date of the orders' scheduled time
+    day = models.DateField()
+    service_id = models.IntegerField()
+    service_name = models.CharField(max_length=100)
+    status = models.CharField(max_length=20)
+    order_count = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f'{self.provider_id} {self.day} {self.service_name} {self.status}: {self.order_count}'
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'day', 'service_id', 'status'], name='provider_summary_key'),
+        ]
+
+
+# Working hours of a provider on one weekday, cut into slots of
+# slot_minutes that each take up to `capacity` bookings. A provider may have
+# several windows a day; one without any takes orders at any time.
+class AvailabilityTemplate(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='availability')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    # Local time (settings.TIME_ZONE)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    slot_minutes = models.PositiveIntegerField(default=60)
+    capacity = models.PositiveIntegerField(default=1)
+
+    def __str__(self):
+        return f'{self.provider_id} {self.get_weekday_display()} {self.start_time}-{self.end_time}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', 'weekday'], name='availability_provider_day_idx'),
+        ]
+
+
+# The slot an order takes from its provider's capacity. Orders may be on
+# another database (see Apis/sharding.py), so order_id is a plain column.
+class Booking(models.Model):
+    provider = models.ForeignKey(ServiceProvider, on_delete=models.CASCADE, related_name='bookings')
+    order_id = models.IntegerField(unique=True)
+    slot_start = models.DateTimeField()
+    slot_end = models.DateTimeField()
+
+    def __str__(self):
+        return f'Order {self.order_id}: {self.slot_start} - {self.slot_end}'
+
+    class Meta:
+        indexes = [
+            # Bookings overlapping a time range are found by a range scan on
+            # slot_start, bounded by the longest slot (Apis/availability.py)
+            models.Index(fields=['provider', 'slot_start'], name='booking_provider_start_idx'),
+        ]
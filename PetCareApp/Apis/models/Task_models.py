@@ -0,0 +1,37 @@
+from django.db import models
+from django.utils import timezone
+
+
+# A background task, queued by Apis/task_queue.py and run by
+# `manage.py run_tasks`.
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('Queued', 'Queued'),
+        ('Running', 'Running'),
+        ('Done', 'Done'),
+        ('Failed', 'Failed'),
+    ]
+
+    task_id = models.BigAutoField(primary_key=True)
+    # Registered name of the task function
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # Optional idempotency key, a task is queued once per key
+    key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='Queued')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    # Queued: when it may run. Running: when its worker is presumed dead and
+    # another may take it. Done or Failed: when it finished.
+    run_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.task_id} {self.name}: {self.status}'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='task_status_run_at_idx'),
+        ]
@@ -4,14 +4,42 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 
 class User(AbstractUser):
+    OWNER = 'owner'
+    PROVIDER = 'provider'
+    ROLE_CHOICES = [
+        (OWNER, 'Owner'),
+        (PROVIDER, 'Service provider'),
+    ]
+
     email = models.EmailField(unique=True)
     username = models.CharField(max_length=20, unique=True)
     password = models.CharField(max_length=128, null=False)
     phone_number = models.CharField(max_length=15, blank=True)
     address = models.TextField(blank=True)
+    # Which profile subclass (Owner / ServiceProvider) this user has, so the
+    # role is known without probing the subclass tables.
+    role = models.CharField(max_length=20, choices=ROLE_CHOICES, blank=True, default='')
     
     def __str__(self):
         return self.email
+
+    @property
+    def profile(self):
+        """
+        The Owner or ServiceProvider row of this user, or None. Free when the
+        user was loaded by ProfileTokenAuthentication, which joins both.
+        """
+        if type(self) is not User:
+            # Already an Owner / ServiceProvider instance
+            return self
+        try:
+            if self.role == self.OWNER:
+                return self.owner
+            if self.role == self.PROVIDER:
+                return self.serviceprovider
+        except models.ObjectDoesNotExist:
+            pass
+        return None
     
     class Meta:
         permissions = [
@@ -1,5 +1,6 @@
 # Apis/models/__init__.py
 
-from .Owner_models import Owner, Cart, Order, Favorites
-from .Provider_models import ServiceProvider, Service
+from .Owner_models import Owner, Cart, Order, Favorites, IdSequence
+from .Provider_models import ServiceProvider, Service, Review, ProviderOrderSummary, AvailabilityTemplate, Booking
 from .Users import User
+from .Task_models import Task
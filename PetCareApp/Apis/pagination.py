@@ -0,0 +1,102 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+# Keyset (cursor) pagination over the AutoField primary keys.
+# Pages are fetched with "WHERE pk > <cursor> ORDER BY pk LIMIT n" so deep
+# pages cost the same as the first one, unlike OFFSET based pagination.
+class KeysetPagination(CursorPagination):
+    page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 50)
+    max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 500)
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+
+    def __init__(self, ordering):
+        self.ordering = ordering
+
+
+def get_paginator(request, ordering, always=False):
+    """
+    Return a KeysetPagination ordered on `ordering` (the model's primary key
+    field name) when the client opted in with `cursor` or `page_size`, or
+    None so the endpoint keeps returning the full list.
+    """
+    params = request.query_params
+    if always or 'cursor' in params or 'page_size' in params:
+        return KeysetPagination(ordering)
+    return None
+
+
+def paginate(request, queryset, ordering, always=False):
+    """
+    Apply keyset pagination to `queryset` if requested.
+
+    Returns `(paginator, rows)`; `paginator` is None when pagination is not
+    in use and `rows` is then the queryset itself.
+    """
+    paginator = get_paginator(request, ordering, always=always)
+    if paginator is None:
+        return None, queryset
+    return paginator, paginator.paginate_queryset(queryset, request)
+
+
+def paginated_response(paginator, data, **kwargs):
+    """
+    Wrap `data` in a `{next, previous, results}` envelope when paginated.
+    """
+    if paginator is None:
+        return Response(data, **kwargs)
+    response = paginator.get_paginated_response(data)
+    if 'status' in kwargs:
+        response.status_code = kwargs['status']
+    return response
+
+
+# Page number pagination for relevance ranked results (search), which have no
+# unique increasing key to seek on. One extra row is fetched to detect
+# whether a next page exists, so no COUNT(*) is needed.
+class RankedPagination:
+    page_query_param = 'page'
+    page_size_query_param = 'page_size'
+
+    def __init__(self, request):
+        self.request = request
+        self.page = self._positive_int(request.query_params.get(self.page_query_param), 1)
+        self.page_size = min(
+            self._positive_int(request.query_params.get(self.page_size_query_param), KeysetPagination.page_size),
+            KeysetPagination.max_page_size,
+        )
+
+    @staticmethod
+    def _positive_int(value, default):
+        try:
+            value = int(value)
+        except (TypeError, ValueError):
+            return default
+        return value if value > 0 else default
+
+    @property
+    def offset(self):
+        return (self.page - 1) * self.page_size
+
+    @property
+    def limit(self):
+        return self.page_size + 1
+
+    def get_paginated_response(self, rows, serialize):
+        """`rows` is the result of fetching `limit` rows from `offset`."""
+        url = self.request.build_absolute_uri()
+        has_next = len(rows) > self.page_size
+        next_url = replace_query_param(url, self.page_query_param, self.page + 1) if has_next else None
+        previous_url = None
+        if self.page == 2:
+            previous_url = remove_query_param(url, self.page_query_param)
+        elif self.page > 2:
+            previous_url = replace_query_param(url, self.page_query_param, self.page - 1)
+        return Response({
+            'next': next_url,
+            'previous': previous_url,
+            'results': serialize(rows[:self.page_size]),
+        })
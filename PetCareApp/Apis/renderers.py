@@ -0,0 +1,45 @@
+"""
+orjson based JSON renderer.
+
+ORJSONRenderer produces the same bytes as DRF's JSONRenderer with the
+default settings: compact separators, UTF-8 output and U+2028/U+2029
+escaped. Values orjson has no (or a different) encoding for, such as Decimal,
+datetime, date, time and lazy strings, are handed to DRF's own
+JSONEncoder.default. Floats print the same as json.dumps except in exponent
+notation (1e16 vs 1e+16), which none of this API's fields can reach.
+
+Indented output (the browsable API, `Accept: application/json; indent=4`),
+non-default JSON settings and data orjson refuses (integers beyond 64 bits,
+very deep nesting) are left to JSONRenderer, as is everything when orjson is
+not installed.
+"""
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Let datetime/date/time reach JSONEncoder.default, which writes UTC as "Z"
+    ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+class ORJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+
+        renderer_context = renderer_context or {}
+        if (orjson is None or self.ensure_ascii or self.strict or not self.compact
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            content = orjson.dumps(data, default=self.encoder_class().default, option=ORJSON_OPTIONS)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same JavaScript-safe escaping as JSONRenderer
+        return content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
@@ -0,0 +1,115 @@
+"""
+Read replica routing.
+
+Views decorated with @replica_reads run their queries against one of
+settings.DATABASE_REPLICAS on GET/HEAD requests. Everything else, including
+authentication (which runs before the view body) and every write, uses the
+primary.
+
+Replicas lag behind the primary. So after a user makes a successful unsafe
+request, ReplicaPinMiddleware pins that user to the primary for
+REPLICA_PIN_SECONDS, and they always read what they just wrote. Pins live in
+the default Django cache, which must be shared between workers so the pin
+holds whichever worker serves the next request: with replicas configured,
+a local memory default cache is refused at startup.
+"""
+import contextvars
+import random
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_replica_reads = contextvars.ContextVar('replica_reads', default=False)
+
+
+def replica_aliases():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+def check_pin_cache():
+    """Raise ImproperlyConfigured if replicas are used with a per-process cache."""
+    if replica_aliases() and isinstance(caches[DEFAULT_CACHE_ALIAS], LocMemCache):
+        raise ImproperlyConfigured(
+            'DATABASE_REPLICAS needs a default cache shared between workers for the '
+            'read-your-writes pins; LocMemCache is per process (unset PETCARE_CACHE '
+            'or set it to file).'
+        )
+
+
+def _pin_key(user_id):
+    return f'replica_pin:{user_id}'
+
+
+def pin_to_primary(user):
+    cache.set(_pin_key(user.pk), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user):
+    return bool(user and user.is_authenticated and cache.get(_pin_key(user.pk)))
+
+
+class ReplicaRouter:
+    """Reads inside @replica_reads go to a replica, everything else to the primary."""
+
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        if not replicas or not _replica_reads.get():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # Reads in a transaction must see its own writes
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        # Explicitly, or objects read from a replica would be saved back to it
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+def replica_reads(view):
+    """
+    Let a GET view read from a replica, unless the user is pinned to the
+    primary. Put it directly above the view function, under @api_view, so
+    the user is already authenticated.
+
+    Not for cached views: a miss right after a write would cache what a
+    lagging replica returned under the new cache version.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method not in SAFE_METHODS or not replica_aliases() or is_pinned(request.user):
+            return view(request, *args, **kwargs)
+        token = _replica_reads.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    return wrapper
+
+
+class ReplicaPinMiddleware:
+    """Pin users to the primary for a while after each successful write."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        # DRF sets request.user on the underlying request when it authenticates
+        user = getattr(request, 'user', None)
+        if (request.method not in SAFE_METHODS and response.status_code < 400
+                and user is not None and user.is_authenticated and replica_aliases()):
+            pin_to_primary(user)
+        return response
@@ -0,0 +1,215 @@
+"""
+Full-text search over orders and services.
+
+On SQLite the text lives in FTS5 tables that triggers keep in sync with
+Apis_service and Apis_order. On PostgreSQL the same queries run against GIN
+indexes on to_tsvector() expressions. Both are (re)installed after every
+migrate by install_search_index(), since SQLite drops triggers whenever a
+migration rebuilds a table. Any other backend, or a SQLite build without
+FTS5, falls back to icontains lookups.
+"""
+import logging
+import re
+
+from django.db import DatabaseError, connections
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TABLE = 'Apis_service'
+ORDER_TABLE = 'Apis_order'
+SERVICE_FTS = 'Apis_service_fts'
+ORDER_FTS = 'Apis_order_fts'
+
+# service_name matches rank above description matches
+SERVICE_NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+_SQLITE_TRIGGERS = {
+    'Apis_service_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_service_fts_ai AFTER INSERT ON {SERVICE_TABLE} BEGIN
+            INSERT INTO {SERVICE_FTS}(rowid, service_name, description)
+            VALUES (new.service_id, new.service_name, new.description);
+        END""",
+    'Apis_service_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_service_fts_ad AFTER DELETE ON {SERVICE_TABLE} BEGIN
+            INSERT INTO {SERVICE_FTS}({SERVICE_FTS}, rowid, service_name, description)
+            VALUES ('delete', old.service_id, old.service_name, old.description);
+        END""",
+    'Apis_service_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_service_fts_au AFTER UPDATE OF service_name, description ON {SERVICE_TABLE} BEGIN
+            INSERT INTO {SERVICE_FTS}({SERVICE_FTS}, rowid, service_name, description)
+            VALUES ('delete', old.service_id, old.service_name, old.description);
+            INSERT INTO {SERVICE_FTS}(rowid, service_name, description)
+            VALUES (new.service_id, new.service_name, new.description);
+        END""",
+    # The order index is contentless and carries an "o<owner_id>" token so an
+    # owner's matches come straight out of the FTS index.
+    'Apis_order_fts_ai': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_order_fts_ai AFTER INSERT ON {ORDER_TABLE} BEGIN
+            INSERT INTO {ORDER_FTS}(rowid, service_name, owner_key)
+            VALUES (new.order_id, new.service_name, 'o' || new.owner_id);
+        END""",
+    'Apis_order_fts_ad': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_order_fts_ad AFTER DELETE ON {ORDER_TABLE} BEGIN
+            INSERT INTO {ORDER_FTS}({ORDER_FTS}, rowid, service_name, owner_key)
+            VALUES ('delete', old.order_id, old.service_name, 'o' || old.owner_id);
+        END""",
+    'Apis_order_fts_au': f"""
+        CREATE TRIGGER IF NOT EXISTS Apis_order_fts_au AFTER UPDATE OF service_name, owner_id ON {ORDER_TABLE} BEGIN
+            INSERT INTO {ORDER_FTS}({ORDER_FTS}, rowid, service_name, owner_key)
+            VALUES ('delete', old.order_id, old.service_name, 'o' || old.owner_id);
+            INSERT INTO {ORDER_FTS}(rowid, service_name, owner_key)
+            VALUES (new.order_id, new.service_name, 'o' || new.owner_id);
+        END""",
+}
+
+_POSTGRES_INDEXES = [
+    f"""CREATE INDEX IF NOT EXISTS Apis_service_fts_idx ON "{SERVICE_TABLE}"
+        USING gin (to_tsvector('english', service_name || ' ' || description))""",
+    f"""CREATE INDEX IF NOT EXISTS Apis_order_fts_idx ON "{ORDER_TABLE}"
+        USING gin (to_tsvector('english', service_name))""",
+]
+
+
+def search_terms(text):
+    """Split free text into lowercase word tokens safe to embed in a query."""
+    return re.findall(r'\w+', (text or '').lower())
+
+
+def _sqlite_match(terms):
+    # Every term must match, as a prefix so partial words still hit
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _postgres_tsquery(terms):
+    return ' & '.join(f'{term}:*' for term in terms)
+
+
+def install_search_index(using='default'):
+    """
+    Create the FTS tables/triggers (SQLite) or GIN indexes (PostgreSQL) if
+    missing. Rebuilds the SQLite index when triggers had to be recreated,
+    since rows may have changed while they were absent.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in _POSTGRES_INDEXES:
+                cursor.execute(statement)
+            return True
+        if connection.vendor != 'sqlite':
+            return False
+
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {SERVICE_FTS} USING fts5("
+                f"service_name, description, content='{SERVICE_TABLE}', content_rowid='service_id')"
+            )
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {ORDER_FTS} USING fts5("
+                f"service_name, owner_key, content='')"
+            )
+        except DatabaseError:
+            logger.warning('SQLite FTS5 is not available, search falls back to LIKE queries')
+            return False
+
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")
+        existing = {row[0] for row in cursor.fetchall()}
+        missing = [name for name in _SQLITE_TRIGGERS if name not in existing]
+        for name in missing:
+            cursor.execute(_SQLITE_TRIGGERS[name])
+
+        if missing:
+            cursor.execute(f"INSERT INTO {SERVICE_FTS}({SERVICE_FTS}) VALUES ('rebuild')")
+            cursor.execute(f"INSERT INTO {ORDER_FTS}({ORDER_FTS}) VALUES ('delete-all')")
+            cursor.execute(
+                f"INSERT INTO {ORDER_FTS}(rowid, service_name, owner_key) "
+                f"SELECT order_id, service_name, 'o' || owner_id FROM {ORDER_TABLE}"
+            )
+    return True
+
+
+def _no_limit(connection, limit):
+    if limit is None:
+        return -1 if connection.vendor == 'sqlite' else None
+    return limit
+
+
+def search_service_ids(text, offset, limit=None, using='default'):
+    """
+    Return ids of services matching `text`, best match first, or None when
+    there is nothing to match on or no full-text index, and the caller
+    should fall back to a plain filter.
+    """
+    terms = search_terms(text)
+    connection = connections[using]
+    limit = _no_limit(connection, limit)
+    if not terms:
+        return None
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {SERVICE_FTS} WHERE {SERVICE_FTS} MATCH %s "
+            f"ORDER BY bm25({SERVICE_FTS}, {SERVICE_NAME_WEIGHT}, {DESCRIPTION_WEIGHT}), rowid "
+            f"LIMIT %s OFFSET %s"
+        )
+        params = [_sqlite_match(terms), limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"""SELECT service_id FROM "{SERVICE_TABLE}", to_tsquery('english', %s) query """
+            f"""WHERE to_tsvector('english', service_name || ' ' || description) @@ query """
+            f"""ORDER BY ts_rank(to_tsvector('english', service_name || ' ' || description), query) DESC, service_id """
+            f"""LIMIT %s OFFSET %s"""
+        )
+        params = [_postgres_tsquery(terms), limit, offset]
+    else:
+        return None
+    return _fetch_ids(connection, sql, params)
+
+
+def search_order_ids(text, owner_id, offset, limit=None, using='default'):
+    """
+    Return ids of `owner_id`'s orders whose service name matches `text`,
+    best match first, or None when the caller should fall back.
+    """
+    terms = search_terms(text)
+    connection = connections[using]
+    limit = _no_limit(connection, limit)
+    if not terms:
+        return None
+
+    if connection.vendor == 'sqlite':
+        sql = (
+            f"SELECT rowid FROM {ORDER_FTS} WHERE {ORDER_FTS} MATCH %s "
+            f"ORDER BY rank, rowid LIMIT %s OFFSET %s"
+        )
+        match = f'owner_key : "o{int(owner_id)}" AND service_name : ({_sqlite_match(terms)})'
+        params = [match, limit, offset]
+    elif connection.vendor == 'postgresql':
+        sql = (
+            f"""SELECT order_id FROM "{ORDER_TABLE}", to_tsquery('english', %s) query """
+            f"""WHERE owner_id = %s AND to_tsvector('english', service_name) @@ query """
+            f"""ORDER BY ts_rank(to_tsvector('english', service_name), query) DESC, order_id """
+            f"""LIMIT %s OFFSET %s"""
+        )
+        params = [_postgres_tsquery(terms), owner_id, limit, offset]
+    else:
+        return None
+    return _fetch_ids(connection, sql, params)
+
+
+def _fetch_ids(connection, sql, params):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+    except DatabaseError as e:
+        # Index missing (FTS5 unavailable, or migrate not run yet)
+        logger.warning('Full-text search failed, falling back: %s', e)
+        return None
+
+
+def in_rank_order(queryset, pk_name, ids):
+    """Fetch `ids` from `queryset` in one query and return them in `ids` order."""
+    objects = queryset.in_bulk(ids, field_name=pk_name)
+    return [objects[pk] for pk in ids if pk in objects]
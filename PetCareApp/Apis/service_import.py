@@ -0,0 +1,242 @@
+"""
+Bulk import of a provider's service catalog.
+
+read_rows() streams services out of a JSON array, NDJSON or CSV body
+without loading it whole, and upsert_services() writes them in batches:
+each batch is validated in memory, then created/updated with one
+bulk_create and one bulk_update inside its own transaction, matching
+existing services on (provider, service_name). Invalid rows are reported
+and skipped; they never abort the rest of the import.
+"""
+import codecs
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from .caching import catalog_cache, feeds_for, invalidate_feeds
+from .models.Provider_models import Service
+from .Serializers.Provider_serializers import ServiceImportSerializer
+
+# Content type -> input format
+FORMATS = {
+    'application/json': 'json',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/x-jsonlines': 'ndjson',
+    'text/csv': 'csv',
+}
+
+CHUNK_SIZE = 64 * 1024
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportFormatError(ValueError):
+    """The input could not be parsed any further."""
+
+
+def format_for_content_type(content_type):
+    return FORMATS.get((content_type or '').split(';')[0].strip().lower())
+
+
+def _text_chunks(stream):
+    decoder = codecs.getincrementaldecoder('utf-8-sig')()
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield decoder.decode(chunk)
+    tail = decoder.decode(b'', final=True)
+    if tail:
+        yield tail
+
+
+def _text_lines(stream):
+    pending = ''
+    for chunk in _text_chunks(stream):
+        pending += chunk
+        *lines, pending = pending.split('\n')
+        yield from lines
+    if pending:
+        yield pending
+
+
+def _json_array(stream):
+    decoder = json.JSONDecoder()
+    chunks = _text_chunks(stream)
+    buffer, pos, eof = '', 0, False
+
+    def fill():
+        # Append the next chunk, dropping what was already consumed
+        nonlocal buffer, pos, eof
+        chunk = next(chunks, None)
+        if chunk is None:
+            eof = True
+        else:
+            buffer, pos = buffer[pos:] + chunk, 0
+
+    def next_char():
+        # First non-whitespace character at or after pos, '' at end of input
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos].isspace():
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if eof:
+                return ''
+            fill()
+
+    if next_char() != '[':
+        raise ImportFormatError('Expected a JSON array')
+    pos += 1
+    if next_char() == ']':
+        return
+
+    while True:
+        if not next_char():
+            raise ImportFormatError('Unterminated JSON array')
+        # Only trust a decoded value once the text after it is in the buffer,
+        # otherwise a number cut at a chunk boundary would decode short.
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                if end < len(buffer) or eof:
+                    break
+            except json.JSONDecodeError as e:
+                if eof:
+                    raise ImportFormatError(f'Invalid JSON: {e.msg}')
+            fill()
+        pos = end
+        yield value
+
+        char = next_char()
+        if char == ']':
+            return
+        if char != ',':
+            raise ImportFormatError('Expected "," or "]"' if char else 'Unterminated JSON array')
+        pos += 1
+
+
+def _ndjson(stream):
+    for number, line in enumerate(_text_lines(stream), start=1):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ImportFormatError(f'Invalid JSON on line {number}: {e}')
+
+
+def _csv(stream):
+    for row in csv.DictReader(_text_lines(stream)):
+        # Blank optional cells mean "not given", not an invalid value
+        yield {key: value for key, value in row.items() if key is not None and value != ''}
+
+
+def read_rows(stream, input_format):
+    """Yield the rows of `stream` (a binary file-like object) one by one."""
+    readers = {'json': _json_array, 'ndjson': _ndjson, 'csv': _csv}
+    return readers[input_format](stream)
+
+
+def _batches(rows, batch_size):
+    batch = []
+    number = 0
+    try:
+        for number, row in enumerate(rows, start=1):
+            batch.append((number, row))
+            if len(batch) >= batch_size:
+                yield batch, None
+                batch = []
+    except ImportFormatError as e:
+        yield batch, (number + 1, str(e))
+        return
+    if batch:
+        yield batch, None
+
+
+def _validate(batch):
+    # Last row wins when a batch names the same service twice
+    valid, errors = {}, []
+    for number, row in batch:
+        if not isinstance(row, dict):
+            errors.append((number, {'non_field_errors': ['Expected an object']}))
+            continue
+        serializer = ServiceImportSerializer(data=row)
+        if serializer.is_valid():
+            valid[serializer.validated_data['service_name']] = (number, serializer.validated_data)
+        else:
+            errors.append((number, serializer.errors))
+    return valid, errors
+
+
+def _write(provider, valid):
+    feeds = set()
+    with transaction.atomic():
+        existing = list(
+            Service.objects.select_for_update()
+            .filter(provider=provider, service_name__in=list(valid))
+        )
+        fields = {'updated_at'}
+        now = timezone.now()
+        for service in existing:
+            feeds |= feeds_for(service)
+            data = valid[service.service_name][1]
+            for field, value in data.items():
+                setattr(service, field, value)
+            # bulk_update() skips auto_now
+            service.updated_at = now
+            fields |= data.keys()
+            feeds |= feeds_for(service)
+
+        found = {service.service_name for service in existing}
+        created = [Service(provider=provider, **data) for name, (_, data) in valid.items() if name not in found]
+        Service.objects.bulk_create(created)
+        if existing:
+            Service.objects.bulk_update(existing, sorted(fields))
+        for service in created:
+            feeds |= feeds_for(service)
+    return len(created), len(valid) - len(created), feeds
+
+
+def upsert_services(provider, rows, batch_size=500):
+    """
+    Create or update `provider`'s services from `rows`.
+
+    Returns `{created, updated, error_count, errors}`, where `errors` lists
+    (up to MAX_REPORTED_ERRORS) `{row, errors}` for the rows that were
+    skipped, numbered from 1 in input order.
+    """
+    summary = {'created': 0, 'updated': 0, 'error_count': 0, 'errors': []}
+
+    def report(number, errors):
+        summary['error_count'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'row': number, 'errors': errors})
+
+    feeds = set()
+    for batch, parse_error in _batches(rows, batch_size):
+        valid, errors = _validate(batch)
+        for number, row_errors in errors:
+            report(number, row_errors)
+        if valid:
+            try:
+                created, updated, batch_feeds = _write(provider, valid)
+            except DatabaseError as e:
+                for number, _ in valid.values():
+                    report(number, {'non_field_errors': [f'Batch failed: {e}']})
+            else:
+                summary['created'] += created
+                summary['updated'] += updated
+                feeds |= batch_feeds
+        if parse_error is not None:
+            # Nothing after a syntax error can be read reliably
+            report(parse_error[0], {'non_field_errors': [parse_error[1]]})
+
+    if summary['created'] or summary['updated']:
+        catalog_cache.invalidate()
+        invalidate_feeds(feeds)
+    summary['errors'].sort(key=lambda error: error['row'])
+    return summary
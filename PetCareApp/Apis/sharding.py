@@ -0,0 +1,350 @@
+"""
+Order and cart sharding.
+
+With settings.ORDER_SHARDS set to a list of database aliases, Order and Cart
+rows are spread over those databases by owner: shard_for_owner() picks an
+owner's shard by rendezvous hashing, so adding or removing a shard only
+moves the owners that hash to it (see the rebalance_order_shards command).
+Everything else, including the owners, providers and the dashboard
+summaries, stays on the default database, which may itself be a shard.
+
+Owner views run under @owner_shard, and ShardRouter sends their Order and
+Cart queries to the owner's shard. A checkout touches a single shard, in one
+transaction. Provider views have no shard key: they read through sharded()
+or fan_out(), which query every shard in parallel and merge the results.
+Saving a new row, or Order/Cart.objects.create(), goes to the owner's shard
+wherever it is called. Other Order and Cart queries made with no shard key
+and not fanned out (the admin lists, ad hoc shell use) only see the default
+database.
+
+Row ids come from IdSequence, so they are unique across shards. Without
+ORDER_SHARDS all of this is switched off and the rows stay on default.
+"""
+import contextvars
+import hashlib
+import heapq
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models import Max, QuerySet
+
+SHARDED_MODELS = {'Apis.Cart', 'Apis.Order'}
+
+_current_shard = contextvars.ContextVar('current_shard', default=None)
+
+
+def order_shards():
+    return list(getattr(settings, 'ORDER_SHARDS', []))
+
+
+def sharding_enabled():
+    return bool(order_shards())
+
+
+def shard_aliases():
+    """The databases Order and Cart rows live in."""
+    return order_shards() or [DEFAULT_DB_ALIAS]
+
+
+def _weight(alias, owner_id):
+    return hashlib.md5(f'{alias}:{owner_id}'.encode()).digest()
+
+
+def shard_for_owner(owner_id, shards=None):
+    """The shard holding `owner_id`'s carts and orders."""
+    shards = shards if shards is not None else shard_aliases()
+    return max(shards, key=lambda alias: _weight(alias, owner_id))
+
+
+def order_db():
+    """The shard the current view works on."""
+    return _current_shard.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def use_shard(alias):
+    """Route Order and Cart queries with no other hint to `alias`."""
+    token = _current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        _current_shard.reset(token)
+
+
+@contextmanager
+def shard_transaction(alias):
+    """
+    A transaction on shard `alias` and, when that is another database, one
+    on default for the provider summaries changed along with the orders.
+    The two commit one after the other; if the second fails the summaries
+    are off until rebuild_provider_summaries runs.
+    """
+    with use_shard(alias), transaction.atomic(using=alias):
+        if alias == DEFAULT_DB_ALIAS:
+            yield alias
+        else:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                yield alias
+
+
+def owner_shard(view):
+    """
+    Run an owner view on the owner's shard. Put it directly above the view
+    function, under @api_view, so the user is already authenticated.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not sharding_enabled():
+            return view(request, *args, **kwargs)
+        # RelatedObjectDoesNotExist is an AttributeError
+        owner = getattr(request.user, 'owner', None)
+        if owner is None:
+            return view(request, *args, **kwargs)
+        with use_shard(shard_for_owner(owner.owner_id)):
+            return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+class ShardRouter:
+    """Order and Cart queries go to the owner's shard; other models are left to the next router."""
+
+    def _shard(self, model, instance):
+        if not sharding_enabled() or model._meta.label not in SHARDED_MODELS:
+            return None
+        if instance is not None:
+            if instance._meta.label in SHARDED_MODELS:
+                if not instance._state.adding and instance._state.db:
+                    return instance._state.db
+                if instance.owner_id is not None:
+                    return shard_for_owner(instance.owner_id)
+            elif instance._meta.label == 'Apis.Owner' and instance.pk is not None:
+                # owner.order_set and friends
+                return shard_for_owner(instance.pk)
+        return _current_shard.get()
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def db_for_write(self, model, **hints):
+        return self._shard(model, hints.get('instance'))
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Orders and carts point at owners and providers on default
+        if sharding_enabled() and SHARDED_MODELS & {obj1._meta.label, obj2._meta.label}:
+            return True
+        return None
+
+
+def _in_thread(function, alias):
+    try:
+        return function(alias)
+    finally:
+        # Connections are per thread, and this thread is about to end
+        connections.close_all()
+
+
+def fan_out(function, aliases=None):
+    """
+    Call `function(alias)` for every shard, in parallel threads, and return
+    the results in shard order. Shards this thread has a transaction open on
+    are called from this thread, so they see that transaction.
+    """
+    aliases = list(aliases if aliases is not None else shard_aliases())
+    here = [alias for alias in aliases if connections[alias].in_atomic_block]
+    elsewhere = [alias for alias in aliases if alias not in here]
+    if len(elsewhere) < 2:
+        here, elsewhere = aliases, []
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(elsewhere) or 1) as pool:
+        futures = {alias: pool.submit(_in_thread, function, alias) for alias in elsewhere}
+        for alias in here:
+            results[alias] = function(alias)
+        for alias, future in futures.items():
+            results[alias] = future.result()
+    return [results[alias] for alias in aliases]
+
+
+class ShardedQuerySet:
+    """
+    One queryset run on every shard and merged. Supports what the provider
+    views and DRF's CursorPagination use: filter(), exclude(), order_by(),
+    values() and values_list() chaining, then iteration, slicing,
+    iterator(), count(), exists() and update(). Results are merged on the
+    queryset's ordering (the primary key when it has none), which must be
+    plain field names all sorted the same way.
+    """
+
+    def __init__(self, queryset, aliases=None, row=('model', ())):
+        self.queryset = queryset
+        self.model = queryset.model
+        self.aliases = list(aliases if aliases is not None else shard_aliases())
+        # How rows come out: model instances, values() dicts or values_list() tuples
+        self._row = row
+
+    def _chain(self, queryset, row=None):
+        return ShardedQuerySet(queryset, self.aliases, row or self._row)
+
+    def filter(self, *args, **kwargs):
+        return self._chain(self.queryset.filter(*args, **kwargs))
+
+    def exclude(self, *args, **kwargs):
+        return self._chain(self.queryset.exclude(*args, **kwargs))
+
+    def order_by(self, *fields):
+        return self._chain(self.queryset.order_by(*fields))
+
+    def values(self, *fields):
+        return self._chain(self.queryset.values(*fields), ('dict', fields))
+
+    def values_list(self, *fields, flat=False):
+        fields = fields or tuple(field.attname for field in self.model._meta.concrete_fields)
+        return self._chain(self.queryset.values_list(*fields, flat=flat), ('flat' if flat else 'tuple', fields))
+
+    def _ordered(self):
+        """The queryset, surely ordered, a function giving a row's sort key, and whether it is descending."""
+        queryset = self.queryset
+        if not queryset.query.order_by:
+            queryset = queryset.order_by(self.model._meta.pk.attname)
+        ordering = list(queryset.query.order_by)
+        if not all(isinstance(field, str) and '__' not in field for field in ordering):
+            raise TypeError(f'Cannot merge shards ordered by {ordering!r}')
+        descending = {field.startswith('-') for field in ordering}
+        if len(descending) > 1:
+            raise TypeError(f'Cannot merge shards ordered by {ordering!r}, with mixed directions')
+        pk_name = self.model._meta.pk.attname
+        names = [pk_name if name == 'pk' else name for name in (field.lstrip('-') for field in ordering)]
+
+        kind, fields = self._row
+        if kind == 'model':
+            def key(row):
+                return tuple(getattr(row, name) for name in names)
+        elif kind == 'dict':
+            def key(row):
+                return tuple(row[name] for name in names)
+        else:
+            fields = [pk_name if name == 'pk' else name for name in fields]
+            missing = [name for name in names if name not in fields]
+            if missing:
+                raise TypeError(f'Cannot merge shards on {missing!r}, which are not selected')
+            if kind == 'flat':
+                def key(row):
+                    return (row,)
+            else:
+                positions = [fields.index(name) for name in names]
+
+                def key(row):
+                    return tuple(row[position] for position in positions)
+        return queryset, key, descending == {True}
+
+    def _merge(self, start=0, stop=None):
+        queryset, key, descending = self._ordered()
+        shard_rows = queryset if stop is None else queryset[:stop]
+        results = fan_out(lambda alias: list(shard_rows.using(alias)), self.aliases)
+        return list(itertools.islice(heapq.merge(*results, key=key, reverse=descending), start, stop))
+
+    def __iter__(self):
+        return iter(self._merge())
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            if item.step is not None or (item.start or 0) < 0 or (item.stop is not None and item.stop < 0):
+                raise TypeError('Sharded querysets only take forward slices')
+            return self._merge(item.start or 0, item.stop)
+        return self._merge(item, item + 1)[0]
+
+    def iterator(self, chunk_size=None):
+        """Stream the merged rows, reading each shard a chunk at a time."""
+        queryset, key, descending = self._ordered()
+        return heapq.merge(
+            *(queryset.using(alias).iterator(chunk_size=chunk_size) for alias in self.aliases),
+            key=key, reverse=descending,
+        )
+
+    def count(self):
+        return sum(fan_out(lambda alias: self.queryset.using(alias).count(), self.aliases))
+
+    def exists(self):
+        return any(fan_out(lambda alias: self.queryset.using(alias).exists(), self.aliases))
+
+    def update(self, **kwargs):
+        """Update every shard, each in its own transaction."""
+        return sum(fan_out(lambda alias: self.queryset.using(alias).update(**kwargs), self.aliases))
+
+
+class OwnerShardQuerySet(QuerySet):
+    """
+    Order and Cart querysets. create() gets no instance to route by, so it
+    is sent to the new row's owner's shard here.
+    """
+
+    def create(self, **kwargs):
+        if self._db is None and sharding_enabled():
+            owner_id = kwargs['owner'].pk if kwargs.get('owner') is not None else kwargs.get('owner_id')
+            if owner_id is not None:
+                return self.using(shard_for_owner(owner_id)).create(**kwargs)
+        return super().create(**kwargs)
+
+
+def sharded(queryset):
+    """`queryset` over every shard, or as it is when sharding is off."""
+    if not sharding_enabled():
+        return queryset
+    return ShardedQuerySet(queryset)
+
+
+def shard_of(queryset):
+    """
+    The shard holding the rows of `queryset` (the first one with any), or
+    None. Without sharding that is the default database, not checked.
+    """
+    if not sharding_enabled():
+        return DEFAULT_DB_ALIAS
+    aliases = shard_aliases()
+    found = fan_out(lambda alias: queryset.using(alias).exists(), aliases)
+    return next((alias for alias, hit in zip(aliases, found) if hit), None)
+
+
+def allocate_ids(model, count):
+    """Reserve `count` ids for new `model` rows, unique across the shards."""
+    from .models.Owner_models import IdSequence
+
+    name = model._meta.label
+    for attempt in range(2):
+        try:
+            with transaction.atomic(using=DEFAULT_DB_ALIAS):
+                sequence = IdSequence.objects.using(DEFAULT_DB_ALIAS).select_for_update().filter(name=name).first()
+                if sequence is None:
+                    # First use: continue after the rows already there
+                    pk_name = model._meta.pk.attname
+                    highest = fan_out(
+                        lambda alias: model._base_manager.using(alias).aggregate(top=Max(pk_name))['top'] or 0
+                    )
+                    sequence = IdSequence.objects.using(DEFAULT_DB_ALIAS).create(name=name, next_id=max(highest) + 1)
+                first = sequence.next_id
+                sequence.next_id = first + count
+                sequence.save(using=DEFAULT_DB_ALIAS, update_fields=['next_id'])
+            return range(first, first + count)
+        except IntegrityError:
+            # Another process created the sequence first
+            if attempt:
+                raise
+
+
+def assign_ids(objs):
+    """
+    Give unsaved sharded rows their ids before they are inserted. Returns
+    False, and leaves the ids to the database, when sharding is off.
+    """
+    if not sharding_enabled():
+        return False
+    objs = [obj for obj in objs if obj.pk is None]
+    if objs:
+        for obj, pk in zip(objs, allocate_ids(type(objs[0]), len(objs))):
+            obj.pk = pk
+    return True
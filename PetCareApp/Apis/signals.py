@@ -0,0 +1,84 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from . import summaries
+from .availability import release_slots
+from .authentication import token_cache
+from .models.Owner_models import Cart, Order, Owner
+from .models.Provider_models import ServiceProvider
+from .models.Users import User
+from .sharding import ShardedQuerySet, shard_aliases, shard_for_owner, sharding_enabled
+
+
+# Keep the authentication token cache in line with the database
+
+@receiver(post_delete, sender=Token)
+def forget_deleted_token(sender, instance, **kwargs):
+    token_cache.invalidate(instance.key)
+
+
+@receiver(post_save)
+def forget_changed_user(sender, instance, **kwargs):
+    # Any save of a User, Owner or ServiceProvider: password change,
+    # deactivation or profile edit. `id` is the User id on all three.
+    if isinstance(instance, User):
+        token_cache.invalidate_user(instance.id)
+
+
+# Keep the provider dashboard summaries in line with the orders. Bulk
+# creates and status changes are recorded by the views themselves, see
+# Apis/summaries.py.
+
+@receiver(post_save, sender=Order)
+def count_created_order(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        summaries.record_orders([instance])
+
+
+@receiver(post_delete, sender=Order)
+def uncount_deleted_order(sender, instance, **kwargs):
+    summaries.record_orders([instance], sign=-1)
+
+
+# A deleted order gives back its availability slot
+
+@receiver(post_delete, sender=Order)
+def release_deleted_order_slot(sender, instance, **kwargs):
+    release_slots([instance.order_id])
+
+
+# Order.owner_name is a copy of the owner's name
+
+@receiver(post_save, sender=Owner)
+def rename_owner_orders(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if created or raw or (update_fields is not None and 'owner_name' not in update_fields):
+        return
+    Order.objects.using(shard_for_owner(instance.owner_id)).filter(owner_id=instance.owner_id).exclude(
+        owner_name=instance.owner_name,
+    ).update(owner_name=instance.owner_name, updated_at=timezone.now())
+
+
+# Deletes cascade on the database the owner or provider is deleted from
+# (default), so rows on the other shards are handled here.
+
+@receiver(pre_delete, sender=Owner)
+def delete_sharded_owner_rows(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    shard = shard_for_owner(instance.owner_id)
+    if not sharding_enabled() or shard == using:
+        return
+    Cart.objects.using(shard).filter(owner_id=instance.owner_id).delete()
+    # Through the ORM, so post_delete takes them off the provider summaries
+    Order.objects.using(shard).filter(owner_id=instance.owner_id).delete()
+
+
+@receiver(pre_delete, sender=ServiceProvider)
+def detach_sharded_provider_orders(sender, instance, using=DEFAULT_DB_ALIAS, **kwargs):
+    if not sharding_enabled():
+        return
+    others = [alias for alias in shard_aliases() if alias != using]
+    ShardedQuerySet(Order.objects.filter(provider_id=instance.provider_id), others).update(
+        provider=None, updated_at=timezone.now(),
+    )
@@ -0,0 +1,207 @@
+"""
+Provider dashboard aggregates.
+
+ProviderOrderSummary holds, per provider, one row for every (day, service,
+status) with the number of orders and the sum of their charges. Rows are
+adjusted in the same transaction as the orders they count:
+
+- record_orders() when orders are created (place_order; single saves go
+  through the post_save signal),
+- move_orders() when their status changes (update_order_status, the batch
+  endpoint, cancel_order),
+- the post_delete signal when they are deleted.
+
+Edits made any other way (admin status changes, raw .update() calls) are
+not tracked; rebuild() recomputes the rows from the orders on every shard.
+
+The dashboard only ever reads the summary rows, so its cost depends on the
+number of days and services in range, not on the number of orders.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models.Owner_models import Order
+from .models.Provider_models import ProviderOrderSummary
+from .sharding import fan_out
+
+# Statuses whose charges count as revenue
+REVENUE_STATUSES = ('Placed', 'Processed', 'Completed')
+
+
+def _day(value):
+    return timezone.localdate(value) if timezone.is_aware(value) else value.date()
+
+
+def _deltas():
+    # (provider_id, day, service_id, status) -> [order count, charges, service name]
+    return defaultdict(lambda: [0, Decimal('0'), ''])
+
+
+def _add(deltas, order, status, sign):
+    if order.provider_id is None:
+        return
+    delta = deltas[(order.provider_id, _day(order.scheduled_date_time), order.service_id, status)]
+    delta[0] += sign
+    delta[1] += sign * Decimal(order.service_charges)
+    delta[2] = order.service_name
+
+
+def _existing(keys):
+    rows = ProviderOrderSummary.objects.filter(
+        provider_id__in={key[0] for key in keys},
+        day__in={key[1] for key in keys},
+        service_id__in={key[2] for key in keys},
+        status__in={key[3] for key in keys},
+    )
+    # The IN lists can match a few rows that are not wanted
+    existing = {(row.provider_id, row.day, row.service_id, row.status): row for row in rows}
+    return {key: row for key, row in existing.items() if key in keys}
+
+
+def _apply(deltas):
+    # One SELECT, one UPDATE and one INSERT however many rows are touched.
+    # The UPDATE adds to the stored values (F expressions), so concurrent
+    # writers never overwrite each other's counts.
+    pending = {key: delta for key, delta in deltas.items() if delta[0] or delta[1]}
+    if not pending:
+        return
+    with transaction.atomic(savepoint=False):
+        for attempt in range(2):
+            existing = _existing(pending)
+            for key, row in existing.items():
+                row.order_count = F('order_count') + pending[key][0]
+                row.revenue = F('revenue') + pending[key][1]
+            if existing:
+                ProviderOrderSummary.objects.bulk_update(existing.values(), ['order_count', 'revenue'])
+
+            missing = {key: delta for key, delta in pending.items() if key not in existing}
+            if not missing:
+                return
+            try:
+                with transaction.atomic():
+                    ProviderOrderSummary.objects.bulk_create([
+                        ProviderOrderSummary(
+                            provider_id=provider_id, day=day, service_id=service_id, status=status,
+                            service_name=name, order_count=count, revenue=revenue,
+                        )
+                        for (provider_id, day, service_id, status), (count, revenue, name) in missing.items()
+                    ])
+                return
+            except IntegrityError:
+                # Another transaction created some of these rows first
+                if attempt:
+                    raise
+                pending = missing
+
+
+def record_orders(orders, sign=1):
+    """Count newly created `orders` (or, with sign=-1, deleted ones)."""
+    deltas = _deltas()
+    for order in orders:
+        _add(deltas, order, order.status, sign)
+    _apply(deltas)
+
+
+def move_orders(orders, new_status):
+    """
+    Move `orders` from the status they still have in memory to `new_status`.
+    Call it inside the transaction that changes them.
+    """
+    deltas = _deltas()
+    for order in orders:
+        if order.status != new_status:
+            _add(deltas, order, order.status, -1)
+            _add(deltas, order, new_status, 1)
+    _apply(deltas)
+
+
+def rebuild(provider_ids=None):
+    """
+    Recompute the summary rows of the given providers (all when None) from
+    their orders. Returns the number of rows written.
+    """
+    orders = Order.objects.filter(provider__isnull=False)
+    summaries = ProviderOrderSummary.objects.all()
+    if provider_ids is not None:
+        orders = orders.filter(provider_id__in=provider_ids)
+        summaries = summaries.filter(provider_id__in=provider_ids)
+
+    groups = (
+        orders.annotate(day=TruncDate('scheduled_date_time'))
+        .values('provider_id', 'day', 'service_id', 'status')
+        .annotate(count=Count('order_id'), charges=Sum('service_charges'), name=Max('service_name'))
+        .order_by()
+    )
+    # Each shard groups its own orders, the groups are added up here
+    totals = _deltas()
+    for shard_groups in fan_out(lambda alias: list(groups.using(alias))):
+        for group in shard_groups:
+            total = totals[(group['provider_id'], group['day'], group['service_id'], group['status'])]
+            total[0] += group['count']
+            total[1] += group['charges']
+            total[2] = max(total[2], group['name'])
+
+    with transaction.atomic():
+        summaries.delete()
+        rows = ProviderOrderSummary.objects.bulk_create(
+            [
+                ProviderOrderSummary(
+                    provider_id=provider_id, day=day, service_id=service_id, status=status,
+                    service_name=name, order_count=count, revenue=revenue,
+                )
+                for (provider_id, day, service_id, status), (count, revenue, name) in totals.items()
+            ],
+            batch_size=500,
+        )
+    return len(rows)
+
+
+def dashboard(provider, start=None, end=None):
+    """
+    Order counts and revenue of `provider` from its summary rows, in total
+    and by status, service and day, for the days from `start` to `end`
+    (inclusive, either may be None). Revenue leaves out cancelled orders.
+    """
+    rows = ProviderOrderSummary.objects.filter(provider=provider)
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+
+    zero = Decimal('0.00')
+    by_status = {value: {'order_count': 0, 'revenue': zero} for value, _ in Order.STATUS_CHOICES}
+    by_service, by_day = {}, {}
+    for row in rows.order_by('day', 'service_id', 'status'):
+        status_total = by_status.setdefault(row.status, {'order_count': 0, 'revenue': zero})
+        status_total['order_count'] += row.order_count
+        status_total['revenue'] += row.revenue
+
+        revenue = row.revenue if row.status in REVENUE_STATUSES else zero
+        service = by_service.setdefault(row.service_id, {
+            'service_id': row.service_id, 'service_name': row.service_name,
+            'order_count': 0, 'revenue': zero,
+            'by_status': {value: 0 for value, _ in Order.STATUS_CHOICES},
+        })
+        service['order_count'] += row.order_count
+        service['revenue'] += revenue
+        service['by_status'][row.status] = service['by_status'].get(row.status, 0) + row.order_count
+
+        day = by_day.setdefault(row.day, {'day': row.day, 'order_count': 0, 'revenue': zero})
+        day['order_count'] += row.order_count
+        day['revenue'] += revenue
+
+    def money(entry):
+        return {**entry, 'revenue': str(entry['revenue'])}
+
+    return {
+        'order_count': sum(total['order_count'] for total in by_status.values()),
+        'revenue': str(sum((by_status[value]['revenue'] for value in REVENUE_STATUSES), zero)),
+        'by_status': {value: money(total) for value, total in by_status.items()},
+        'by_service': sorted((money(entry) for entry in by_service.values()), key=lambda entry: entry['service_id']),
+        'by_day': [money(entry) for entry in by_day.values()],
+    }
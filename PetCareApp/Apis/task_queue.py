@@ -0,0 +1,160 @@
+"""
+Background tasks, queued in the database and run by `manage.py run_tasks`.
+
+    @task(max_attempts=5, backoff=30)
+    def send_receipt(order_id):
+        ...
+
+    send_receipt.delay(order.order_id)
+    send_receipt.enqueue(args=[order.order_id], key=f'receipt:{order.order_id}')
+
+The Task row is written once the current transaction on default commits
+(straight away outside one), so a task never sees data its request rolled
+back and the request never waits for the task. Arguments must be JSON
+serializable.
+
+A `key` makes queueing idempotent: while a task with that key exists, done
+or not, queueing it again does nothing. Finished tasks are purged after a
+few days (run_tasks --keep-days), which frees their keys.
+
+Workers claim due tasks in a transaction, so each is taken by one worker,
+and run them in a thread or process pool. A failing task is retried after
+backoff * 2 ** (attempt - 1) seconds, up to max_attempts runs. A task whose
+worker died is taken again after the worker's --timeout. Either way a task
+may run more than once, so write tasks that can.
+
+Tasks are registered by name (module.function) when their module is
+imported; run_tasks imports the `tasks` module of every installed app.
+"""
+import datetime
+import logging
+import traceback
+
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models.Task_models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+class TaskFunction:
+    """A function registered with @task. Calling it runs it right away."""
+
+    def __init__(self, function, name, max_attempts, backoff):
+        self.function = function
+        self.name = name
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.__doc__ = function.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.function(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """Queue a run with these arguments once the transaction commits."""
+        self.enqueue(args=args, kwargs=kwargs)
+
+    def enqueue(self, args=(), kwargs=None, key=None, run_at=None, using=DEFAULT_DB_ALIAS):
+        """
+        Queue a run once the transaction on `using` commits. `key` makes it
+        idempotent, `run_at` delays it.
+        """
+        task = Task(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs or {},
+            key=key,
+            max_attempts=self.max_attempts,
+            run_at=run_at or timezone.now(),
+        )
+        transaction.on_commit(lambda: _save(task), using=using)
+
+    def retry_delay(self, attempts):
+        return datetime.timedelta(seconds=self.backoff * 2 ** (attempts - 1))
+
+
+def _save(task):
+    if task.key is None:
+        task.save()
+    else:
+        Task.objects.bulk_create([task], ignore_conflicts=True)
+
+
+def task(function=None, *, name=None, max_attempts=3, backoff=10):
+    """Register a task function, as @task or @task(max_attempts=..., backoff=seconds)."""
+    def register(function):
+        task_function = TaskFunction(
+            function, name or f'{function.__module__}.{function.__qualname__}', max_attempts, backoff,
+        )
+        _registry[task_function.name] = task_function
+        return task_function
+
+    return register if function is None else register(function)
+
+
+def claim(limit, timeout, now=None):
+    """
+    Mark up to `limit` due tasks as running, for `timeout` seconds, and
+    return them.
+    """
+    now = now or timezone.now()
+    skip_locked = connections[DEFAULT_DB_ALIAS].features.has_select_for_update_skip_locked
+    with transaction.atomic():
+        tasks = list(
+            Task.objects.select_for_update(skip_locked=skip_locked)
+            .filter(status__in=['Queued', 'Running'], run_at__lte=now)
+            .order_by('run_at')[:limit]
+        )
+        if tasks:
+            Task.objects.filter(pk__in=[task.pk for task in tasks]).update(
+                status='Running', attempts=F('attempts') + 1, run_at=now + datetime.timedelta(seconds=timeout),
+            )
+    for task in tasks:
+        task.status = 'Running'
+        task.attempts += 1
+    return tasks
+
+
+def _finish(task, **changes):
+    # Unless another worker took the task over in the meantime
+    Task.objects.filter(pk=task.pk, status='Running', attempts=task.attempts).update(**changes)
+
+
+def run(task):
+    """Run a claimed task and record how it went. Returns the new status."""
+    close_old_connections()
+    try:
+        task_function = _registry.get(task.name)
+        if task_function is None:
+            error, retry = f'No task named {task.name!r} is registered\n', None
+        elif task.attempts > task.max_attempts:
+            # Its last worker died
+            error, retry = 'Gave up after the worker running it stopped\n', None
+        else:
+            try:
+                task_function.function(*task.args, **task.kwargs)
+            except Exception:
+                logger.exception('Task %s %s failed', task.pk, task.name)
+                error = traceback.format_exc()
+                retry = task_function.retry_delay(task.attempts) if task.attempts < task.max_attempts else None
+            else:
+                _finish(task, status='Done', run_at=timezone.now(), last_error='')
+                return 'Done'
+
+        if retry is None:
+            _finish(task, status='Failed', run_at=timezone.now(), last_error=error)
+            return 'Failed'
+        _finish(task, status='Queued', run_at=timezone.now() + retry, last_error=error)
+        return 'Queued'
+    finally:
+        close_old_connections()
+
+
+def purge(before):
+    """Delete the tasks that finished before `before`. Returns how many."""
+    deleted, _ = Task.objects.filter(status__in=['Done', 'Failed'], run_at__lt=before).delete()
+    return deleted
@@ -0,0 +1,8 @@
+from .summaries import rebuild
+from .task_queue import task
+
+
+@task(max_attempts=5, backoff=30)
+def rebuild_provider_summaries(provider_ids):
+    """Recount the dashboard summaries of these providers from their orders."""
+    rebuild(provider_ids)
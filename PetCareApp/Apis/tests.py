@@ -1,3 +1,1595 @@
-from django.test import TestCase
+import datetime
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from decimal import Decimal
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.utils import ConnectionHandler
+from django.db.models import F
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from Apis.authentication import token_cache
+from Apis.caching import ResponseCache, catalog_cache
+from Apis.database import database_profile
+from Apis.log import AsyncLogHandler, SamplingFilter, request_id
+from Apis.metrics import registry
+from Apis.pagination import KeysetPagination
+from Apis.renderers import ORJSONRenderer
+from Apis.replicas import check_pin_cache, replica_reads
+from Apis.service_import import read_rows
+from Apis.sharding import fan_out, shard_for_owner
+from Apis.task_queue import task
+from Apis.Serializers.Owner_serializers import OrderSerializer
+from Apis.Serializers.Provider_serializers import ServiceSerializer
+from Apis.Serializers.plans import ValuesPlan
+from Apis.Views.Provider_views import catalog_rows
+from Apis.models import Booking, Cart, Favorites, Order, Owner, ProviderOrderSummary, Service, ServiceProvider, Task, User
+
+
+def make_provider(name='Provider'):
+    return ServiceProvider.objects.create(
+        email=f'{name.lower()}@example.com',
+        username=name.lower(),
+        password='x',
+        name=name,
+    )
+
+
+def make_owner(name='Owner'):
+    return Owner.objects.create(
+        email=f'{name.lower()}@example.com',
+        username=name.lower(),
+        password='x',
+        owner_name=name,
+        pet_name='Rex',
+        pet_age=3,
+        animal_type='Dog',
+    )
+
+
+def make_services(provider, count, **kwargs):
+    return [
+        Service.objects.create(
+            provider=provider,
+            price=Decimal('25.00'),
+            description=f'Description {i}',
+            service_name=f'Service {i}',
+            **kwargs
+        )
+        for i in range(count)
+    ]
+
+
+def make_orders(owner, services):
+    return [
+        Order.objects.create(
+            owner=owner,
+            service_id=service.service_id,
+            provider=service.provider,
+            service_name=service.service_name,
+            scheduled_date_time=timezone.now(),
+            service_provider_name=service.provider.name,
+            service_charges=service.price,
+        )
+        for service in services
+    ]
+
+
+def make_cart(owner, services):
+    return [
+        Cart.objects.create(
+            owner=owner,
+            service_id=service.service_id,
+            service_name=service.service_name,
+            service_provider_name=service.provider.name,
+            service_charges=service.price,
+        )
+        for service in services
+    ]
+
+
+def client_for(user):
+    client = APIClient()
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION='Token ' + token.key)
+    return client
+
+
+class PaginationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.services = make_services(self.provider, 7)
+        self.client = client_for(self.provider)
+
+    def ids(self, url):
+        page = self.client.get(url).json()
+        return [row['service_id'] for row in page['results']], page
+
+    def test_full_list_without_parameters(self):
+        response = self.client.get('/apis/services/one')
+        self.assertEqual([row['service_id'] for row in response.json()], [s.service_id for s in self.services])
+
+    def test_next_and_previous_links(self):
+        ids = [service.service_id for service in self.services]
+        first, page = self.ids('/apis/services/one?page_size=3')
+        self.assertEqual(first, ids[:3])
+        self.assertIsNone(page['previous'])
+        second, page = self.ids(page['next'])
+        self.assertEqual(second, ids[3:6])
+        third, page = self.ids(page['next'])
+        self.assertEqual(third, ids[6:])
+        self.assertIsNone(page['next'])
+        self.assertEqual(self.ids(page['previous'])[0], ids[3:6])
+
+    def test_page_size_is_capped(self):
+        with mock.patch.object(KeysetPagination, 'max_page_size', 2):
+            self.assertEqual(len(self.ids('/apis/services/one?page_size=100')[0]), 2)
+
+    def test_deep_pages_seek_instead_of_offset(self):
+        make_services(self.provider, 50)
+        token_cache.clear()
+        with CaptureQueriesContext(connection) as first:
+            _, page = self.ids('/apis/services/one?page_size=5')
+        for _ in range(8):
+            _, page = self.ids(page['next'])
+        token_cache.clear()
+        with CaptureQueriesContext(connection) as deep:
+            ids, _ = self.ids(page['next'])
+        self.assertEqual(ids, [service.service_id for service in Service.objects.order_by('service_id')[45:50]])
+        self.assertEqual(len(deep), len(first))
+        self.assertFalse(any('OFFSET' in query['sql'] for query in deep.captured_queries))
+
+
+# The list endpoints must issue the same number of queries no matter how many
+# rows they return.
+class ListQueryCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+
+    def assertConstantQueries(self, url, client, num, grow):
+        token_cache.clear()
+        with self.assertNumQueries(num):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        grow()
+        token_cache.clear()
+        with self.assertNumQueries(num):
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_services(self):
+        make_services(self.provider, 2)
+
+        def grow():
+            make_services(make_provider('Other'), 5)
+            catalog_cache.clear()
+
+        self.assertConstantQueries('/apis/services/all', APIClient(), 1, grow)
+
+    def test_view_orders(self):
+        services = make_services(self.provider, 3)
+        make_orders(self.owner, services[:1])
+        # token and profile lookup, orders
+        self.assertConstantQueries(
+            '/apis/view_orders/', client_for(self.provider), 2,
+            lambda: make_orders(make_owner('Second'), services),
+        )
+
+    def test_view_all_orders(self):
+        services = make_services(self.provider, 3)
+        make_orders(self.owner, services[:1])
+        # token and profile lookup, orders
+        self.assertConstantQueries(
+            '/apis/view_all_orders/', client_for(self.owner), 2,
+            lambda: make_orders(self.owner, services),
+        )
+
+    def test_deal_of_the_day(self):
+        make_services(self.provider, 1, is_deal_of_the_day=True)
+
+        def grow():
+            make_services(make_provider('Other'), 4, is_deal_of_the_day=True)
+            cache.clear()
+
+        # token lookup, services
+        self.assertConstantQueries('/apis/services/deal_of_the_day/', client_for(self.owner), 2, grow)
+
+
+# The values() plans and the orjson renderer must produce exactly the bytes
+# the serializers and JSONRenderer do.
+class FastSerializationTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        cache.clear()
+        catalog_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.services = make_services(self.provider, 3, is_deal_of_the_day=True)
+        Service.objects.filter(pk=self.services[0].pk).update(
+            service_name='Bath \u2028 & trim é', price=Decimal('7.5'), average_rating=4.25,
+        )
+        self.orders = make_orders(self.owner, self.services)
+        Order.objects.filter(pk=self.orders[0].pk).update(
+            scheduled_date_time=datetime.datetime(2030, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc),
+        )
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'line\u2028sep\u2029 "quoted" \\ café \x01',
+            'decimal': Decimal('12.50'),
+            'moments': [
+                datetime.datetime(2030, 1, 2, 3, 4, 5, 678, tzinfo=datetime.timezone.utc),
+                datetime.datetime(2030, 1, 2, 3, 4, 5),
+                datetime.date(2030, 1, 2),
+                datetime.time(3, 4),
+            ],
+            'numbers': [1, -2, 3.5, 0.1, 2 ** 70, True, None],
+            1: 'int key',
+        }
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            ORJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    def test_endpoints_match_serializers(self):
+        client = client_for(self.owner)
+        orders = Order.objects.filter(owner=self.owner)
+        self.assertEqual(
+            client.get('/apis/view_all_orders/').content,
+            JSONRenderer().render(OrderSerializer(orders, many=True).data),
+        )
+        self.assertEqual(
+            client.get('/apis/services/deal_of_the_day/').content,
+            JSONRenderer().render(ServiceSerializer(Service.objects.all(), many=True).data),
+        )
+        self.assertEqual(
+            APIClient().get('/apis/services/all').content,
+            JSONRenderer().render(catalog_rows(Service.objects.annotate(provider_name=F('provider__name')))),
+        )
+        page = client.get('/apis/view_all_orders/?page_size=2').json()
+        self.assertEqual(page['results'], OrderSerializer(orders.order_by('order_id')[:2], many=True).data)
+
+    def test_plan_rejects_computed_fields(self):
+        class Computed(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Order
+                fields = ['order_id', 'label']
+
+        with self.assertRaises(ImproperlyConfigured):
+            ValuesPlan(Computed)
+
+
+class ProviderOrderOwnershipTests(TestCase):
+
+    def setUp(self):
+        self.provider = make_provider()
+        self.other = make_provider('Other')
+        self.order = make_orders(make_owner(), make_services(self.provider, 1))[0]
+
+    def test_view_orders_only_lists_own_orders(self):
+        response = client_for(self.other).get('/apis/view_orders/')
+        self.assertEqual(response.json(), [])
+        response = client_for(self.provider).get('/apis/view_orders/')
+        self.assertEqual([o['order_id'] for o in response.json()], [self.order.order_id])
+
+    def test_update_order_status_checks_provider(self):
+        url = f'/apis/update_order_status/{self.order.order_id}/'
+        response = client_for(self.other).put(url, {'status': 'Processed'}, format='json')
+        self.assertEqual(response.status_code, 403)
+        response = client_for(self.provider).put(url, {'status': 'Processed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+
+class OrderStatusBatchTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        owner = make_owner()
+        self.orders = make_orders(owner, make_services(self.provider, 4))
+        self.foreign = make_orders(owner, make_services(make_provider('Other'), 1))[0]
+        Order.objects.filter(order_id=self.orders[2].order_id).update(status='Cancelled')
+        Order.objects.filter(order_id=self.orders[3].order_id).update(status='Completed')
+        self.client = client_for(self.provider)
+
+    def test_reports_each_order_and_updates_only_valid_ones(self):
+        ids = [order.order_id for order in self.orders] + [self.foreign.order_id, 999999]
+        # auth, SELECT ... FOR UPDATE, UPDATE, summary SELECT / UPDATE / INSERT
+        # (+ savepoint pairs)
+        with self.assertNumQueries(10):
+            response = self.client.post('/apis/update_order_status/batch/', {'order_ids': ids, 'status': 'Completed'}, format='json')
+        body = response.json()
+
+        self.assertEqual(body['updated'], 2)
+        self.assertEqual(
+            [result['result'] for result in body['results']],
+            ['updated', 'updated', 'invalid_transition', 'unchanged', 'not_found', 'not_found'],
+        )
+        self.assertEqual(body['results'][2]['status'], 'Cancelled')
+        self.foreign.refresh_from_db()
+        self.assertEqual(self.foreign.status, 'Placed')
+        self.assertEqual(Order.objects.filter(provider=self.provider, status='Completed').count(), 3)
+
+    def test_rejects_unknown_status(self):
+        response = self.client.post('/apis/update_order_status/batch/', {'order_ids': [1], 'status': 'Lost'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_single_update_follows_the_same_transitions(self):
+        cancelled, completed = self.orders[2], self.orders[3]
+        for order, target in ((cancelled, 'Placed'), (completed, 'Processed')):
+            response = self.client.put(f'/apis/update_order_status/{order.order_id}/', {'status': target}, format='json')
+            self.assertEqual(response.status_code, 400)
+            batch = self.client.post('/apis/update_order_status/batch/', {'order_ids': [order.order_id], 'status': target}, format='json')
+            self.assertEqual(batch.json()['results'][0]['result'], 'invalid_transition')
+        self.assertEqual(Order.objects.get(order_id=cancelled.order_id).status, 'Cancelled')
+        url = f'/apis/update_order_status/{completed.order_id}/'
+        self.assertEqual(self.client.put(url, {'status': 'Completed'}, format='json').status_code, 200)
+
+
+class ProviderDashboardTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.services = make_services(self.provider, 3)
+        self.owner_client = client_for(self.owner)
+        self.client = client_for(self.provider)
+
+    def dashboard(self, query=''):
+        response = self.client.get('/apis/provider_dashboard/' + query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_summaries_follow_order_changes(self):
+        make_cart(self.owner, self.services)
+        ids = self.owner_client.post('/apis/place_order/').json()['order_ids']
+        extra = make_orders(self.owner, self.services[:1])[0]
+        self.owner_client.post(f'/apis/cancel_order/{ids[0]}/')
+        self.client.put(f'/apis/update_order_status/{ids[1]}/', {'status': 'Processed'}, format='json')
+        self.client.post('/apis/update_order_status/batch/', {'order_ids': ids, 'status': 'Completed'}, format='json')
+        Order.objects.get(order_id=extra.order_id).delete()
+
+        body = self.dashboard()
+        self.assertEqual(body['order_count'], 3)
+        self.assertEqual(body['revenue'], '50.00')
+        self.assertEqual(body['by_status']['Completed'], {'order_count': 2, 'revenue': '50.00'})
+        self.assertEqual(body['by_status']['Cancelled'], {'order_count': 1, 'revenue': '25.00'})
+        self.assertEqual(body['by_status']['Placed']['order_count'], 0)
+        self.assertEqual([service['revenue'] for service in body['by_service']], ['0.00', '25.00', '25.00'])
+        self.assertEqual(body['by_day'], [{'day': timezone.localdate().isoformat(), 'order_count': 3, 'revenue': '50.00'}])
+
+        # A rebuild from the orders gives the same numbers
+        call_command('rebuild_provider_summaries', stdout=io.StringIO())
+        self.assertEqual(self.dashboard(), body)
+
+    def test_reads_only_summary_rows(self):
+        make_orders(self.owner, self.services)
+        with CaptureQueriesContext(connection) as queries:
+            self.dashboard()
+        self.assertFalse(any('"Apis_order"' in query['sql'] for query in queries.captured_queries))
+
+    def test_date_range(self):
+        make_orders(self.owner, self.services)
+        ProviderOrderSummary.objects.update(day='2026-01-05')
+
+        self.assertEqual(self.dashboard('?from=2026-01-05&to=2026-01-05')['order_count'], 3)
+        self.assertEqual(self.dashboard('?from=2026-01-06')['order_count'], 0)
+        response = self.client.get('/apis/provider_dashboard/?to=someday')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('to', response.json())
+
+
+class OrderExportTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.orders = make_orders(self.owner, make_services(self.provider, 3))
+        Order.objects.filter(order_id=self.orders[0].order_id).update(
+            status='Completed', scheduled_date_time=timezone.make_aware(timezone.datetime(2026, 1, 15, 10)),
+        )
+        self.owner_client = client_for(self.owner)
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        response = self.owner_client.get('/apis/view_all_orders/export/csv/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = self.content(response).splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['order_id', 'service_id', 'service_name'])
+        self.assertEqual(len(lines), 4)
+
+    def test_ndjson_export_is_chunked(self):
+        with mock.patch('Apis.exports.EXPORT_CHUNK_SIZE', 2):
+            response = client_for(self.provider).get('/apis/view_orders/export/ndjson/')
+            chunks = list(response.streaming_content)
+        self.assertEqual(len(chunks), 2)
+        rows = [json.loads(line) for line in b''.join(chunks).decode().splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [order.order_id for order in self.orders])
+        self.assertEqual(rows[0]['owner_name'], 'Owner')
+
+    def test_status_and_date_filters(self):
+        response = self.owner_client.get('/apis/view_all_orders/export/ndjson/?status=Completed&from=2026-01-15&to=2026-01-15')
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row['order_id'] for row in rows], [self.orders[0].order_id])
+
+        response = self.owner_client.get('/apis/view_all_orders/export/ndjson/?to=2026-01-14')
+        self.assertEqual(self.content(response), '')
+
+    def test_invalid_filters_and_format(self):
+        self.assertEqual(self.owner_client.get('/apis/view_all_orders/export/csv/?status=Lost').status_code, 400)
+        self.assertEqual(self.owner_client.get('/apis/view_all_orders/export/csv/?from=yesterday').status_code, 400)
+        self.assertEqual(self.owner_client.get('/apis/view_all_orders/export/xml/').status_code, 404)
+
+
+class ConditionalGetTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        catalog_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.service = make_services(self.provider, 1)[0]
+        self.cart = make_cart(self.owner, [self.service])
+        self.order = make_orders(self.owner, [self.service])[0]
+        self.client = client_for(self.owner)
+
+    def assertRevalidates(self, url, change):
+        first = self.client.get(url)
+        self.assertEqual(first.status_code, 200)
+        again = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(again.status_code, 304)
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+
+    def test_not_modified_skips_the_serializer(self):
+        etag = self.client.get('/apis/owner_profile-view/')['ETag']
+        with mock.patch('Apis.Views.Owner_views.OwnerSerializer') as serializer:
+            response = self.client.get('/apis/owner_profile-view/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        serializer.assert_not_called()
+
+    def test_if_modified_since(self):
+        last_modified = self.client.get('/apis/owner_profile-view/')['Last-Modified']
+        response = self.client.get('/apis/owner_profile-view/', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get('/apis/owner_profile-view/', HTTP_IF_MODIFIED_SINCE='Thu, 01 Jan 2015 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_owner_profile(self):
+        self.assertRevalidates('/apis/owner_profile-view/', lambda: self.client.put(
+            '/apis/owner_profile/update/', {'pet_name': 'Max'}, format='json'))
+
+    def test_provider_profile(self):
+        self.client = client_for(self.provider)
+        self.assertRevalidates('/apis/provider_profile/', lambda: self.client.put(
+            '/apis/provider_profile/update/',
+            {'name': 'Renamed', 'email': 'provider@example.com', 'username': 'provider', 'password': 'x'},
+            format='json'))
+
+    def test_cart_items(self):
+        self.assertRevalidates('/apis/cart_items/', lambda: self.client.delete(
+            f'/apis/delete_service_from_cart/{self.cart[0].cart_id}/'))
+
+    def test_order_status(self):
+        self.assertRevalidates(f'/apis/view_order_status/{self.order.order_id}/', lambda: client_for(self.provider).post(
+            '/apis/update_order_status/batch/', {'order_ids': [self.order.order_id], 'status': 'Processed'}, format='json'))
+
+    def test_get_service(self):
+        def review():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.post(f'/apis/add_review/{self.service.service_id}/', {'review': 'Nice', 'rating': 5}, format='json')
+
+        self.assertRevalidates(f'/apis/services/{self.service.service_id}', review)
+
+
+class ReviewTests(TestCase):
+
+    def setUp(self):
+        self.service = make_services(make_provider(), 1)[0]
+        self.client = client_for(make_owner())
+
+    def test_add_review_maintains_aggregates(self):
+        url = f'/apis/add_review/{self.service.service_id}/'
+        self.client.post(url, {'review': 'Great', 'rating': 4}, format='json')
+        self.client.post(url, {'review': 'Superb', 'rating': 5}, format='json')
+        response = self.client.post(url, {'review': 'No rating'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.service.refresh_from_db()
+        self.assertEqual(self.service.review_count, 3)
+        self.assertEqual(self.service.average_rating, Decimal('4.50'))
+
+    def test_invalid_rating_rejected(self):
+        url = f'/apis/add_review/{self.service.service_id}/'
+        response = self.client.post(url, {'review': 'Hmm', 'rating': 9}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_list_reviews_is_paginated(self):
+        for i in range(3):
+            self.service.add_review(f'Review {i}')
+        response = APIClient().get(f'/apis/services/{self.service.service_id}/reviews/?page_size=2')
+        body = response.json()
+        self.assertEqual([r['review'] for r in body['results']], ['Review 2', 'Review 1'])
+        self.assertIsNotNone(body['next'])
+
+
+class CartBatchTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.other = make_provider('Other')
+        self.owner = make_owner()
+        self.client = client_for(self.owner)
+
+    def add(self, items):
+        return self.client.post('/apis/add_services_to_cart/', {'items': items}, format='json')
+
+    def test_cost_does_not_grow_with_items(self):
+        services = make_services(self.provider, 10)
+        # auth and owner, services, INSERT, summary totals and per provider
+        with self.assertNumQueries(5):
+            response = self.add([{'service_id': service.service_id} for service in services[:1]])
+        self.assertEqual(response.status_code, 201)
+        token_cache.clear()
+        with self.assertNumQueries(5):
+            response = self.add([{'service_id': service.service_id} for service in services[1:]])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['items']), 9)
+        self.assertEqual(Cart.objects.filter(owner=self.owner).count(), 10)
+
+    def test_adds_items_and_returns_summary(self):
+        service = make_services(self.provider, 1)[0]
+        other = make_services(self.other, 1)[0]
+        Service.objects.filter(pk=other.pk).update(price=Decimal('12.50'))
+        response = self.add([
+            {'service_id': service.service_id, 'scheduled_date_time': '2030-01-01T10:00:00Z'},
+            {'service_id': other.service_id},
+            {'service_id': service.service_id},
+        ])
+        self.assertEqual(response.status_code, 201)
+        items = response.json()['items']
+        self.assertEqual([item['service_provider_name'] for item in items], ['Provider', 'Other', 'Provider'])
+        self.assertEqual(items[0]['scheduled_date_time'], '2030-01-01T10:00:00Z')
+        self.assertEqual(items[1]['service_charges'], '12.50')
+
+        summary = self.client.get('/apis/cart_items/summary/').json()
+        self.assertEqual(response.json()['summary'], summary)
+        self.assertEqual(summary, {
+            'item_count': 3,
+            'total_charges': '62.50',
+            'by_provider': [
+                {'service_provider_name': 'Other', 'item_count': 1, 'total_charges': '12.50'},
+                {'service_provider_name': 'Provider', 'item_count': 2, 'total_charges': '50.00'},
+            ],
+        })
+
+    def test_unknown_service_adds_nothing(self):
+        service = make_services(self.provider, 1)[0]
+        response = self.add([{'service_id': service.service_id}, {'service_id': 999999}])
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json()['service_ids'], [999999])
+        self.assertFalse(Cart.objects.exists())
+        self.assertEqual(self.add([]).status_code, 400)
+
+    def test_empty_cart_summary(self):
+        summary = self.client.get('/apis/cart_items/summary/').json()
+        self.assertEqual(summary, {'item_count': 0, 'total_charges': '0.00', 'by_provider': []})
+
+
+class PlaceOrderTests(TestCase):
+
+    def setUp(self):
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.client = client_for(self.owner)
+
+    def test_checkout_cost_does_not_grow_with_cart(self):
+        make_cart(self.owner, make_services(self.provider, 1))
+        token_cache.clear()
+        with self.assertNumQueries(11):
+            self.client.post('/apis/place_order/')
+
+        make_cart(self.owner, make_services(self.provider, 10))
+        token_cache.clear()
+        with self.assertNumQueries(11):
+            response = self.client.post('/apis/place_order/')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.json()['order_ids']), 10)
+        self.assertFalse(Cart.objects.filter(owner=self.owner).exists())
+
+    def test_checkout_reprices_from_service(self):
+        service = make_services(self.provider, 1)[0]
+        make_cart(self.owner, [service])
+        Service.objects.filter(pk=service.pk).update(price=Decimal('30.00'))
+
+        order_id = self.client.post('/apis/place_order/').json()['order_ids'][0]
+
+        order = Order.objects.get(order_id=order_id)
+        self.assertEqual(order.service_charges, Decimal('30.00'))
+        self.assertEqual(order.provider_id, self.provider.provider_id)
+
+    def test_unavailable_service_places_nothing(self):
+        services = make_services(self.provider, 2)
+        make_cart(self.owner, services)
+        services[1].delete()
+
+        response = self.client.post('/apis/place_order/')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Cart.objects.filter(owner=self.owner).count(), 2)
+
+
+# 2030-01-07 is a Monday (weekday 0)
+MONDAY = '2030-01-07'
+
+
+class AvailabilityTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.service = make_services(self.provider, 1)[0]
+        response = client_for(self.provider).put('/apis/provider_availability/', [
+            {'weekday': 0, 'start_time': '09:00', 'end_time': '12:00', 'slot_minutes': 60, 'capacity': 1},
+        ], format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def checkout(self, owner, when):
+        client = client_for(owner)
+        client.post('/apis/add_services_to_cart/', {'items': [
+            {'service_id': self.service.service_id, 'scheduled_date_time': f'{MONDAY}T{when}Z'},
+        ]}, format='json')
+        return client.post('/apis/place_order/')
+
+    def test_templates_are_validated(self):
+        client = client_for(self.provider)
+        response = client.put('/apis/provider_availability/', [
+            {'weekday': 0, 'start_time': '12:00', 'end_time': '09:00'},
+        ], format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(client.get('/apis/provider_availability/').json()), 1)
+
+    def test_free_slots_of_many_providers(self):
+        other = make_provider('Other')
+        unconstrained = make_provider('Anytime')
+        client_for(other).put('/apis/provider_availability/', [
+            {'weekday': 0, 'start_time': '10:00', 'end_time': '11:00', 'slot_minutes': 30, 'capacity': 2},
+        ], format='json')
+        self.assertEqual(self.checkout(make_owner(), '10:15:00').status_code, 201)
+
+        ids = f'{self.provider.provider_id},{other.provider_id},{unconstrained.provider_id}'
+        # templates and bookings, for any number of providers and days
+        with self.assertNumQueries(2):
+            response = APIClient().get(f'/apis/availability/?providers={ids}&from={MONDAY}&to=2030-01-20')
+        self.assertEqual(response.status_code, 200)
+        providers = {entry['provider_id']: entry['slots'] for entry in response.json()['providers']}
+        self.assertEqual(set(providers), {self.provider.provider_id, other.provider_id})
+        self.assertEqual(
+            [slot['start'] for slot in providers[self.provider.provider_id][:3]],
+            [f'{MONDAY}T09:00:00Z', f'{MONDAY}T11:00:00Z', '2030-01-14T09:00:00Z'],
+        )
+        self.assertEqual(providers[other.provider_id][0], {
+            'start': f'{MONDAY}T10:00:00Z', 'end': f'{MONDAY}T10:30:00Z', 'free': 2,
+        })
+
+        client = APIClient()
+        self.assertEqual(client.get('/apis/availability/').status_code, 400)
+        self.assertEqual(client.get('/apis/availability/?providers=1&from=2030-01-01&to=2030-03-01').status_code, 400)
+
+    def test_checkout_books_a_free_place(self):
+        first, second = make_owner('First'), make_owner('Second')
+        self.assertEqual(self.checkout(first, '09:30:00').status_code, 201)
+
+        response = self.checkout(second, '09:00:00')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(len(response.json()['cart_ids']), 1)
+        self.assertEqual(Order.objects.filter(owner=second).count(), 0)
+        self.assertEqual(Cart.objects.filter(owner=second).count(), 1)
+
+        # Outside working hours
+        Cart.objects.filter(owner=second).update(scheduled_date_time=datetime.datetime(2030, 1, 7, 13, tzinfo=datetime.timezone.utc))
+        self.assertEqual(client_for(second).post('/apis/place_order/').status_code, 409)
+
+        # Cancelling gives the place back
+        order = Order.objects.get(owner=first)
+        client_for(first).post(f'/apis/cancel_order/{order.order_id}/')
+        Cart.objects.filter(owner=second).update(scheduled_date_time=datetime.datetime(2030, 1, 7, 9, tzinfo=datetime.timezone.utc))
+        self.assertEqual(client_for(second).post('/apis/place_order/').status_code, 201)
+        self.assertEqual(Booking.objects.get().order_id, Order.objects.get(owner=second).order_id)
+
+    def test_cancelled_order_cannot_take_its_slot_back(self):
+        self.assertEqual(self.checkout(make_owner('First'), '09:00:00').status_code, 201)
+        order = Order.objects.get()
+        provider = client_for(self.provider)
+        url = f'/apis/update_order_status/{order.order_id}/'
+        self.assertEqual(provider.put(url, {'status': 'Cancelled'}, format='json').status_code, 200)
+        self.assertFalse(Booking.objects.exists())
+        self.assertEqual(provider.put(url, {'status': 'Placed'}, format='json').status_code, 400)
+
+        self.assertEqual(self.checkout(make_owner('Second'), '09:00:00').status_code, 201)
+        self.assertEqual(Order.objects.filter(status='Placed').count(), 1)
+
+    def test_rescheduling_needs_a_free_place(self):
+        self.assertEqual(self.checkout(make_owner('First'), '09:00:00').status_code, 201)
+        owner = make_owner('Second')
+        client = client_for(owner)
+        cart = make_cart(owner, [self.service])[0]
+        url = f'/apis/update_scheduled_time/{cart.cart_id}/'
+        self.assertEqual(client.put(url, {'scheduled_date_time': f'{MONDAY}T09:45:00Z'}, format='json').status_code, 409)
+        self.assertEqual(client.put(url, {'scheduled_date_time': f'{MONDAY}T10:45:00Z'}, format='json').status_code, 200)
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        provider = make_provider()
+        self.walking, self.grooming = make_services(provider, 2)
+        Service.objects.filter(pk=self.walking.pk).update(service_name='Dog walking', description='Daily walks')
+        self.walking.refresh_from_db()
+        self.grooming.service_name = 'Grooming'
+        self.grooming.description = 'Bath and brushing for your dog'
+        self.grooming.save()
+
+    def test_search_services_ranks_name_matches_first(self):
+        response = APIClient().get('/apis/services/search?q=dog')
+        names = [row['service_name'] for row in response.json()['results']]
+        self.assertEqual(names, ['Dog walking', 'Grooming'])
+
+    def test_search_orders_only_matches_own_orders(self):
+        owner, other = make_owner(), make_owner('Other')
+        mine = make_orders(owner, [self.walking])
+        make_orders(other, [self.walking])
+
+        response = client_for(owner).get('/apis/search_orders/?service_name=walk')
+
+        self.assertEqual([row['order_id'] for row in response.json()], [mine[0].order_id])
+
+
+class FeedCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.provider = make_provider()
+        self.service = make_services(self.provider, 1)[0]
+        self.client = client_for(make_owner())
+        self.provider_client = client_for(self.provider)
+
+    def test_cached_feed_is_served_without_queries(self):
+        first = self.client.get('/apis/services/deal_of_the_day/')
+        # the token is cached too after the first request
+        with self.assertNumQueries(0):
+            second = self.client.get('/apis/services/deal_of_the_day/')
+        self.assertEqual(first.content, second.content)
+
+        with self.assertNumQueries(0):
+            response = self.client.get('/apis/services/deal_of_the_day/', HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_marking_a_deal_invalidates_the_feed(self):
+        etag = self.client.get('/apis/services/deal_of_the_day/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider_client.patch(
+                f'/apis/services/{self.service.service_id}/mark_deal/', {'is_deal_of_the_day': True}, format='json'
+            )
+
+        response = self.client.get('/apis/services/deal_of_the_day/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['service_id'] for row in response.json()], [self.service.service_id])
+
+    def test_unrelated_update_keeps_the_feed(self):
+        etag = self.client.get('/apis/services/todays_special/')['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider_client.put(
+                f'/apis/services/{self.service.service_id}/update', {'price': '5.00'}, format='json'
+            )
+
+        response = self.client.get('/apis/services/todays_special/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class CatalogCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        self.service = make_services(make_provider(), 1)[0]
+        self.url = f'/apis/services/{self.service.service_id}'
+
+    def test_repeat_requests_hit_the_cache(self):
+        client = APIClient()
+        self.assertEqual(client.get(self.url)['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.json()['service_id'], self.service.service_id)
+
+    def test_query_parameters_are_part_of_the_key(self):
+        client = APIClient()
+        client.get('/apis/services/all')
+        self.assertEqual(client.get('/apis/services/all?page_size=1')['X-Cache'], 'MISS')
+
+    def test_review_write_invalidates(self):
+        client = APIClient()
+        client.get(self.url)
+        with self.captureOnCommitCallbacks(execute=True):
+            client_for(make_owner()).post(
+                f'/apis/add_review/{self.service.service_id}/', {'review': 'Nice', 'rating': 5}, format='json'
+            )
+        response = client.get(self.url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['review_count'], 1)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        lru = ResponseCache('test', max_entries=2)
+        lru._set('a', {'expires': float('inf')})
+        lru._set('b', {'expires': float('inf')})
+        lru._get('a')
+        lru._set('c', {'expires': float('inf')})
+        self.assertIsNone(lru._get('b'))
+        self.assertIsNotNone(lru._get('a'))
+        self.assertEqual(lru.stats()['hits'], 2)
+
+
+class ProfileAuthenticationTests(TestCase):
+
+    def test_role_is_stored_on_save(self):
+        self.assertEqual(make_owner().role, 'owner')
+        self.assertEqual(make_provider().role, 'provider')
+
+    def test_profile_resolved_with_the_token(self):
+        owner = make_owner()
+        client = client_for(owner)
+        # token, user and profile in one query
+        with self.assertNumQueries(1):
+            response = client.get('/apis/owner_profile-view/')
+        self.assertEqual(response.json()['owner_name'], owner.owner_name)
+
+    def test_wrong_role_fails_without_a_query(self):
+        client = client_for(make_owner())
+        with self.assertNumQueries(1):
+            response = client.get('/apis/provider_profile/')
+        self.assertEqual(response.status_code, 404)
+
+
+class TokenCacheTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.owner = make_owner()
+        self.client = client_for(self.owner)
+
+    def test_repeat_requests_skip_the_token_query(self):
+        self.client.get('/apis/owner_profile-view/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/apis/owner_profile-view/')
+        self.assertEqual(response.json()['owner_name'], self.owner.owner_name)
+
+    def test_logout_revokes_the_cached_token(self):
+        self.client.get('/apis/owner_profile-view/')
+        self.client.post('/apis/logout/')
+        response = self.client.get('/apis/owner_profile-view/')
+        self.assertEqual(response.status_code, 401)
+
+    def test_password_change_drops_cached_user(self):
+        self.client.get('/apis/owner_profile-view/')
+        self.owner.set_password('new-password')
+        self.owner.save()
+        with self.assertNumQueries(1):
+            self.client.get('/apis/owner_profile-view/')
+
+    def test_profile_update_is_not_served_stale(self):
+        self.client.get('/apis/owner_profile-view/')
+        self.client.put('/apis/owner_profile/update/', {'pet_name': 'Max'}, format='json')
+        response = self.client.get('/apis/owner_profile-view/')
+        self.assertEqual(response.json()['pet_name'], 'Max')
+
+
+# Every endpoint in Owner_views / Provider_views must reach its rows through an
+# index. The SQL each request actually issues is replayed under EXPLAIN QUERY
+# PLAN, so a view change that loses index use fails here.
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN is SQLite syntax')
+class QueryPlanTests(TestCase):
+    SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX (\w+))?$')
+
+    @classmethod
+    def setUpTestData(cls):
+        models = list(apps.get_app_config('Apis').get_models()) + [Token]
+        cls.tables = {model._meta.db_table for model in models}
+        # Scanning a partial index only reads the rows it covers
+        cls.partial_indexes = {
+            index.name
+            for model in models for index in model._meta.indexes
+            if index.condition is not None
+        }
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        token_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.services = make_services(self.provider, 5)
+        self.deal = make_services(self.provider, 1, is_deal_of_the_day=True, is_todays_special=True)[0]
+        self.orders = make_orders(self.owner, self.services)
+        self.cart = make_cart(self.owner, self.services[:2])
+        self.owner_client = client_for(self.owner)
+        self.provider_client = client_for(self.provider)
+
+    def full_scans(self, queries):
+        scans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                sql = query['sql']
+                if not sql.startswith(('SELECT', 'UPDATE', 'DELETE')):
+                    continue
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                for row in cursor.fetchall():
+                    match = self.SCAN.match(row[-1])
+                    if match and match[1] in self.tables and match[2] not in self.partial_indexes:
+                        scans.append(f'{row[-1]}  <-  {sql}')
+        return scans
+
+    def assertIndexed(self, request, allow=()):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+            if response.streaming:
+                b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+        scans = [scan for scan in self.full_scans(queries.captured_queries)
+                 if not any(scan.startswith(f'SCAN {table}') for table in allow)]
+        self.assertEqual(scans, [])
+
+    def test_owner_endpoints(self):
+        owner, order, cart = self.owner_client, self.orders[0], self.cart[0]
+        service_id = self.services[0].service_id
+        self.assertIndexed(lambda: owner.get('/apis/owner_profile-view/'))
+        self.assertIndexed(lambda: owner.put('/apis/owner_profile/update/', {'pet_name': 'Max'}, format='json'))
+        self.assertIndexed(lambda: owner.post('/apis/add_service_to_cart/', {'service_id': service_id}, format='json'))
+        self.assertIndexed(lambda: owner.post('/apis/add_services_to_cart/', {'items': [{'service_id': service_id}]}, format='json'))
+        self.assertIndexed(lambda: owner.get('/apis/cart_items/'))
+        self.assertIndexed(lambda: owner.get('/apis/cart_items/summary/'))
+        self.assertIndexed(lambda: owner.put(f'/apis/update_scheduled_time/{cart.cart_id}/', {'scheduled_date_time': '2030-01-01T10:00:00Z'}, format='json'))
+        self.assertIndexed(lambda: owner.delete(f'/apis/delete_service_from_cart/{cart.cart_id}/'))
+        self.assertIndexed(lambda: owner.post('/apis/place_order/'))
+        self.assertIndexed(lambda: owner.get(f'/apis/view_order_status/{order.order_id}/'))
+        self.assertIndexed(lambda: owner.get('/apis/search_orders/?service_name=Service'))
+        self.assertIndexed(lambda: owner.get('/apis/view_all_orders/'))
+        self.assertIndexed(lambda: owner.get('/apis/view_all_orders/?page_size=2'))
+        self.assertIndexed(lambda: owner.get('/apis/view_all_orders/export/csv/?status=Placed&from=2026-01-01'))
+        self.assertIndexed(lambda: owner.post(f'/apis/cancel_order/{order.order_id}/'))
+        self.assertIndexed(lambda: owner.post(f'/apis/add_review/{service_id}/', {'review': 'Good', 'rating': 4}, format='json'))
+        self.assertIndexed(lambda: owner.get(f'/apis/services/{service_id}/reviews/'))
+        self.assertIndexed(lambda: owner.post('/apis/favorites/add/', {'service_id': service_id}, format='json'))
+        self.assertIndexed(lambda: owner.get('/apis/favorites/'))
+        favorite_id = owner.get('/apis/favorites/').json()[0]['favorites_id']
+        self.assertIndexed(lambda: owner.delete(f'/apis/favorites/delete/{favorite_id}/'))
+        self.assertIndexed(lambda: owner.post('/apis/logout/'))
+
+    def test_provider_endpoints(self):
+        provider, order = self.provider_client, self.orders[1]
+        service_id = self.services[0].service_id
+        self.assertIndexed(lambda: provider.get('/apis/provider_profile/'))
+        self.assertIndexed(lambda: provider.put('/apis/provider_profile/update/', {'name': 'Renamed', 'email': 'provider@example.com', 'username': 'provider', 'password': 'x'}, format='json'))
+        self.assertIndexed(lambda: provider.post('/apis/create_service', {'service_name': 'New', 'description': 'New', 'price': '10.00'}, format='json'))
+        self.assertIndexed(lambda: provider.generic('POST', '/apis/services/import', json.dumps([{'service_name': 'Service 1', 'description': 'x', 'price': '5.00'}]), content_type='application/json'))
+        self.assertIndexed(lambda: provider.get('/apis/services/search?q=Service'))
+        self.assertIndexed(lambda: provider.get('/apis/services/one'))
+        self.assertIndexed(lambda: provider.get(f'/apis/services/{service_id}'))
+        self.assertIndexed(lambda: provider.put(f'/apis/services/{service_id}/update', {'price': '30.00'}, format='json'))
+        self.assertIndexed(lambda: provider.get('/apis/view_orders/'))
+        self.assertIndexed(lambda: provider.get('/apis/view_orders/export/ndjson/'))
+        self.assertIndexed(lambda: provider.put(f'/apis/update_order_status/{order.order_id}/', {'status': 'Processed'}, format='json'))
+        self.assertIndexed(lambda: provider.get('/apis/provider_dashboard/?from=2026-01-01'))
+        self.assertIndexed(lambda: provider.put('/apis/provider_availability/', [{'weekday': 0, 'start_time': '09:00', 'end_time': '17:00'}], format='json'))
+        self.assertIndexed(lambda: provider.get(f'/apis/availability/?providers={self.provider.provider_id}'))
+        self.assertIndexed(lambda: provider.post('/apis/update_order_status/batch/', {'order_ids': [o.order_id for o in self.orders], 'status': 'Completed'}, format='json'))
+        self.assertIndexed(lambda: provider.patch(f'/apis/services/{service_id}/mark_special/', {'is_todays_special': True}, format='json'))
+        self.assertIndexed(lambda: provider.patch(f'/apis/services/{service_id}/mark_deal/', {'is_deal_of_the_day': True}, format='json'))
+        self.assertIndexed(lambda: provider.get('/apis/services/deal_of_the_day/'))
+        self.assertIndexed(lambda: provider.get('/apis/services/todays_special/'))
+        self.assertIndexed(lambda: provider.delete(f'/apis/services/{self.deal.service_id}/delete'))
+
+    def test_catalog_pages_seek_on_the_primary_key(self):
+        # The full catalogue is a scan by design; a later page must not be
+        # (cursor pages are "WHERE service_id > n").
+        client = APIClient()
+        self.assertIndexed(lambda: client.get('/apis/services/all'), allow=['Apis_service'])
+        next_url = client.get('/apis/services/all?page_size=2').json()['next']
+        self.assertIndexed(lambda: client.get(next_url))
+
+
+class RequestMetricsTests(TestCase):
+
+    def setUp(self):
+        registry.reset()
+        token_cache.clear()
+        self.client = client_for(make_owner())
+        staff = User.objects.create(username='ops', email='ops@example.com', is_staff=True)
+        self.staff_client = client_for(staff)
+
+    def test_server_timing_header(self):
+        response = self.client.get('/apis/view_all_orders/')
+        # token lookup + order rows
+        self.assertIn('desc="2 queries"', response['Server-Timing'])
+        self.assertIn('total;dur=', response['Server-Timing'])
+
+    def test_metrics_endpoint_reports_per_view_histograms(self):
+        self.client.get('/apis/view_all_orders/')
+        self.client.get('/apis/view_all_orders/')
+
+        response = self.staff_client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('# TYPE petcare_request_duration_seconds histogram', body)
+        self.assertIn('petcare_request_queries_count{view="view_all_orders"} 2', body)
+        # the second request authenticated from the token cache
+        self.assertIn('petcare_request_queries_bucket{view="view_all_orders",le="1"} 1', body)
+
+    def test_metrics_requires_staff(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+
+    def test_totals_of_all_workers_are_reported(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS={'DIR': directory, 'FLUSH_INTERVAL': 0}):
+            other_worker = {'petcare_request_queries|view_all_orders': {'buckets': [0, 0, 5, 5, 5, 5, 5, 5, 5], 'sum': 10, 'count': 5}}
+            with open(os.path.join(directory, '1.json'), 'w') as f:
+                json.dump(other_worker, f)
+
+            self.client.get('/apis/view_all_orders/')
+            body = self.staff_client.get('/metrics').content.decode()
+
+        self.assertIn('petcare_request_queries_count{view="view_all_orders"} 6', body)
+        self.assertIn('petcare_request_queries_sum{view="view_all_orders"} 12', body)
+
+
+@skipUnless('replica' in settings.DATABASES, 'run with --settings=PetCareApp.settings_replica')
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    # The runner sets up every database a test class names, skipped or not
+    databases = {'default', 'replica'} & set(settings.DATABASES)
+
+    def setUp(self):
+        cache.clear()
+        catalog_cache.clear()
+        token_cache.clear()
+        self.provider = make_provider()
+        self.owner = make_owner()
+        self.services = make_services(self.provider, 2)
+        make_orders(self.owner, self.services)
+        # A replica that has fallen behind: one other service, no orders
+        lagging = ServiceProvider.objects.using('replica').create(
+            email='lagging@example.com', username='lagging', password='x', name='Lagging',
+        )
+        Service.objects.using('replica').create(
+            provider=lagging, price=Decimal('5.00'), description='x', service_name='On replica',
+            is_deal_of_the_day=True,
+        )
+        self.client = client_for(self.owner)
+
+    def test_safe_views_read_from_replica(self):
+        self.assertEqual(self.client.get('/apis/view_all_orders/').json(), [])
+        # Cached views fill the cache from the primary only
+        names = [service['service_name'] for service in APIClient().get('/apis/services/all').json()]
+        self.assertEqual(names, ['Service 0', 'Service 1'])
+        self.assertEqual(self.client.get('/apis/services/deal_of_the_day/').json(), [])
+        # Views without @replica_reads stay on the primary
+        self.assertEqual(len(self.client.get('/apis/view_order_status/%d/' % Order.objects.first().order_id).json()), 8)
+
+    def test_reads_in_a_transaction_stay_on_primary(self):
+        count_services = replica_reads(lambda request: Service.objects.count())
+        request = mock.Mock(method='GET', user=self.owner)
+        self.assertEqual(count_services(request), 1)
+        with transaction.atomic():
+            self.assertEqual(count_services(request), 2)
+
+    def test_pins_need_a_shared_cache(self):
+        check_pin_cache()
+        local = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=local), self.assertRaises(ImproperlyConfigured):
+            check_pin_cache()
+        with override_settings(CACHES=local, DATABASE_REPLICAS=[]):
+            check_pin_cache()
+
+    def test_writes_pin_the_user_to_primary(self):
+        response = self.client.post('/apis/favorites/add/', {'service_id': self.services[0].service_id}, format='json')
+        self.assertLess(response.status_code, 400)
+        self.assertEqual(Favorites.objects.using('replica').count(), 0)
+        self.assertEqual(Favorites.objects.count(), 1)
+
+        self.assertEqual(len(self.client.get('/apis/view_all_orders/').json()), 2)
+        # Other users still read from the replica
+        self.assertEqual(client_for(make_owner('Second')).get('/apis/view_all_orders/').json(), [])
+
+        cache.clear()  # the pin expired
+        self.assertEqual(self.client.get('/apis/view_all_orders/').json(), [])
+
+
+class ShardPlacementTests(SimpleTestCase):
+
+    def test_adding_a_shard_only_moves_owners_onto_it(self):
+        owner_ids = range(1, 3001)
+        before = {owner_id: shard_for_owner(owner_id, ['default', 'shard1']) for owner_id in owner_ids}
+        after = {owner_id: shard_for_owner(owner_id, ['default', 'shard1', 'shard2']) for owner_id in owner_ids}
+        moved = [owner_id for owner_id in owner_ids if before[owner_id] != after[owner_id]]
+        self.assertEqual({after[owner_id] for owner_id in moved}, {'shard2'})
+        self.assertAlmostEqual(len(moved) / len(owner_ids), 1 / 3, delta=0.05)
+
+
+SHARDS = ['default', 'shard1', 'shard2']
+
+
+@skipUnless('shard2' in settings.DATABASES, 'run with --settings=PetCareApp.settings_shards')
+@override_settings(ORDER_SHARDS=SHARDS)
+class ShardingTests(TestCase):
+    databases = set(SHARDS) & set(settings.DATABASES)
+
+    def setUp(self):
+        cache.clear()
+        token_cache.clear()
+        self.provider = make_provider()
+        self.services = make_services(self.provider, 2)
+        # One owner on each shard
+        self.owners = {}
+        while len(self.owners) < len(SHARDS):
+            owner = make_owner(f'Owner{Owner.objects.count()}')
+            self.owners.setdefault(shard_for_owner(owner.owner_id), owner)
+        self.client = client_for(self.provider)
+
+    def checkout(self, owner):
+        client = client_for(owner)
+        for service in self.services:
+            response = client.post('/apis/add_service_to_cart/', {'service_id': service.service_id}, format='json')
+            self.assertEqual(response.status_code, 201)
+        response = client.post('/apis/place_order/')
+        self.assertEqual(response.status_code, 201)
+        return response.json()['order_ids']
+
+    def test_carts_and_orders_live_on_the_owners_shard(self):
+        ids = {shard: self.checkout(owner) for shard, owner in self.owners.items()}
+        for shard, owner in self.owners.items():
+            self.assertEqual(sorted(Order.objects.using(shard).values_list('order_id', flat=True)), sorted(ids[shard]))
+            self.assertEqual(Cart.objects.using(shard).count(), 0)
+            response = client_for(owner).get('/apis/view_all_orders/')
+            self.assertEqual(sorted(order['order_id'] for order in response.json()), sorted(ids[shard]))
+            self.assertEqual(client_for(owner).get(f'/apis/view_order_status/{ids[shard][0]}/').status_code, 200)
+            response = client_for(owner).get('/apis/view_all_orders/export/csv/')
+            rows = b''.join(response.streaming_content).decode().splitlines()[1:]
+            self.assertEqual(sorted(int(row.split(',')[0]) for row in rows), sorted(ids[shard]))
+        all_ids = [order_id for shard_ids in ids.values() for order_id in shard_ids]
+        self.assertEqual(len(set(all_ids)), 6)
+        self.assertEqual(sum(ProviderOrderSummary.objects.values_list('order_count', flat=True)), 6)
+
+    def test_batch_add_fills_the_owners_cart_on_its_shard(self):
+        items = [{'service_id': service.service_id} for service in self.services]
+        for shard, owner in self.owners.items():
+            client = client_for(owner)
+            response = client.post('/apis/add_services_to_cart/', {'items': items}, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(response.json()['summary']['item_count'], len(self.services))
+            self.assertEqual(client.get('/apis/cart_items/summary/').json()['item_count'], len(self.services))
+            self.assertEqual(Cart.objects.using(shard).filter(owner_id=owner.owner_id).count(), len(self.services))
+        self.assertEqual(sum(Cart.objects.using(shard).count() for shard in SHARDS), len(SHARDS) * len(self.services))
+
+    def test_rows_created_outside_owner_views_go_to_the_owners_shard(self):
+        shard = next(alias for alias in self.owners if alias != 'default')
+        owner = self.owners[shard]
+        order = make_orders(owner, self.services[:1])[0]
+        make_cart(owner, self.services[:1])
+        self.assertEqual(list(Order.objects.using(shard).values_list('order_id', flat=True)), [order.order_id])
+        self.assertEqual(Cart.objects.using(shard).count(), 1)
+        self.assertFalse(Order.objects.using('default').exists())
+        orders = client_for(owner).get('/apis/view_all_orders/').json()
+        self.assertEqual([row['order_id'] for row in orders], [order.order_id])
+
+    def test_provider_views_merge_the_shards(self):
+        ids = sorted(order_id for owner in self.owners.values() for order_id in self.checkout(owner))
+
+        orders = self.client.get('/apis/view_orders/').json()
+        self.assertEqual([order['order_id'] for order in orders], ids)
+        self.assertTrue(all(order['owner_name'].startswith('Owner') for order in orders))
+
+        page = self.client.get('/apis/view_orders/?page_size=4').json()
+        self.assertEqual([order['order_id'] for order in page['results']], ids[:4])
+        page = self.client.get(page['next']).json()
+        self.assertEqual([order['order_id'] for order in page['results']], ids[4:])
+        page = self.client.get(page['previous']).json()
+        self.assertEqual([order['order_id'] for order in page['results']], ids[:4])
+
+        response = self.client.get('/apis/view_orders/export/ndjson/')
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['order_id'] for line in lines], ids)
+
+    def test_provider_updates_reach_every_shard(self):
+        ids = [self.checkout(owner) for owner in self.owners.values()]
+        response = self.client.put(f'/apis/update_order_status/{ids[2][0]}/', {'status': 'Processed'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.put('/apis/update_order_status/999999/', {'status': 'Processed'}, format='json').status_code, 404)
+
+        batch = [shard_ids[1] for shard_ids in ids] + [ids[2][0]]
+        response = self.client.post('/apis/update_order_status/batch/', {'order_ids': batch, 'status': 'Completed'}, format='json')
+        self.assertEqual(response.json()['updated'], 4)
+        dashboard = self.client.get('/apis/provider_dashboard/').json()
+        self.assertEqual(dashboard['by_status']['Completed']['order_count'], 4)
+        self.assertEqual(dashboard['by_status']['Placed']['order_count'], 2)
+
+    def test_owner_changes_follow_their_orders(self):
+        shard = next(alias for alias in self.owners if alias != 'default')
+        owner = self.owners[shard]
+        self.checkout(owner)
+        owner.owner_name = 'Renamed'
+        owner.save()
+        self.assertEqual(set(Order.objects.using(shard).values_list('owner_name', flat=True)), {'Renamed'})
+
+        owner.delete()
+        self.assertEqual(Order.objects.using(shard).count(), 0)
+        self.assertEqual(sum(ProviderOrderSummary.objects.values_list('order_count', flat=True)), 0)
+
+    def test_rebalance_moves_rows_to_their_shard(self):
+        # Orders placed before sharding was switched on are all on default
+        with override_settings(ORDER_SHARDS=[]):
+            before = {owner.owner_id: self.checkout(owner) for owner in self.owners.values()}
+            make_cart(self.owners['shard1'], self.services[:1])
+
+        start = timezone.now()
+        Booking.objects.bulk_create([
+            Booking(provider=self.provider, order_id=order_id, slot_start=start, slot_end=start + datetime.timedelta(hours=1))
+            for ids in before.values() for order_id in ids
+        ])
+        summaries = list(ProviderOrderSummary.objects.order_by('pk').values())
+        bookings = list(Booking.objects.order_by('pk').values())
+
+        output = io.StringIO()
+        call_command('rebalance_order_shards', '--dry-run', stdout=output)
+        self.assertIn('Order: would move 4 rows', output.getvalue())
+        self.assertEqual(Order.objects.using('shard1').count(), 0)
+
+        call_command('rebalance_order_shards', stdout=io.StringIO())
+        for shard, owner in self.owners.items():
+            self.assertEqual(
+                sorted(Order.objects.using(shard).values_list('order_id', flat=True)), sorted(before[owner.owner_id]),
+            )
+        self.assertEqual(Cart.objects.using('shard1').count(), 1)
+        # Moved rows are not deleted orders: summaries and slots are untouched
+        self.assertEqual(list(ProviderOrderSummary.objects.order_by('pk').values()), summaries)
+        self.assertEqual(list(Booking.objects.order_by('pk').values()), bookings)
+
+        # New ids continue after the existing ones
+        new_ids = self.checkout(self.owners['shard2'])
+        self.assertGreater(min(new_ids), max(order_id for ids in before.values() for order_id in ids))
+
+
+@skipUnless('shard2' in settings.DATABASES, 'run with --settings=PetCareApp.settings_shards')
+@override_settings(ORDER_SHARDS=SHARDS)
+class ShardFanOutTests(TransactionTestCase):
+    databases = set(SHARDS) & set(settings.DATABASES)
+
+    def test_shards_are_queried_in_parallel(self):
+        # Every call waits for the others, so this only returns if they run at once
+        barrier = threading.Barrier(len(SHARDS), timeout=10)
+
+        def count(alias):
+            barrier.wait()
+            return Order.objects.using(alias).count()
+
+        self.assertEqual(fan_out(count), [0, 0, 0])
+
+    def test_shards_in_a_transaction_are_queried_from_it(self):
+        owner = make_owner()
+        with transaction.atomic(using='shard1'):
+            Cart.objects.using('shard1').create(
+                owner=owner, service_id=1, service_name='x', service_provider_name='x', service_charges=1,
+            )
+            self.assertEqual(fan_out(lambda alias: Cart.objects.using(alias).count()), [0, 1, 0])
+
+
+class DatabaseProfileTests(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'petcare.sqlite3')
+        # A handler of its own, so every thread opens its own connection
+        # ('default' is only there because a handler must have one)
+        profile = database_profile('sqlite', directory.name, env={'PETCARE_SQLITE_PATH': self.path})
+        self.connections = ConnectionHandler({
+            'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+            'profile': profile['default'],
+        })
+        self.addCleanup(self.connections.close_all)
+
+    def test_sqlite_connections_are_tuned(self):
+        connection = self.connections['profile']
+        with connection.cursor() as cursor:
+            pragmas = {name: cursor.execute(f'PRAGMA {name}').fetchone()[0]
+                       for name in ('journal_mode', 'synchronous', 'busy_timeout')}
+        self.assertEqual(pragmas, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 20000})
+        self.assertEqual(connection.transaction_mode, 'IMMEDIATE')
+
+    def test_parallel_writers(self):
+        with self.connections['profile'].cursor() as cursor:
+            cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, value INTEGER)')
+            cursor.execute('INSERT INTO counter VALUES (1, 0)')
+            cursor.execute('CREATE TABLE event (id INTEGER PRIMARY KEY AUTOINCREMENT, writer INTEGER)')
+        writers, rounds = 8, 25
+        errors = []
+
+        def write(number):
+            connection = self.connections['profile']
+            try:
+                with connection.cursor() as cursor:
+                    for _ in range(rounds):
+                        # Read-modify-write, as Django runs atomic() blocks
+                        cursor.execute(f'BEGIN {connection.transaction_mode}')
+                        value = cursor.execute('SELECT value FROM counter WHERE id = 1').fetchone()[0]
+                        cursor.execute('UPDATE counter SET value = %s WHERE id = 1', [value + 1])
+                        cursor.execute('INSERT INTO event (writer) VALUES (%s)', [number])
+                        cursor.execute('COMMIT')
+                        # Readers run alongside the writers
+                        cursor.execute('SELECT COUNT(*) FROM event').fetchone()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(number,)) for number in range(writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        with self.connections['profile'].cursor() as cursor:
+            self.assertEqual(cursor.execute('SELECT value FROM counter').fetchone()[0], writers * rounds)
+            self.assertEqual(cursor.execute('SELECT COUNT(*) FROM event').fetchone()[0], writers * rounds)
+
+    def test_postgres_profile(self):
+        persistent = database_profile('postgres', '.', env={'PETCARE_DB_CONN_MAX_AGE': '120'})['default']
+        self.assertEqual((persistent['CONN_MAX_AGE'], persistent['CONN_HEALTH_CHECKS']), (120, True))
+        pooled = database_profile('postgres', '.', env={'PETCARE_DB_POOL': '1'})['default']
+        self.assertEqual(pooled['CONN_MAX_AGE'], 0)
+        self.assertEqual(pooled['OPTIONS']['pool']['max_size'], 10)
+
+
+class LoggingTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'app.log')
+        self.logger = logging.getLogger('Apis.tests.logging')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def attach(self, handler):
+        self.logger.addHandler(handler)
+        self.addCleanup(handler.close)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def test_records_are_written_as_json_with_request_id(self):
+        handler = self.attach(AsyncLogHandler(filename=self.path))
+        token = request_id.set('req-1')
+        try:
+            self.logger.warning('Order %s placed', 7, extra={'owner_id': 3})
+            try:
+                1 / 0
+            except ZeroDivisionError:
+                self.logger.exception('Failed')
+        finally:
+            request_id.reset(token)
+        handler.flush()
+
+        with open(self.path) as f:
+            placed, failed = [json.loads(line) for line in f]
+        self.assertEqual(placed['message'], 'Order 7 placed')
+        self.assertEqual(placed['request_id'], 'req-1')
+        self.assertEqual(placed['owner_id'], 3)
+        self.assertIn('ZeroDivisionError', failed['exception'])
+
+    def test_log_file_is_rotated_by_size(self):
+        handler = self.attach(AsyncLogHandler(filename=self.path, max_bytes=500, backup_count=2))
+        for i in range(20):
+            self.logger.info('Record %s', i)
+        handler.flush()
+        self.assertTrue(os.path.exists(self.path + '.1'))
+        self.assertFalse(os.path.exists(self.path + '.3'))
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        handler = self.attach(AsyncLogHandler(filename=self.path, queue_size=1))
+        handler.listener.stop()
+        for i in range(3):
+            self.logger.info('Record %s', i)
+        self.assertEqual(handler.dropped, 2)
+
+    def test_sampling_only_thins_low_level_records_of_listed_loggers(self):
+        sampler = SamplingFilter(rate=0, loggers=['django.db.backends'])
+        record = lambda name, level: logging.LogRecord(name, level, '', 0, 'sql', (), None)
+        self.assertFalse(sampler.filter(record('django.db.backends', logging.DEBUG)))
+        self.assertTrue(sampler.filter(record('django.db.backends', logging.WARNING)))
+        self.assertTrue(sampler.filter(record('Apis.Views', logging.DEBUG)))
+
+    def test_request_id_header(self):
+        response = APIClient().get('/apis/services/all', HTTP_X_REQUEST_ID='abc123')
+        self.assertEqual(response['X-Request-ID'], 'abc123')
+        self.assertEqual(len(APIClient().get('/apis/services/all')['X-Request-ID']), 32)
+
+
+class ServiceImportTests(TestCase):
+
+    def setUp(self):
+        token_cache.clear()
+        self.provider = make_provider()
+        self.existing = make_services(self.provider, 1, is_deal_of_the_day=True)[0]
+        self.client = client_for(self.provider)
+
+    def post(self, body, content_type):
+        return self.client.generic('POST', '/apis/services/import', body, content_type=content_type)
+
+    def test_json_array_upserts_and_reports_bad_rows(self):
+        rows = [
+            {'service_name': 'Service 0', 'description': 'Updated', 'price': '30.00'},
+            {'service_name': 'Grooming', 'description': 'Full groom', 'price': '45.00'},
+            {'service_name': 'Walk', 'description': 'No price'},
+            'not a service',
+        ]
+        response = self.post(json.dumps(rows), 'application/json')
+        summary = response.json()
+
+        self.assertEqual((summary['created'], summary['updated'], summary['error_count']), (1, 1, 2))
+        self.assertEqual([error['row'] for error in summary['errors']], [3, 4])
+        self.assertIn('price', summary['errors'][0]['errors'])
+
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.description, 'Updated')
+        # Flags not given in the row are left alone
+        self.assertTrue(self.existing.is_deal_of_the_day)
+        self.assertTrue(Service.objects.filter(provider=self.provider, service_name='Grooming').exists())
+
+    def test_csv(self):
+        body = 'service_name,description,price,is_todays_special\nBath,Warm bath,20.00,true\nNails,Trim,,\n'
+        summary = self.post(body, 'text/csv').json()
+        self.assertEqual((summary['created'], summary['error_count']), (1, 1))
+        self.assertTrue(Service.objects.get(service_name='Bath').is_todays_special)
+
+    def test_ndjson_keeps_rows_before_a_syntax_error(self):
+        body = '{"service_name": "Bath", "description": "Warm", "price": "20.00"}\n{"service_name": \n'
+        summary = self.post(body, 'application/x-ndjson').json()
+        self.assertEqual(summary['created'], 1)
+        self.assertEqual(summary['errors'][0]['row'], 2)
+
+    def test_batches_are_written_with_bulk_queries(self):
+        rows = [{'service_name': f'Bulk {i}', 'description': 'x', 'price': '1.00'} for i in range(50)]
+        # auth, then per batch: select existing, insert (+ savepoint pair)
+        with self.assertNumQueries(5):
+            summary = self.post(json.dumps(rows), 'application/json').json()
+        self.assertEqual(summary['created'], 50)
+
+    def test_unsupported_content_type(self):
+        self.assertEqual(self.post('x', 'text/plain').status_code, 415)
+
+    def test_json_values_split_across_chunks(self):
+        rows = [{'service_name': f'S{i}', 'price': 1234567 + i} for i in range(5)]
+        with mock.patch('Apis.service_import.CHUNK_SIZE', 3):
+            parsed = list(read_rows(io.BytesIO(json.dumps(rows).encode()), 'json'))
+        self.assertEqual(parsed, rows)
+
+    def test_management_command(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+            f.write('{"service_name": "Bath", "description": "Warm", "price": "20.00"}\n')
+        self.addCleanup(os.remove, f.name)
+        out = io.StringIO()
+        call_command('import_services', self.provider.email, f.name, stdout=out)
+        self.assertIn('1 created, 0 updated, 0 errors', out.getvalue())
+
+
+calls = []
+
+
+@task(max_attempts=2, backoff=0)
+def remember(value):
+    calls.append(value)
+
+
+@task(max_attempts=2, backoff=0)
+def explode():
+    raise ValueError('boom')
+
+
+class TaskQueueTests(TestCase):
+
+    def test_tasks_are_queued_when_the_transaction_commits(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            remember.delay(1)
+            remember.enqueue(args=[2], key='two')
+            self.assertFalse(Task.objects.exists())
+        for callback in callbacks:
+            callback()
+        # Same key, not queued again
+        with self.captureOnCommitCallbacks(execute=True):
+            remember.enqueue(args=[3], key='two')
+        self.assertEqual(sorted(Task.objects.values_list('args', flat=True)), [[1], [2]])
+        self.assertEqual(Task.objects.get(key='two').name, 'Apis.tests.remember')
+
+    def test_rolled_back_work_queues_nothing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(ValueError), transaction.atomic():
+                remember.delay(1)
+                raise ValueError
+        self.assertFalse(Task.objects.exists())
+
+
+class TaskWorkerTests(TransactionTestCase):
+
+    def setUp(self):
+        calls.clear()
+
+    def work(self):
+        out = io.StringIO()
+        # One at a time: writes from several threads to the in-memory test
+        # database fail on its table locks instead of waiting
+        call_command('run_tasks', '--once', '--concurrency', '1', stdout=out)
+        return out.getvalue()
+
+    def test_runs_tasks_and_retries_failures(self):
+        for value in range(5):
+            remember.delay(value)
+        explode.delay()
+        with self.assertLogs('Apis.task_queue', 'ERROR'):
+            self.assertIn('5 done, 1 to retry, 1 failed', self.work())
+        self.assertEqual(sorted(calls), [0, 1, 2, 3, 4])
+        failed = Task.objects.get(status='Failed')
+        self.assertEqual(failed.attempts, 2)
+        self.assertIn('ValueError: boom', failed.last_error)
+
+    def test_tasks_of_a_dead_worker_are_run_again(self):
+        Task.objects.create(
+            name='Apis.tests.remember', args=[1], status='Running', attempts=1,
+            run_at=timezone.now() - datetime.timedelta(seconds=1),
+        )
+        self.work()
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.get().status, 'Done')
+
+        # Finished tasks are purged after --keep-days
+        Task.objects.update(run_at=timezone.now() - datetime.timedelta(days=8))
+        self.work()
+        self.assertFalse(Task.objects.exists())
@@ -1,7 +1,8 @@
 from django.urls import path
-from .Views.Owner_views import add_review, add_service_to_favorites, cancel_order, delete_favorite, list_cart_items, list_favorite_items, owner_profile, place_order, search_orders, update_owner_profile, register_owner, login_view, view_all_orders, view_order_status
-from .Views.Provider_views import get_deal_of_the_day_services, get_todays_special_services, list_services_for_provider, mark_service_deal, mark_service_special, provider_profile, provider_login_view, create_service, update_order_status, update_provider_profile,update_service,register_provider,list_services,get_service,delete_service, view_orders
-from .Views.Owner_views import add_service_to_cart, delete_service_from_cart, update_scheduled_time
+from .Views.Owner_views import add_review, list_service_reviews, add_service_to_favorites, cancel_order, delete_favorite, list_cart_items, list_favorite_items, owner_profile, place_order, search_orders, update_owner_profile, register_owner, login_view, logout_view, view_all_orders, view_order_status, export_owner_orders
+from .Views.Provider_views import get_deal_of_the_day_services, get_todays_special_services, list_services_for_provider, mark_service_deal, mark_service_special, provider_profile, provider_login_view, create_service, update_order_status, update_provider_profile,update_service,register_provider,list_services,get_service,delete_service, view_orders, search_services, import_services, update_order_status_batch, export_provider_orders, provider_dashboard, provider_availability, available_slots
+from .Views.Owner_views import add_service_to_cart, add_services_to_cart, cart_summary, delete_service_from_cart, update_scheduled_time
+from .Views.Admin_views import cache_stats
 
 urlpatterns = [
 
@@ -10,10 +11,13 @@ urlpatterns = [
     path('owner_register/', register_owner, name='register-owner'),
     path('owner_profile/update/', update_owner_profile, name='update-owner-profile'),
     path('owner_login/', login_view, name='login'),
+    path('logout/', logout_view, name='logout'),
 
     # Cart
     path('add_service_to_cart/', add_service_to_cart, name='add_service_to_cart'),
+    path('add_services_to_cart/', add_services_to_cart, name='add_services_to_cart'),
     path('cart_items/', list_cart_items, name='list_cart_items'),
+    path('cart_items/summary/', cart_summary, name='cart_summary'),
     path('delete_service_from_cart/<int:cart_id>/', delete_service_from_cart, name='delete_service_from_cart'),
     path('update_scheduled_time/<int:cart_id>/', update_scheduled_time, name='update_scheduled_time'),
 
@@ -23,9 +27,11 @@ urlpatterns = [
     path('cancel_order/<int:order_id>/', cancel_order, name='cancel_order'),
     path('search_orders/', search_orders, name='search_orders'),
     path('view_all_orders/', view_all_orders, name='view_all_orders'),
+    path('view_all_orders/export/<str:export_format>/', export_owner_orders, name='export_owner_orders'),
 
     #Review
     path('add_review/<int:service_id>/', add_review, name='add_review'),
+    path('services/<int:service_id>/reviews/', list_service_reviews, name='list_service_reviews'),
 
     #Favorite
     path('favorites/add/', add_service_to_favorites, name='add_service_to_favorites'),
@@ -43,7 +49,9 @@ urlpatterns = [
     
     # Service
     path('create_service', create_service, name='create_service'),
+    path('services/import', import_services, name='import_services'),
     path('services/all', list_services, name='list_services'),
+    path('services/search', search_services, name='search_services'),
     path('services/one', list_services_for_provider, name='list_services_for_provider'),
     path('services/<int:service_id>', get_service, name='get_service'),
     path('services/<int:service_id>/update', update_service, name='update_service'),
@@ -51,7 +59,12 @@ urlpatterns = [
 
     #Orders
     path('view_orders/', view_orders, name='view_orders'),
+    path('view_orders/export/<str:export_format>/', export_provider_orders, name='export_provider_orders'),
     path('update_order_status/<int:order_id>/', update_order_status, name='update_order_status'),
+    path('update_order_status/batch/', update_order_status_batch, name='update_order_status_batch'),
+    path('provider_dashboard/', provider_dashboard, name='provider_dashboard'),
+    path('provider_availability/', provider_availability, name='provider_availability'),
+    path('availability/', available_slots, name='available_slots'),
 
     #Deal
     path('services/<int:service_id>/mark_special/', mark_service_special, name='mark_service_special'),
@@ -59,5 +72,6 @@ urlpatterns = [
     path('services/deal_of_the_day/', get_deal_of_the_day_services, name='get_deal_of_the_day_services'),
     path('services/todays_special/', get_todays_special_services, name='get_todays_special_services'),
 
-
+    # Operations
+    path('cache_stats/', cache_stats, name='cache_stats'),
 ]
@@ -10,9 +10,13 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
+import os
+import sys
 from pathlib import Path
 
 import Apis
+from Apis.database import database_profile
+from Apis.log import logging_preset
 
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -49,6 +53,9 @@ INSTALLED_APPS = [
 CORS_ORIGIN_ALLOW_ALL = True
 
 MIDDLEWARE = [
+    'Apis.log.RequestIdMiddleware',
+    'Apis.metrics.RequestMetricsMiddleware',
+    'Apis.replicas.ReplicaPinMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -82,24 +89,87 @@ WSGI_APPLICATION = 'PetCareApp.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
+# PETCARE_DB picks 'sqlite' (WAL, busy timeout, BEGIN IMMEDIATE) or
+# 'postgres' (persistent or pooled connections), see Apis/database.py.
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+DATABASES = database_profile(os.environ.get('PETCARE_DB', 'sqlite'), BASE_DIR)
+
+# GET views marked @replica_reads read from these aliases; a user who wrote
+# reads from the primary for REPLICA_PIN_SECONDS. See Apis/replicas.py.
+DATABASE_ROUTERS = ['Apis.sharding.ShardRouter', 'Apis.replicas.ReplicaRouter']
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias.startswith('replica')]
+REPLICA_PIN_SECONDS = 5
+
+# Databases Order and Cart rows are spread over by owner, none when empty.
+# See Apis/sharding.py.
+_shards = [alias for alias in DATABASES if alias.startswith('shard')]
+ORDER_SHARDS = ['default', *_shards] if _shards else []
 AUTH_USER_MODEL = 'Apis.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'Apis.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Same output as JSONRenderer, faster when orjson is installed
+    'DEFAULT_RENDERER_CLASSES': [
+        'Apis.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+}
+
+# Caches
+# A file cache by default, shared by the worker processes of one machine:
+# the catalog cache versions and the replica pins in it must be seen by
+# every worker. PETCARE_CACHE=locmem keeps it in process memory, which is
+# only correct with a single worker process.
+if os.environ.get('PETCARE_CACHE', 'file') == 'file':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.environ.get('PETCARE_CACHE_DIR', str(BASE_DIR / '.cache')),
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'petcare',
+        }
+    }
+
+# Seconds a rendered deal-of-the-day / today's-special page is kept
+FEED_CACHE_TIMEOUT = 300
+
+# Per-worker cache of authenticated tokens. With SHARED_INVALIDATION, logouts
+# and user changes are also published through the Django cache so other
+# workers drop their copies (needs a cache shared between workers).
+TOKEN_CACHE = {
+    'TIMEOUT': 300,
+    'MAX_ENTRIES': 10000,
+    'SHARED_INVALIDATION': False,
 }
 
+# Per-worker LRU of rendered list_services / get_service responses
+CATALOG_CACHE = {
+    'TIMEOUT': 60,
+    'MAX_ENTRIES': 1000,
+}
+
+# Per-view request metrics served at /metrics. Set PETCARE_METRICS_DIR to a
+# directory shared by the worker processes of one machine (cleared on
+# restart) to report the totals of all of them instead of one worker.
+METRICS = {
+    'DIR': os.environ.get('PETCARE_METRICS_DIR'),
+    'FLUSH_INTERVAL': 1.0,
+}
+
+# Keyset pagination for list endpoints (opt-in with ?cursor= or ?page_size=)
+KEYSET_PAGE_SIZE = 50
+KEYSET_MAX_PAGE_SIZE = 500
+
 
 
 # Password validation
@@ -144,21 +214,9 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
-LOGGING = {
-    'version': 1,
-    'disable_existing_loggers': False,
-    'handlers': {
-        'file': {
-            'level': 'DEBUG',
-            'class': 'logging.FileHandler',
-            'filename': 'debug.log',
-        },
-    },
-    'loggers': {
-        'django': {
-            'handlers': ['file'],
-            'level': 'DEBUG',
-            'propagate': True,
-        },
-    },
-}
+# Logging goes through a background writer thread as JSON lines, see Apis/log.py.
+# PETCARE_LOG_PRESET picks 'development' (DEBUG to debug.log, SQL sampled),
+# 'production' (INFO to rotated petcare.log and stderr) or 'test'.
+LOG_PRESET = os.environ.get('PETCARE_LOG_PRESET', 'test' if sys.argv[1:2] == ['test'] else 'development')
+
+LOGGING = logging_preset(LOG_PRESET, BASE_DIR)
@@ -0,0 +1,26 @@
+"""
+Settings for running the tests against a primary and a read replica kept in
+two SQLite files:
+
+    python manage.py test Apis --settings=PetCareApp.settings_replica
+
+Nothing replicates between the two files, so routing to the replica is only
+switched on (DATABASE_REPLICAS) by the tests that exercise it. They write to
+each database directly to tell which one a view read from.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+from Apis.database import sqlite_database
+
+DATABASES = {
+    'default': {
+        **sqlite_database(BASE_DIR / 'primary.sqlite3'),
+        'TEST': {'NAME': str(BASE_DIR / 'test_primary.sqlite3')},
+    },
+    'replica': {
+        **sqlite_database(BASE_DIR / 'replica.sqlite3'),
+        'TEST': {'NAME': str(BASE_DIR / 'test_replica.sqlite3')},
+    },
+}
+DATABASE_REPLICAS = []
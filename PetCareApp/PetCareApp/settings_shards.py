@@ -0,0 +1,21 @@
+"""
+Settings for running the tests with orders sharded over three SQLite files:
+
+    python manage.py test Apis --settings=PetCareApp.settings_shards
+
+Sharding (ORDER_SHARDS) is only switched on by the tests that exercise it,
+so the rest of the suite runs as usual against the default database.
+"""
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+from Apis.database import sqlite_database
+
+DATABASES = {
+    alias: {
+        **sqlite_database(BASE_DIR / f'{alias}.sqlite3'),
+        'TEST': {'NAME': str(BASE_DIR / f'test_{alias}.sqlite3')},
+    }
+    for alias in ('default', 'shard1', 'shard2')
+}
+ORDER_SHARDS = []
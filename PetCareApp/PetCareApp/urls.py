@@ -17,7 +17,10 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from Apis.Views.Admin_views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('apis/', include('Apis.urls')),
+    path('metrics', metrics, name='metrics'),
     ]